@@ -0,0 +1,238 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from irods_http_client.group_membership import GroupMembership
+from irods_http_client.query_operations import quote_genquery_value
+
+# Access levels stored in the catalog, from lowest to highest.
+_LEVELS = ['null', 'read_metadata', 'read_object', 'create_metadata', 'modify_metadata', 'delete_metadata',
+           'create_object', 'modify_object', 'delete_object', 'own']
+
+# The names accepted by set_permission() and their access levels.
+_PERMISSIONS = {
+    'read': 'read_object',
+    'write': 'modify_object',
+    'own': 'own'
+}
+
+class AccessChecker:
+
+    def __init__(self, api, membership: GroupMembership=None, ttl: float=60, batch_size: int=50, workers: int=4):
+        """
+        Initializes an AccessChecker answering permission checks for many paths at once.
+
+        The permissions of the requested paths are fetched with one GenQuery per parent collection
+        and batch of names, and cached for ttl seconds together with user and group names.
+        Cached entries are discarded as soon as set_permission() or modify_permissions() is
+        called on them through the same client. Call close() to stop listening for those calls.
+
+        Parameters
+        - api: The IrodsHttpClient used to query the catalog. Its token must be set before checking.
+        - membership (optional): The GroupMembership used to find the groups of a user. Created if not given.
+        - ttl (optional): The number of seconds permissions are cached for. Defaults to 60.
+        - batch_size (optional): The maximum number of names in each query. Defaults to 50.
+        - workers (optional): The number of queries to run concurrently. Defaults to 4.
+        """
+        if (not isinstance(ttl, (int, float))):
+            raise TypeError('ttl must be a number')
+        if (not ttl >= 0):
+            raise ValueError('ttl must be greater than or equal to 0')
+        if (not isinstance(batch_size, int)):
+            raise TypeError('batch_size must be an int')
+        if (not batch_size > 0):
+            raise ValueError('batch_size must be greater than 0')
+        if (not isinstance(workers, int)):
+            raise TypeError('workers must be an int')
+        if (not workers > 0):
+            raise ValueError('workers must be greater than 0')
+
+        self.api = api
+        self.membership = membership
+        if (membership == None):
+            self.membership = GroupMembership(api, ttl=ttl)
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.workers = workers
+
+        self._lock = threading.Lock()
+        # lpath -> (expiry, {user or group id: access level}), or (expiry, None) for paths that do not exist.
+        self._acls = {}
+        self._names = {}
+        self._names_expire = 0
+
+        api.collections.permission_listeners.append(self.invalidate)
+        api.data_objects.permission_listeners.append(self.invalidate)
+
+
+    def _user_ids(self, names: set):
+        """ Returns the ids of the given users and groups, refreshing the cached id list when it has expired. """
+        with self._lock:
+            expired = (time.monotonic() >= self._names_expire)
+        if (expired):
+            ids = {}
+            for id, name in self.api.queries.execute_genquery_paged('SELECT USER_ID, USER_NAME'):
+                ids[name] = id
+            with self._lock:
+                self._names = ids
+                self._names_expire = time.monotonic() + self.ttl
+        with self._lock:
+            return(set(self._names[name] for name in names if name in self._names))
+
+
+    def _fetch(self, lpaths: list):
+        """ Fetches the permissions of paths missing from the cache. """
+        acls = {lpath: None for lpath in lpaths}
+
+        names_by_collection = {}
+        for lpath in lpaths:
+            collection, name = lpath.rsplit('/', 1)
+            names_by_collection.setdefault(collection or '/', []).append(name)
+
+        batches = []
+        for collection, names in names_by_collection.items():
+            for i in range(0, len(names), self.batch_size):
+                batches.append(
+                    'SELECT COLL_NAME, DATA_NAME, DATA_ACCESS_USER_ID, DATA_ACCESS_NAME '
+                    'WHERE COLL_NAME = ' + quote_genquery_value(collection) + ' '
+                    'AND DATA_NAME IN (' + ', '.join(quote_genquery_value(n) for n in names[i:i + self.batch_size]) + ')'
+                )
+
+        def run(query):
+            return(list(self.api.queries.execute_genquery_paged(query)))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for rows in executor.map(run, batches):
+                for row in rows:
+                    lpath = row[0].rstrip('/') + '/' + row[1]
+                    if (lpath in acls):
+                        if (acls[lpath] == None):
+                            acls[lpath] = {}
+                        acls[lpath][row[2]] = row[3].replace(' ', '_')
+
+            # Paths that are not data objects may be collections.
+            remaining = [lpath for lpath, acl in acls.items() if acl == None]
+            batches = []
+            for i in range(0, len(remaining), self.batch_size):
+                batches.append(
+                    'SELECT COLL_NAME, COLL_ACCESS_USER_ID, COLL_ACCESS_NAME '
+                    'WHERE COLL_NAME IN (' + ', '.join(quote_genquery_value(lpath) for lpath in remaining[i:i + self.batch_size]) + ')'
+                )
+            for rows in executor.map(run, batches):
+                for row in rows:
+                    if (row[0] in acls):
+                        if (acls[row[0]] == None):
+                            acls[row[0]] = {}
+                        acls[row[0]][row[1]] = row[2].replace(' ', '_')
+
+        now = time.monotonic()
+        expires = now + self.ttl
+        with self._lock:
+            self._acls = {k: v for k, v in self._acls.items() if v[0] > now}
+            for lpath, acl in acls.items():
+                self._acls[lpath] = (expires, acl)
+        return(acls)
+
+
+    def permissions(self, user: str, lpaths: list):
+        """
+        Returns the effective access level of a user on each path, including access granted through groups.
+
+        Parameters
+        - user: The name of the user.
+        - lpaths: A list of absolute logical paths of collections or data objects.
+
+        Returns
+        - A dict mapping each path to the highest access level of the user, such as 'read_object',
+          'modify_object' or 'own'. Paths the user cannot access map to 'null', and paths that do not exist map to None.
+        - A RuntimeError is raised if any query fails.
+        """
+        if (not isinstance(user, str)):
+            raise TypeError('user must be a string')
+        if (not isinstance(lpaths, list)):
+            raise TypeError('lpaths must be a list of strings')
+        for lpath in lpaths:
+            if (not isinstance(lpath, str)):
+                raise TypeError('lpaths must be a list of strings')
+            if (not lpath.startswith('/')):
+                raise ValueError('lpaths must contain absolute logical paths')
+        if (self.api.queries.token == None):
+            raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
+
+        lpaths = [lpath if (lpath == '/') else lpath.rstrip('/') for lpath in lpaths]
+        acls = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for lpath in lpaths:
+                cached = self._acls.get(lpath)
+                if ((cached != None) and (cached[0] > now)):
+                    acls[lpath] = cached[1]
+                elif (not lpath in missing):
+                    missing.append(lpath)
+        if (len(missing) > 0):
+            acls.update(self._fetch(missing))
+
+        ids = self._user_ids(set([user]) | self.membership.groups_of(user))
+
+        result = {}
+        for lpath in lpaths:
+            acl = acls[lpath]
+            if (acl == None):
+                result[lpath] = None
+                continue
+            level = 0
+            for id, access in acl.items():
+                if ((id in ids) and (access in _LEVELS)):
+                    level = max(level, _LEVELS.index(access))
+            result[lpath] = _LEVELS[level]
+        return(result)
+
+
+    def can_access(self, user: str, lpaths: list, permission: str='read'):
+        """
+        Checks whether a user has at least a permission on each path, including access granted through groups.
+
+        Parameters
+        - user: The name of the user.
+        - lpaths: A list of absolute logical paths of collections or data objects.
+        - permission (optional): The permission required. Either 'read', 'write', 'own', or an access level
+          such as 'read_metadata' or 'delete_object'. Defaults to 'read'.
+
+        Returns
+        - A dict mapping each path to True if the user has the permission, otherwise False. Paths that do not exist map to False.
+        - A RuntimeError is raised if any query fails.
+        """
+        if (not isinstance(permission, str)):
+            raise TypeError('permission must be a string')
+        required = _PERMISSIONS.get(permission, permission)
+        if ((not required in _LEVELS) or (required == 'null')):
+            raise ValueError('permission must be either \'read\', \'write\', \'own\', or an access level')
+
+        result = {}
+        for lpath, level in self.permissions(user, lpaths).items():
+            result[lpath] = ((level != None) and (_LEVELS.index(level) >= _LEVELS.index(required)))
+        return(result)
+
+
+    def invalidate(self, lpath: str=None):
+        """
+        Discards cached permissions.
+
+        Parameters
+        - lpath (optional): The absolute logical path whose permissions changed. Discards everything, including group membership, if not given.
+        """
+        with self._lock:
+            if (lpath == None):
+                self._acls = {}
+                self._names_expire = 0
+            else:
+                self._acls.pop(lpath if (lpath == '/') else lpath.rstrip('/'), None)
+        if (lpath == None):
+            self.membership.invalidate()
+
+
+    def close(self):
+        """ Stops discarding cached permissions when they are changed through the client. """
+        for listeners in [self.api.collections.permission_listeners, self.api.data_objects.permission_listeners]:
+            if (self.invalidate in listeners):
+                listeners.remove(self.invalidate)
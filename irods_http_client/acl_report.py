@@ -0,0 +1,130 @@
+import csv
+import time
+from irods_http_client.group_membership import GroupMembership
+from irods_http_client.query_operations import genquery_tree_condition
+
+_COLUMNS = ['path', 'type', 'name', 'permission', 'via']
+
+# The queries listing the permissions of each kind of entry. The user id and access name are always last.
+_KINDS = [
+    {
+        'type': 'collection',
+        'select': 'SELECT COLL_NAME, COLL_ACCESS_USER_ID, COLL_ACCESS_NAME'
+    },
+    {
+        'type': 'data_object',
+        'select': 'SELECT COLL_NAME, DATA_NAME, DATA_ACCESS_USER_ID, DATA_ACCESS_NAME'
+    }
+]
+
+class AclReport:
+
+    def __init__(self, api, membership: GroupMembership=None):
+        """
+        Initializes an AclReport listing who can access what under a collection.
+
+        The report is built from one paginated GenQuery for users and groups, and one per kind of
+        entry over the access columns, so the number of queries does not depend on the number of entries.
+
+        Parameters
+        - api: The IrodsHttpClient used to query the catalog. Its token must be set before writing a report.
+        - membership (optional): The GroupMembership used to expand groups into their members. Created if not given.
+        """
+        self.api = api
+        self.membership = membership
+        if (membership == None):
+            self.membership = GroupMembership(api)
+
+
+    def _names(self):
+        """ Returns a dict mapping user and group ids to their names. """
+        names = {}
+        for id, name in self.api.queries.execute_genquery_paged('SELECT USER_ID, USER_NAME'):
+            names[id] = name
+        return(names)
+
+
+    def rows(self, lpath: str, expand_groups: int=0):
+        """
+        Lists the permissions on a collection and on every collection and data object beneath it.
+
+        Parameters
+        - lpath: The absolute logical path of the collection tree.
+        - expand_groups (optional): Set to 1 to also list a row for each member of a group, otherwise set to 0. Defaults to 0.
+
+        Returns
+        - A generator yielding each row as a list of path, type ('collection' or 'data_object'), user or group name,
+          permission, and the group the permission was granted through (empty for direct permissions).
+        - A RuntimeError is raised if any query fails.
+        """
+        if (not isinstance(lpath, str)):
+            raise TypeError('lpath must be a string')
+        if (not isinstance(expand_groups, int)):
+            raise TypeError('expand_groups must be an int 1 or 0')
+        if ((not expand_groups == 0) and (not expand_groups == 1)):
+            raise ValueError('expand_groups must be an int 1 or 0')
+        if (self.api.queries.token == None):
+            raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
+        if (lpath != '/'):
+            lpath = lpath.rstrip('/')
+
+        return(self._rows(lpath, expand_groups))
+
+
+    def _rows(self, lpath: str, expand_groups: int):
+        names = self._names()
+        condition = ' WHERE ' + genquery_tree_condition(lpath)
+        members = {}
+
+        for kind in _KINDS:
+            for row in self.api.queries.execute_genquery_paged(kind['select'] + condition):
+                entry_path = row[0]
+                if (kind['type'] == 'data_object'):
+                    entry_path = row[0].rstrip('/') + '/' + row[1]
+                name = names.get(row[-2], row[-2])
+                permission = row[-1].replace(' ', '_')
+                yield [entry_path, kind['type'], name, permission, '']
+
+                if (expand_groups and self.membership.is_group(name)):
+                    if (not name in members):
+                        members[name] = sorted(self.membership.members(name))
+                    for member in members[name]:
+                        yield [entry_path, kind['type'], member, permission, name]
+
+
+    def write(self, lpath: str, destination, expand_groups: int=0):
+        """
+        Writes the permissions under a collection to a CSV file as they are fetched.
+
+        Parameters
+        - lpath: The absolute logical path of the collection tree.
+        - destination: The path of the file to write, or an open text file.
+        - expand_groups (optional): Set to 1 to also list a row for each member of a group, otherwise set to 0. Defaults to 0.
+
+        Returns
+        - A dict with the number of rows written and the elapsed seconds.
+        - A RuntimeError is raised if any query fails.
+        """
+        rows = self.rows(lpath, expand_groups)
+        if (isinstance(destination, str)):
+            with open(destination, 'w', newline='') as f:
+                return(self._write(rows, f))
+        return(self._write(rows, destination))
+
+
+    def _write(self, rows, file):
+        start = time.time()
+        writer = csv.writer(file)
+        writer.writerow(_COLUMNS)
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+
+        elapsed = time.time() - start
+        print('Wrote ' + str(count) + ' permission rows in ' + str(round(elapsed, 3)) + ' seconds')
+
+        return({
+            'rows': count,
+            'elapsed': elapsed
+        })
@@ -0,0 +1,399 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from irods_http_client.query_operations import genquery_tree_condition, quote_genquery_value
+
+# Each mirrored table is filled from one GenQuery. The modify time is always the last selected
+# column, so the highest value seen becomes the watermark for the next incremental sync.
+# The AVU modify time is the one of the AVU itself. GenQuery does not expose when an existing
+# AVU was associated with an entry, so such associations are only picked up by a pruning sync.
+_TABLES = [
+    {
+        'name': 'collections',
+        'select': 'SELECT COLL_ID, COLL_NAME, COLL_PARENT_NAME, COLL_OWNER_NAME, COLL_MODIFY_TIME',
+        'time_column': 'COLL_MODIFY_TIME',
+        'integers': [0, 4],
+        'insert': 'INSERT OR REPLACE INTO collections VALUES (?, ?, ?, ?, ?)',
+        'keys': 'SELECT COLL_ID',
+        'key_columns': ['coll_id']
+    },
+    {
+        'name': 'data_objects',
+        'select': 'SELECT DATA_ID, DATA_REPL_NUM, COLL_NAME, DATA_NAME, DATA_SIZE, DATA_CHECKSUM, DATA_RESC_HIER, '
+                  'DATA_OWNER_NAME, DATA_REPL_STATUS, DATA_MODIFY_TIME',
+        'time_column': 'DATA_MODIFY_TIME',
+        'integers': [0, 1, 4, 9],
+        'insert': 'INSERT OR REPLACE INTO data_objects VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        'keys': 'SELECT DATA_ID, DATA_REPL_NUM',
+        'key_columns': ['data_id', 'replica_number']
+    },
+    {
+        'name': 'data_object_avus',
+        'select': 'SELECT DATA_ID, META_DATA_ATTR_ID, META_DATA_ATTR_NAME, META_DATA_ATTR_VALUE, META_DATA_ATTR_UNITS, META_DATA_MODIFY_TIME',
+        'time_column': 'META_DATA_MODIFY_TIME',
+        'integers': [0, 1, 5],
+        'insert': 'INSERT OR REPLACE INTO data_object_avus VALUES (?, ?, ?, ?, ?, ?)',
+        'keys': 'SELECT DATA_ID, META_DATA_ATTR_ID',
+        'key_columns': ['data_id', 'avu_id'],
+        'avu_id_column': 'META_DATA_ATTR_ID'
+    },
+    {
+        'name': 'collection_avus',
+        'select': 'SELECT COLL_ID, META_COLL_ATTR_ID, META_COLL_ATTR_NAME, META_COLL_ATTR_VALUE, META_COLL_ATTR_UNITS, META_COLL_MODIFY_TIME',
+        'time_column': 'META_COLL_MODIFY_TIME',
+        'integers': [0, 1, 5],
+        'insert': 'INSERT OR REPLACE INTO collection_avus VALUES (?, ?, ?, ?, ?, ?)',
+        'keys': 'SELECT COLL_ID, META_COLL_ATTR_ID',
+        'key_columns': ['coll_id', 'avu_id'],
+        'avu_id_column': 'META_COLL_ATTR_ID'
+    }
+]
+
+# Number of AVU ids per query when fetching associations missing from the mirror.
+_AVU_IDS_PER_QUERY = 100
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS collections (
+    coll_id INTEGER PRIMARY KEY,
+    coll_name TEXT NOT NULL,
+    parent_name TEXT,
+    owner TEXT,
+    modify_time INTEGER
+);
+CREATE INDEX IF NOT EXISTS collections_by_name ON collections (coll_name);
+CREATE TABLE IF NOT EXISTS data_objects (
+    data_id INTEGER NOT NULL,
+    replica_number INTEGER NOT NULL,
+    coll_name TEXT NOT NULL,
+    data_name TEXT NOT NULL,
+    size INTEGER,
+    checksum TEXT,
+    resource_hierarchy TEXT,
+    owner TEXT,
+    replica_status TEXT,
+    modify_time INTEGER,
+    PRIMARY KEY (data_id, replica_number)
+);
+CREATE INDEX IF NOT EXISTS data_objects_by_path ON data_objects (coll_name, data_name);
+CREATE TABLE IF NOT EXISTS data_object_avus (
+    data_id INTEGER NOT NULL,
+    avu_id INTEGER NOT NULL,
+    attribute TEXT,
+    value TEXT,
+    units TEXT,
+    modify_time INTEGER,
+    PRIMARY KEY (data_id, avu_id)
+);
+CREATE INDEX IF NOT EXISTS data_object_avus_by_attribute ON data_object_avus (attribute, value);
+CREATE TABLE IF NOT EXISTS collection_avus (
+    coll_id INTEGER NOT NULL,
+    avu_id INTEGER NOT NULL,
+    attribute TEXT,
+    value TEXT,
+    units TEXT,
+    modify_time INTEGER,
+    PRIMARY KEY (coll_id, avu_id)
+);
+CREATE INDEX IF NOT EXISTS collection_avus_by_attribute ON collection_avus (attribute, value);
+CREATE TABLE IF NOT EXISTS watermarks (
+    table_name TEXT PRIMARY KEY,
+    modify_time INTEGER NOT NULL
+);
+'''
+
+class CatalogMirror:
+
+    def __init__(self, api, db_path: str, lpath: str='/', batch_size: int=1000):
+        """
+        Initializes a CatalogMirror backed by a local SQLite database.
+
+        The mirror holds the collections, data object replicas and AVUs under lpath. It is filled
+        with paginated GenQuery calls by sync(), and can then be queried locally with query().
+        The mirror may be shared between threads. Calls are serialized, so a query() issued
+        during a sync() waits for the sync to finish.
+
+        Parameters
+        - api: The IrodsHttpClient used to query the catalog. Its token must be set before calling sync().
+        - db_path: The path of the SQLite database file. Created if it does not exist.
+        - lpath (optional): The absolute logical path of the collection tree to mirror. Defaults to '/'.
+        - batch_size (optional): The number of rows written to the database at a time. Defaults to 1000.
+        """
+        if (not isinstance(db_path, str)):
+            raise TypeError('db_path must be a string')
+        if (not isinstance(lpath, str)):
+            raise TypeError('lpath must be a string')
+        if (not isinstance(batch_size, int)):
+            raise TypeError('batch_size must be an int')
+        if (not batch_size > 0):
+            raise ValueError('batch_size must be greater than 0')
+
+        self.api = api
+        self.db_path = db_path
+        self.lpath = lpath
+        if (lpath != '/'):
+            self.lpath = lpath.rstrip('/')
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.executescript(_SCHEMA)
+        self.db.commit()
+
+
+    def _condition(self):
+        """ Returns the GenQuery condition restricting results to the mirrored tree, or an empty string. """
+        if (self.lpath == '/'):
+            return('')
+        return(genquery_tree_condition(self.lpath))
+
+
+    def _fetch(self, queries: list, handle_batch):
+        """
+        Runs the given queries concurrently and passes their rows to handle_batch in batches.
+
+        The database is only written from the calling thread. A bounded queue between the
+        query threads and the writer keeps memory use proportional to a few batches.
+        """
+        batches = queue.Queue(maxsize=16)
+        stop = threading.Event()
+
+        def produce(index, query):
+            try:
+                batch = []
+                for row in self.api.queries.execute_genquery_paged(query):
+                    batch.append(row)
+                    if (len(batch) == self.batch_size):
+                        while (not stop.is_set()):
+                            try:
+                                batches.put((index, batch), timeout=0.5)
+                                break
+                            except queue.Full:
+                                pass
+                        batch = []
+                    if (stop.is_set()):
+                        return
+                if (len(batch) > 0):
+                    batches.put((index, batch))
+            finally:
+                batches.put((index, None))
+
+        with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+            futures = [executor.submit(produce, i, query) for i, query in enumerate(queries)]
+            try:
+                remaining = len(queries)
+                while (remaining > 0):
+                    index, batch = batches.get()
+                    if (batch == None):
+                        remaining -= 1
+                    else:
+                        handle_batch(index, batch)
+            except BaseException:
+                stop.set()
+                while (not all(f.done() for f in futures)):
+                    try:
+                        batches.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+                raise
+
+            for f in futures:
+                f.result()
+
+
+    def watermarks(self):
+        """
+        Returns the modify time watermark of each mirrored table.
+
+        Returns
+        - A dict mapping table names to the highest modify time (seconds since epoch) mirrored so far, or 0.
+        """
+        with self._lock:
+            return(self._watermarks())
+
+
+    def _watermarks(self):
+        """ Returns the watermark of each mirrored table. The caller holds the lock. """
+        result = {table['name']: 0 for table in _TABLES}
+        for name, modify_time in self.db.execute('SELECT table_name, modify_time FROM watermarks'):
+            result[name] = modify_time
+        return(result)
+
+
+    def sync(self, full: int=0, prune: int=0):
+        """
+        Brings the mirror up to date with the catalog.
+
+        Only rows whose modify time is at or after the table's watermark are fetched, so the cost
+        is proportional to the changes since the last sync. Removals are not visible through modify
+        times, and neither is an existing AVU newly associated with another entry, since its modify
+        time does not change. Set prune to 1 to also compare the ids under lpath, delete rows that no
+        longer exist, and fetch the AVU associations missing from the mirror.
+
+        Parameters
+        - full (optional): Set to 1 to ignore the watermarks and fetch everything, otherwise set to 0. Defaults to 0.
+        - prune (optional): Set to 1 to delete local rows that no longer exist in the catalog and fetch missing AVU associations, otherwise set to 0. Defaults to 0.
+
+        Returns
+        - A dict containing the number of rows fetched per table, the number of rows removed, and the elapsed seconds.
+        - A RuntimeError is raised if any query fails. The mirror is left unchanged in that case.
+        """
+        if (self.api.queries.token == None):
+            raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
+        if (not isinstance(full, int)):
+            raise TypeError('full must be an int 1 or 0')
+        if ((not full == 0) and (not full == 1)):
+            raise ValueError('full must be an int 1 or 0')
+        if (not isinstance(prune, int)):
+            raise TypeError('prune must be an int 1 or 0')
+        if ((not prune == 0) and (not prune == 1)):
+            raise ValueError('prune must be an int 1 or 0')
+
+        with self._lock:
+            return(self._sync(full, prune))
+
+
+    def _sync(self, full: int, prune: int):
+        """ Runs sync() while the caller holds the lock. """
+        start = time.time()
+        watermarks = self._watermarks()
+        fetched = {table['name']: 0 for table in _TABLES}
+        newest = {}
+
+        queries = []
+        for table in _TABLES:
+            conditions = []
+            if (self._condition() != ''):
+                conditions.append(self._condition())
+            if ((full == 0) and (watermarks[table['name']] > 0)):
+                # Catalog times are zero padded strings, compared as such by GenQuery.
+                conditions.append(table['time_column'] + ' >= ' + quote_genquery_value('%011d' % watermarks[table['name']]))
+            query = table['select']
+            if (len(conditions) > 0):
+                query += ' WHERE ' + ' AND '.join(conditions)
+            queries.append(query)
+
+        def write_rows(index, batch):
+            table = _TABLES[index]
+            rows = []
+            for row in batch:
+                for i in table['integers']:
+                    row[i] = int(row[i])
+                rows.append(row)
+            self.db.executemany(table['insert'], rows)
+            fetched[table['name']] += len(rows)
+            # Associations fetched by a pruning sync carry an older modify time and leave the watermark as is.
+            newest[table['name']] = max(newest.get(table['name'], 0), max(row[-1] for row in rows))
+
+        removed = 0
+        try:
+            self._fetch(queries, write_rows)
+            if (prune == 1):
+                removed = self._prune(write_rows)
+            for name, modify_time in newest.items():
+                self.db.execute('INSERT OR REPLACE INTO watermarks VALUES (?, ?)', (name, max(modify_time, watermarks[name])))
+            self.db.commit()
+        except BaseException:
+            self.db.rollback()
+            raise
+
+        elapsed = time.time() - start
+        print('Catalog mirror synced ' + str(sum(fetched.values())) + ' rows in ' + str(round(elapsed, 3)) + ' seconds')
+
+        return(
+            {
+                'fetched': fetched,
+                'removed': removed,
+                'elapsed': elapsed
+            }
+        )
+
+
+    def _prune(self, write_rows):
+        """
+        Deletes local rows whose ids are no longer returned by the catalog, and passes the rows of
+        AVU associations missing locally to write_rows. Returns the number of rows deleted.
+        """
+        for table in _TABLES:
+            columns = ', '.join(table['key_columns'])
+            self.db.execute('CREATE TEMP TABLE IF NOT EXISTS live_' + table['name'] + ' (' + columns + ', PRIMARY KEY (' + columns + '))')
+            self.db.execute('DELETE FROM live_' + table['name'])
+
+        queries = []
+        for table in _TABLES:
+            query = table['keys']
+            if (self._condition() != ''):
+                query += ' WHERE ' + self._condition()
+            queries.append(query)
+
+        def write_keys(index, batch):
+            table = _TABLES[index]
+            placeholders = ', '.join('?' for _ in table['key_columns'])
+            rows = [[int(value) for value in row] for row in batch]
+            self.db.executemany('INSERT OR IGNORE INTO live_' + table['name'] + ' VALUES (' + placeholders + ')', rows)
+
+        self._fetch(queries, write_keys)
+
+        # Keys returned by the catalog but absent locally are AVUs associated after their last modification.
+        queries = []
+        targets = []
+        for index, table in enumerate(_TABLES):
+            if ('avu_id_column' not in table):
+                continue
+            match = ' AND '.join('live.' + c + ' = ' + table['name'] + '.' + c for c in table['key_columns'])
+            avu_ids = [row[0] for row in self.db.execute(
+                'SELECT DISTINCT avu_id FROM live_' + table['name'] + ' AS live WHERE NOT EXISTS (SELECT 1 FROM ' + table['name'] + ' WHERE ' + match + ')'
+            )]
+            for i in range(0, len(avu_ids), _AVU_IDS_PER_QUERY):
+                values = ', '.join(quote_genquery_value(str(avu_id)) for avu_id in avu_ids[i:i + _AVU_IDS_PER_QUERY])
+                conditions = [table['avu_id_column'] + ' IN (' + values + ')']
+                if (self._condition() != ''):
+                    conditions.insert(0, self._condition())
+                queries.append(table['select'] + ' WHERE ' + ' AND '.join(conditions))
+                targets.append(index)
+        if (len(queries) > 0):
+            self._fetch(queries, lambda index, batch: write_rows(targets[index], batch))
+
+        removed = 0
+        for table in _TABLES:
+            match = ' AND '.join('live.' + c + ' = ' + table['name'] + '.' + c for c in table['key_columns'])
+            cursor = self.db.execute(
+                'DELETE FROM ' + table['name'] + ' WHERE NOT EXISTS (SELECT 1 FROM live_' + table['name'] + ' AS live WHERE ' + match + ')'
+            )
+            removed += cursor.rowcount
+            self.db.execute('DROP TABLE live_' + table['name'])
+        return(removed)
+
+
+    def query(self, sql: str, parameters: tuple=()):
+        """
+        Runs a read-only SQL query against the local mirror.
+
+        Tables: collections, data_objects (one row per replica), data_object_avus and collection_avus.
+
+        Parameters
+        - sql: The SQL query to run.
+        - parameters (optional): Values bound to the placeholders in sql.
+
+        Returns
+        - A list of result rows as tuples.
+        """
+        if (not isinstance(sql, str)):
+            raise TypeError('sql must be a string')
+        with self._lock:
+            return(self.db.execute(sql, parameters).fetchall())
+
+
+    def close(self):
+        """ Closes the local database. """
+        with self._lock:
+            self.db.close()
+
+
+    def __enter__(self):
+        return(self)
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,93 @@
+import requests
+import threading
+from concurrent.futures import Future
+
+class RequestCoalescer:
+
+    def __init__(self):
+        """
+        Initializes a RequestCoalescer with no requests in flight.
+        A single instance is shared by all endpoint operations of an IrodsHttpClient.
+        """
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._requests = 0
+        self._coalesced = 0
+
+
+    def get(self, url: str, params: dict=None, headers: dict=None):
+        """
+        Sends a GET request, sharing the response with identical requests already in flight.
+
+        Only idempotent operations should be sent through this method. While a request is
+        in flight, any identical request (same url, parameters and authorization) waits on
+        the same future instead of being sent to the server again.
+
+        Parameters
+        - url: The url of the endpoint being accessed.
+        - params (optional): The query parameters of the request.
+        - headers (optional): The headers of the request.
+
+        Returns
+        - The requests.Response received from the server.
+        """
+        if (params == None):
+            params = {}
+        if (headers == None):
+            headers = {}
+
+        key = (
+            url,
+            tuple(sorted((k, str(v)) for k, v in params.items())),
+            tuple(sorted((k, str(v)) for k, v in headers.items()))
+        )
+
+        with self._lock:
+            self._requests += 1
+            future = self._in_flight.get(key)
+            if (future != None):
+                self._coalesced += 1
+                leader = False
+            else:
+                future = Future()
+                self._in_flight[key] = future
+                leader = True
+
+        if (not leader):
+            return(future.result())
+
+        try:
+            r = requests.get(url, params=params, headers=headers)
+            future.set_result(r)
+            return(r)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+
+    def stats(self):
+        """
+        Returns counters describing the requests seen by the coalescer.
+
+        Returns
+        - A dict containing the number of requests received, the number of requests that were
+          coalesced into an identical in-flight request, and the number of requests currently in flight.
+        """
+        with self._lock:
+            return(
+                {
+                    'requests': self._requests,
+                    'coalesced': self._coalesced,
+                    'in_flight': len(self._in_flight)
+                }
+            )
+
+
+    def reset_stats(self):
+        """ Resets the request and coalesced counters to zero. """
+        with self._lock:
+            self._requests = 0
+            self._coalesced = 0
@@ -1,16 +1,30 @@
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
+from irods_http_client.coalescing import RequestCoalescer
+from irods_http_client.json_stream import JsonArrayStream
+from irods_http_client.query_operations import Queries, genquery_tree_condition, quote_genquery_value
 
 class Collections:
     
-    def __init__(self, url_base: str):
+    def __init__(self, url_base: str, coalescer: RequestCoalescer=None):
         """" 
         Initializes Collections with a base url. 
         Token is set to None initially, and updated when setToken() is called in irodsClient.
+        Idempotent GET operations are sent through the given RequestCoalescer, or a private one if none is given.
         """
         self.url_base = url_base
         self.token = None
 
+        if (coalescer == None):
+            coalescer = RequestCoalescer()
+        self.coalescer = coalescer
+
+        self.queries = Queries(url_base, coalescer)
+
+        # Functions called with the lpath after set_permission() or modify_permissions() reaches the server.
+        self.permission_listeners = []
+
 
     def create(self, lpath: str, create_intermediates: int=0):
         """
@@ -188,7 +202,7 @@ class Collections:
             'ticket': ticket
         }
 
-        r = requests.get(self.url_base + '/collections', params=params, headers=headers)
+        r = self.coalescer.get(self.url_base + '/collections', params=params, headers=headers)
 
         if (r.status_code / 100 == 2):
             rdict = r.json()
@@ -255,7 +269,7 @@ class Collections:
             'ticket': ticket
         }
 
-        r = requests.get(self.url_base + '/collections', params=params, headers=headers)
+        r = self.coalescer.get(self.url_base + '/collections', params=params, headers=headers)
 
         if (r.status_code / 100 == 2):
             rdict = r.json()
@@ -287,6 +301,231 @@ class Collections:
             )
     
 
+    def iter_list(self, lpath: str, recurse: int=0, ticket: str=''):
+        """
+        Shows the contents of a collection, parsing the response incrementally.
+
+        Entries are yielded as they arrive off the socket, so memory use stays proportional to one
+        entry rather than the whole listing. Use this instead of list() for very large collections.
+
+        Parameters
+        - lpath: The absolute logical path of the collection to have its contents listed.
+        - recurse (optional): Set to 1 to list the contents of objects in the collection, otherwise set to 0. Defaults to 0.
+        - ticket (optional): Ticket to be enabled before the operation. Defaults to an empty string.
+
+        Returns
+        - A generator yielding the absolute logical path of each entry.
+        - A RuntimeError is raised if an HTTP or iRODS error occurs.
+        """
+        if (self.token == None):
+            raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
+        if (not isinstance(lpath, str)):
+            raise TypeError('lpath must be a string')
+        if (not isinstance(recurse, int)):
+            raise TypeError('recurse must be an int 1 or 0')
+        if ((not recurse == 0) and (not recurse == 1)):
+            raise ValueError('recurse must be an int 1 or 0')
+        if (not isinstance(ticket, str)):
+            raise TypeError('ticket must be a string')
+
+        headers = {
+            'Authorization': 'Bearer ' + self.token,
+        }
+
+        params = {
+            'op': 'list',
+            'lpath': lpath,
+            'recurse': recurse,
+            'ticket': ticket
+        }
+
+        with requests.get(self.url_base + '/collections', params=params, headers=headers, stream=True) as r:
+            if (r.status_code / 100 != 2):
+                raise RuntimeError('Failed to retrieve list for \'' + lpath + '\': HTTP Status Code ' + str(r.status_code))
+
+            stream = JsonArrayStream(r.iter_content(chunk_size=65536), 'entries')
+            for entry in stream:
+                yield entry
+
+            status_code = stream.document['irods_response']['status_code']
+            if (status_code):
+                raise RuntimeError('Failed to retrieve list for \'' + lpath + '\': iRODS Status Code ' + str(status_code))
+
+
+    def walk(self, lpath: str, details: int=0, workers: int=4, page_size: int=1000):
+        """
+        Walks a collection tree top-down, like os.walk().
+
+        Each collection is listed with paginated GenQuery calls over COLL_NAME and DATA_NAME when the
+        walk reaches it. Listings for the next workers collections to be visited are fetched concurrently
+        while the caller processes the current one, so memory holds at most workers listings besides the
+        collections waiting to be visited. As with os.walk(), the caller may remove names from the
+        subcollections list to prevent them from being visited.
+
+        Parameters
+        - lpath: The absolute logical path of the collection to walk.
+        - details (optional): Set to 1 to describe data objects with their size, modify time and checksum, otherwise set to 0. Defaults to 0.
+        - workers (optional): The number of listings to fetch concurrently. Defaults to 4.
+        - page_size (optional): Number of rows to request per query page. Defaults to 1000.
+
+        Returns
+        - A generator yielding a (collection, subcollections, data_objects) tuple for each collection.
+        - subcollections is a list of names. data_objects is a list of names, or of dicts if details is set to 1.
+        - A RuntimeError is raised if any query fails.
+        """
+        if (self.token == None):
+            raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
+        if (not isinstance(lpath, str)):
+            raise TypeError('lpath must be a string')
+        if (not isinstance(details, int)):
+            raise TypeError('details must be an int 1 or 0')
+        if ((not details == 0) and (not details == 1)):
+            raise ValueError('details must be an int 1 or 0')
+        if (not isinstance(workers, int)):
+            raise TypeError('workers must be an int')
+        if (not workers > 0):
+            raise ValueError('workers must be greater than 0')
+        if (not isinstance(page_size, int)):
+            raise TypeError('page_size must be an int')
+        if (not page_size > 0):
+            raise ValueError('page_size must be greater than 0')
+
+        self.queries.token = self.token
+
+        if (lpath != '/'):
+            lpath = lpath.rstrip('/')
+
+        # Like os.walk(), a collection that does not exist yields nothing.
+        rows = list(self.queries.execute_genquery_paged('SELECT COLL_ID WHERE COLL_NAME = ' + quote_genquery_value(lpath)))
+        if (len(rows) == 0):
+            return
+
+        def fetch(collection):
+            subcollections = []
+            query = 'SELECT COLL_NAME WHERE COLL_PARENT_NAME = ' + quote_genquery_value(collection)
+            for row in self.queries.execute_genquery_paged(query, page_size):
+                if (row[0] != collection):
+                    subcollections.append(row[0].rsplit('/', 1)[1])
+            subcollections.sort()
+
+            if (details == 0):
+                query = 'SELECT DATA_NAME WHERE COLL_NAME = ' + quote_genquery_value(collection)
+                data_objects = sorted(row[0] for row in self.queries.execute_genquery_paged(query, page_size))
+                return(subcollections, data_objects)
+
+            # Each replica is a separate row. Describe each data object using its lowest numbered replica.
+            query = 'SELECT DATA_NAME, DATA_REPL_NUM, DATA_SIZE, DATA_MODIFY_TIME, DATA_CHECKSUM WHERE COLL_NAME = ' + quote_genquery_value(collection)
+            by_name = {}
+            for row in self.queries.execute_genquery_paged(query, page_size):
+                entry = by_name.get(row[0])
+                if ((entry != None) and (entry['replica_number'] <= int(row[1]))):
+                    continue
+                by_name[row[0]] = {
+                    'name': row[0],
+                    'replica_number': int(row[1]),
+                    'size': int(row[2]),
+                    'modify_time': int(row[3]),
+                    'checksum': row[4]
+                }
+            data_objects = [by_name[name] for name in sorted(by_name)]
+            return(subcollections, data_objects)
+
+        pending = [lpath]
+        futures = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while (len(pending) > 0):
+                # The collections visited next are at the end of the stack. Prefetch their listings.
+                for collection in pending[-workers:]:
+                    if (not collection in futures):
+                        futures[collection] = executor.submit(fetch, collection)
+
+                collection = pending.pop()
+                subcollections, data_objects = futures.pop(collection).result()
+
+                yield (collection, subcollections, data_objects)
+
+                for name in reversed(subcollections):
+                    pending.append(collection.rstrip('/') + '/' + name)
+    
+
+    def usage(self, lpath: str, by: str='collection', workers: int=8):
+        """
+        Computes the disk usage of a collection tree using server-side aggregation.
+
+        Sizes and counts are computed by the catalog with SUM(DATA_SIZE) and COUNT(DATA_ID),
+        so no listing is transferred. Both include every replica of each data object.
+
+        Parameters
+        - lpath: The absolute logical path of the collection being measured.
+        - by (optional): How to break down the usage. Either 'collection' for each direct subcollection, 'resource', or 'owner'. Defaults to 'collection'.
+        - workers (optional): The number of subcollections to measure concurrently when by is 'collection'. Defaults to 8.
+
+        Returns
+        - A dict containing the lpath, the total bytes and replicas under it, and a breakdown list.
+        - Each breakdown entry is a dict with a name, bytes and replicas. For 'collection', data objects stored
+          directly in lpath are reported under lpath itself.
+        - A RuntimeError is raised if any query fails.
+        """
+        if (self.token == None):
+            raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
+        if (not isinstance(lpath, str)):
+            raise TypeError('lpath must be a string')
+        if (not isinstance(by, str)):
+            raise TypeError('by must be a string')
+        if ((not by == 'collection') and (not by == 'resource') and (not by == 'owner')):
+            raise ValueError('by must be either \'collection\', \'resource\', or \'owner\'')
+        if (not isinstance(workers, int)):
+            raise TypeError('workers must be an int')
+        if (not workers > 0):
+            raise ValueError('workers must be greater than 0')
+
+        self.queries.token = self.token
+
+        if (lpath != '/'):
+            lpath = lpath.rstrip('/')
+
+        def tree_condition(collection):
+            return(genquery_tree_condition(collection))
+
+        def measure(condition):
+            rows = list(self.queries.execute_genquery_paged('SELECT SUM(DATA_SIZE), COUNT(DATA_ID) WHERE ' + condition))
+            if ((len(rows) == 0) or (rows[0][0] == '')):
+                return(0, 0)
+            return(int(rows[0][0]), int(rows[0][1]))
+
+        breakdown = []
+        if (by == 'collection'):
+            query = 'SELECT COLL_NAME WHERE COLL_PARENT_NAME = ' + quote_genquery_value(lpath)
+            children = sorted(row[0] for row in self.queries.execute_genquery_paged(query) if row[0] != lpath)
+
+            conditions = ['COLL_NAME = ' + quote_genquery_value(lpath)] + [tree_condition(child) for child in children]
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(measure, conditions))
+
+            for name, (size, replicas) in zip([lpath] + children, results):
+                breakdown.append({'name': name, 'bytes': size, 'replicas': replicas})
+        else:
+            column = 'RESC_NAME'
+            if (by == 'owner'):
+                column = 'DATA_OWNER_NAME'
+
+            query = 'SELECT ' + column + ', SUM(DATA_SIZE), COUNT(DATA_ID) WHERE ' + tree_condition(lpath)
+            for row in self.queries.execute_genquery_paged(query):
+                breakdown.append({'name': row[0], 'bytes': int(row[1] or 0), 'replicas': int(row[2])})
+            breakdown.sort(key=lambda entry: entry['name'])
+
+        print('Usage for \'' + lpath + '\' computed successfully')
+
+        return(
+            {
+                'lpath': lpath,
+                'bytes': sum(entry['bytes'] for entry in breakdown),
+                'replicas': sum(entry['replicas'] for entry in breakdown),
+                'breakdown': breakdown
+            }
+        )
+    
+
     def set_permission(self, lpath: str, entity_name: str, permission: str, admin: int=0):
         """
         Sets the permission of a user for a given collection.
@@ -331,6 +570,8 @@ class Collections:
 
         if (r.status_code / 100 == 2):
             rdict = r.json()
+            for listener in self.permission_listeners:
+                listener(lpath)
 
             if rdict['irods_response']['status_code']:
                 print('Failed to set permission for \'' + lpath + '\': iRODS Status Code' + str(rdict['irods_response']['status_code']))
@@ -477,6 +718,8 @@ class Collections:
 
         if (r.status_code / 100 == 2):
             rdict = r.json()
+            for listener in self.permission_listeners:
+                listener(lpath)
 
             if rdict['irods_response']['status_code']:
                 print('Failed to modify permissions for \'' + lpath + '\': iRODS Status Code' + str(rdict['irods_response']['status_code']))
@@ -0,0 +1,185 @@
+import threading
+from irods_http_client.query_operations import genquery_tree_condition, quote_genquery_value
+
+# Columns used to track each kind of entry. The id is always first and the modify time last.
+_KINDS = [
+    {
+        'type': 'collection',
+        'select': 'SELECT COLL_ID, COLL_NAME, COLL_MODIFY_TIME',
+        'count': 'SELECT COUNT(COLL_ID)',
+        'time_column': 'COLL_MODIFY_TIME'
+    },
+    {
+        'type': 'data_object',
+        'select': 'SELECT DATA_ID, DATA_REPL_NUM, COLL_NAME, DATA_NAME, DATA_MODIFY_TIME',
+        'count': 'SELECT COUNT(DATA_ID)',
+        'time_column': 'DATA_MODIFY_TIME'
+    }
+]
+
+class CollectionWatcher:
+
+    def __init__(self, api, lpath: str, interval: float=5.0):
+        """
+        Initializes a CollectionWatcher for a collection tree.
+
+        Each poll only fetches the collections and data objects whose modify time is at or after
+        the last one seen, plus one count per kind of entry. The full list of ids is only fetched
+        when the counts show that something was removed or appeared with an older modify time.
+        The cost of a poll is therefore proportional to the rate of change, not the size of the tree.
+        Renames that do not change the modify time are not reported.
+
+        Parameters
+        - api: The IrodsHttpClient used to query the catalog. Its token must be set before polling.
+        - lpath: The absolute logical path of the collection tree to watch.
+        - interval (optional): The number of seconds between polls in watch() and run(). Defaults to 5.
+        """
+        if (not isinstance(lpath, str)):
+            raise TypeError('lpath must be a string')
+        if (not isinstance(interval, (int, float))):
+            raise TypeError('interval must be a number')
+        if (not interval >= 0):
+            raise ValueError('interval must be greater than or equal to 0')
+
+        self.api = api
+        self.lpath = lpath
+        if (lpath != '/'):
+            self.lpath = lpath.rstrip('/')
+        self.interval = interval
+
+        # id -> {'lpath', 'modify_time', 'replicas'} for each kind, filled by the first poll.
+        self.known = None
+        self.watermarks = {kind['type']: 0 for kind in _KINDS}
+        self._stop = threading.Event()
+
+
+    def _condition(self):
+        """ Returns the GenQuery condition restricting results to the watched tree. """
+        return(genquery_tree_condition(self.lpath))
+
+
+    def _rows(self, kind: dict, since: int=-1):
+        """ Yields (id, lpath, modify_time, replica_number) for the entries of a kind, optionally modified at or after since. """
+        query = kind['select'] + ' WHERE ' + self._condition()
+        if (since >= 0):
+            query += ' AND ' + kind['time_column'] + ' >= ' + quote_genquery_value('%011d' % since)
+
+        for row in self.api.queries.execute_genquery_paged(query):
+            if (kind['type'] == 'collection'):
+                yield (row[0], row[1], int(row[2]), 0)
+            else:
+                yield (row[0], row[2] + '/' + row[3], int(row[4]), int(row[1]))
+
+
+    def _scan(self, kind: dict, known: dict, events: list):
+        """ Compares every id of a kind with the known entries, recording created and removed entries. """
+        seen = {}
+        for id, lpath, modify_time, replica_number in self._rows(kind):
+            entry = seen.get(id)
+            if (entry == None):
+                entry = {'lpath': lpath, 'modify_time': modify_time, 'replicas': set()}
+                seen[id] = entry
+            entry['modify_time'] = max(entry['modify_time'], modify_time)
+            entry['replicas'].add(replica_number)
+
+        for id in list(known):
+            if (not id in seen):
+                entry = known.pop(id)
+                events.append({'event': 'removed', 'type': kind['type'], 'lpath': entry['lpath'], 'modify_time': entry['modify_time']})
+            else:
+                known[id]['replicas'] = seen[id]['replicas']
+
+        for id, entry in seen.items():
+            if (not id in known):
+                known[id] = entry
+                events.append({'event': 'created', 'type': kind['type'], 'lpath': entry['lpath'], 'modify_time': entry['modify_time']})
+            self.watermarks[kind['type']] = max(self.watermarks[kind['type']], entry['modify_time'])
+
+
+    def poll(self):
+        """
+        Checks the watched tree for changes once.
+
+        The first poll records the current state of the tree and returns no events.
+
+        Returns
+        - A list of events. Each event is a dict with the event ('created', 'modified' or 'removed'),
+          the type ('collection' or 'data_object'), the lpath and the modify_time of the entry.
+        - A RuntimeError is raised if any query fails.
+        """
+        if (self.api.queries.token == None):
+            raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
+
+        if (self.known == None):
+            known = {}
+            for kind in _KINDS:
+                known[kind['type']] = {}
+                self._scan(kind, known[kind['type']], [])
+            self.known = known
+            return([])
+
+        events = []
+        for kind in _KINDS:
+            known = self.known[kind['type']]
+            changed = {}
+            for id, lpath, modify_time, replica_number in self._rows(kind, self.watermarks[kind['type']]):
+                entry = changed.get(id)
+                if (entry == None):
+                    entry = {'lpath': lpath, 'modify_time': modify_time, 'replicas': set()}
+                    changed[id] = entry
+                entry['modify_time'] = max(entry['modify_time'], modify_time)
+                entry['replicas'].add(replica_number)
+
+            for id, entry in changed.items():
+                previous = known.get(id)
+                if (previous == None):
+                    known[id] = entry
+                    events.append({'event': 'created', 'type': kind['type'], 'lpath': entry['lpath'], 'modify_time': entry['modify_time']})
+                elif ((entry['modify_time'] > previous['modify_time']) or (entry['lpath'] != previous['lpath'])):
+                    previous['lpath'] = entry['lpath']
+                    previous['modify_time'] = entry['modify_time']
+                    previous['replicas'] |= entry['replicas']
+                    events.append({'event': 'modified', 'type': kind['type'], 'lpath': entry['lpath'], 'modify_time': entry['modify_time']})
+                self.watermarks[kind['type']] = max(self.watermarks[kind['type']], entry['modify_time'])
+
+            # Removals and entries created with an older modify time only show up in the counts.
+            rows = list(self.api.queries.execute_genquery_paged(kind['count'] + ' WHERE ' + self._condition()))
+            count = 0
+            if ((len(rows) > 0) and (rows[0][0] != '')):
+                count = int(rows[0][0])
+            if (count != sum(len(entry['replicas']) for entry in known.values())):
+                self._scan(kind, known, events)
+
+        return(events)
+
+
+    def watch(self):
+        """
+        Polls the watched tree every interval seconds until stop() is called.
+
+        Returns
+        - A generator yielding each event as it is detected. See poll() for the format of events.
+        """
+        self._stop.clear()
+        while (not self._stop.is_set()):
+            for event in self.poll():
+                yield event
+            self._stop.wait(self.interval)
+
+
+    def run(self, callback):
+        """
+        Polls the watched tree every interval seconds until stop() is called, passing each event to callback.
+
+        Parameters
+        - callback: A function called with each event. See poll() for the format of events.
+        """
+        if (not callable(callback)):
+            raise TypeError('callback must be callable')
+        for event in self.watch():
+            callback(event)
+
+
+    def stop(self):
+        """ Stops watch() and run() after the current poll. Safe to call from another thread. """
+        self._stop.set()
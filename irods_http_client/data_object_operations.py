@@ -1,15 +1,32 @@
 import requests
 import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from irods_http_client.coalescing import RequestCoalescer
+from irods_http_client.query_operations import Queries, genquery_tree_condition, quote_genquery_value
+from irods_http_client.rate_limiter import RateLimiter
 
 class DataObjects:
-    def __init__(self, url_base: str):
+    def __init__(self, url_base: str, coalescer: RequestCoalescer=None):
         """" 
         Initializes DataObjects with a base url. 
         Token is set to None initially, and updated when setToken() is called in irodsClient.
+        Idempotent GET operations are sent through the given RequestCoalescer, or a private one if none is given.
         """
         self.url_base = url_base
         self.token = None
 
+        if (coalescer == None):
+            coalescer = RequestCoalescer()
+        self.coalescer = coalescer
+
+        self.queries = Queries(url_base, coalescer)
+
+        # Functions called with the lpath after set_permission() or modify_permissions() reaches the server.
+        self.permission_listeners = []
+
 
     def touch(self, lpath, no_create: int=0, replica_number: int=-1, leaf_resources: str='', seconds_since_epoch=-1, reference=''):
         """
@@ -206,11 +223,11 @@ class DataObjects:
         if (self.token == None):
             raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
         if (not isinstance(lpath, str)):
-            raise T('lpath must be a string')
+            raise TypeError('lpath must be a string')
         if (not isinstance(resource, str)):
-            raise T('resource must be a string')
+            raise TypeError('resource must be a string')
         if (not isinstance(replica_number, int)):
-            raise T('replica_number must be an int')
+            raise TypeError('replica_number must be an int')
         if (not replica_number >= -1):
             raise ValueError('replica number must be greater than or equal to 0 or flag value -1')
         if (not isinstance(force, int)):
@@ -305,7 +322,7 @@ class DataObjects:
         if (not isinstance(compute_checksums, int)):
             raise TypeError('compute_checksums must be an int 1 or 0')
         if ((not compute_checksums == 0) and (not compute_checksums == 1)):
-            raise ValueError('force must be an int 1 or 0')
+            raise ValueError('compute_checksums must be an int 1 or 0')
         if (not isinstance(admin, int)):
             raise TypeError('admin must be an int 1 or 0')
         if ((not admin == 0) and (not admin == 1)):
@@ -317,7 +334,7 @@ class DataObjects:
         }
 
         data = {
-            'op': 'calculate_checksum',
+            'op': 'verify_checksum',
             'lpath': lpath,
             'compute-checksums': compute_checksums,
             'admin': admin
@@ -390,7 +407,7 @@ class DataObjects:
             'ticket': ticket
         }
 
-        r = requests.get(self.url_base + '/data-objects', params=params, headers=headers)
+        r = self.coalescer.get(self.url_base + '/data-objects', params=params, headers=headers)
 
         if (r.status_code / 100 == 2):
             rdict = r.json()
@@ -420,6 +437,295 @@ class DataObjects:
             )
         
 
+    def stat_many(self, lpaths: list, batch_size: int=50, workers: int=4):
+        """
+        Gives information about many data objects using batched GenQuery calls.
+
+        Paths are grouped by collection, and each group is resolved with queries of the form
+        COLL_NAME = '<collection>' AND DATA_NAME IN (<names>), run concurrently.
+
+        Parameters
+        - lpaths: A list of absolute logical paths of the data objects being accessed.
+        - batch_size (optional): The maximum number of data object names per query. Defaults to 50.
+        - workers (optional): The number of queries to run concurrently. Defaults to 4.
+
+        Returns
+        - A dict containing the results in input order and a list of the paths that do not exist.
+        - Each result is None for a missing path, otherwise a dict with the lpath, size, checksum, modify_time
+          and owner of the data object, and a list of its replicas.
+        - A RuntimeError is raised if any query fails.
+        """
+        if (self.token == None):
+            raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
+        if (not isinstance(lpaths, list)):
+            raise TypeError('lpaths must be a list of strings')
+        for lpath in lpaths:
+            if (not isinstance(lpath, str)):
+                raise TypeError('lpaths must be a list of strings')
+            if (not lpath.startswith('/')):
+                raise ValueError('lpaths must contain absolute logical paths')
+        if (not isinstance(batch_size, int)):
+            raise TypeError('batch_size must be an int')
+        if (not batch_size > 0):
+            raise ValueError('batch_size must be greater than 0')
+        if (not isinstance(workers, int)):
+            raise TypeError('workers must be an int')
+        if (not workers > 0):
+            raise ValueError('workers must be greater than 0')
+
+        self.queries.token = self.token
+
+        # Group the unique data object names by their parent collection.
+        names_by_collection = {}
+        for lpath in lpaths:
+            collection, name = lpath.rsplit('/', 1)
+            names = names_by_collection.setdefault(collection, [])
+            if (not name in names):
+                names.append(name)
+
+        batches = []
+        for collection, names in names_by_collection.items():
+            for i in range(0, len(names), batch_size):
+                batches.append((collection, names[i:i + batch_size]))
+
+        def run_batch(batch):
+            collection, names = batch
+            query = (
+                'SELECT DATA_ID, COLL_NAME, DATA_NAME, DATA_REPL_NUM, DATA_SIZE, DATA_CHECKSUM, DATA_MODIFY_TIME, '
+                'DATA_OWNER_NAME, DATA_RESC_HIER, DATA_REPL_STATUS '
+                'WHERE COLL_NAME = ' + quote_genquery_value(collection) + ' '
+                'AND DATA_NAME IN (' + ', '.join(quote_genquery_value(n) for n in names) + ')'
+            )
+            return(list(self.queries.execute_genquery_paged(query)))
+
+        found = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for rows in executor.map(run_batch, batches):
+                for row in rows:
+                    lpath = row[1] + '/' + row[2]
+                    replica = {
+                        'replica_number': int(row[3]),
+                        'size': int(row[4]),
+                        'checksum': row[5],
+                        'modify_time': int(row[6]),
+                        'resource_hierarchy': row[8],
+                        'status': row[9]
+                    }
+                    entry = found.get(lpath)
+                    if (entry == None):
+                        entry = {
+                            'lpath': lpath,
+                            'id': row[0],
+                            'owner': row[7],
+                            'replicas': []
+                        }
+                        found[lpath] = entry
+                    entry['replicas'].append(replica)
+
+        for entry in found.values():
+            entry['replicas'].sort(key=lambda replica: replica['replica_number'])
+
+            # Describe the data object using its first good replica, if there is one.
+            primary = entry['replicas'][0]
+            for replica in entry['replicas']:
+                if (replica['status'] == '1'):
+                    primary = replica
+                    break
+            entry['size'] = primary['size']
+            entry['checksum'] = primary['checksum']
+            entry['modify_time'] = primary['modify_time']
+
+        results = []
+        missing = []
+        for lpath in lpaths:
+            entry = found.get(lpath)
+            if (entry == None):
+                missing.append(lpath)
+            results.append(entry)
+
+        print('Information for ' + str(len(lpaths) - len(missing)) + ' of ' + str(len(lpaths)) + ' data objects retrieved successfully')
+
+        return(
+            {
+                'results': results,
+                'missing': missing
+            }
+        )
+
+
+    def checksum_tree(self, lpath: str, workers: int=4, force: int=0, rate_limit: float=0, cursor_file: str='', admin: int=0):
+        """
+        Calculates the checksums of the data objects in a collection tree.
+
+        Data objects are visited in order of their id with paginated GenQuery. Without force, only replicas
+        without a checksum are calculated. GenQuery cannot match empty values, so replicas are filtered as rows arrive.
+        When cursor_file is given, the id below which every data object has been handled is saved to it as the sweep
+        progresses, and a later call with the same file continues from there. The file is removed once the sweep completes.
+
+        Parameters
+        - lpath: The absolute logical path of the collection tree.
+        - workers (optional): The number of checksums to calculate concurrently. Defaults to 4.
+        - force (optional): Set to 1 to recalculate every checksum, otherwise set to 0. Defaults to 0.
+        - rate_limit (optional): The maximum number of calculate_checksum requests per second. Set to 0 for no limit. Defaults to 0.
+        - cursor_file (optional): The path of a local file used to resume interrupted sweeps.
+        - admin (optional): Set to 1 to run this operation as an admin, otherwise set to 0. Defaults to 0.
+
+        Returns
+        - A dict with the number of data objects checked, the number of requests sent and calculated, the elapsed seconds,
+          the cursor reached, and a list of failures. Each failure contains the lpath and replica number,
+          and the HTTP and iRODS status codes or the error raised. Failed data objects are not retried when resuming.
+        - A RuntimeError is raised if any query fails.
+        """
+        if (self.token == None):
+            raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
+        if (not isinstance(lpath, str)):
+            raise TypeError('lpath must be a string')
+        if (not isinstance(workers, int)):
+            raise TypeError('workers must be an int')
+        if (not workers > 0):
+            raise ValueError('workers must be greater than 0')
+        if (not isinstance(force, int)):
+            raise TypeError('force must be an int 1 or 0')
+        if ((not force == 0) and (not force == 1)):
+            raise ValueError('force must be an int 1 or 0')
+        if (not isinstance(rate_limit, (int, float))):
+            raise TypeError('rate_limit must be a number')
+        if (not rate_limit >= 0):
+            raise ValueError('rate_limit must be greater than or equal to 0')
+        if (not isinstance(cursor_file, str)):
+            raise TypeError('cursor_file must be a string')
+        if (not isinstance(admin, int)):
+            raise TypeError('admin must be an int 1 or 0')
+        if ((not admin == 0) and (not admin == 1)):
+            raise ValueError('admin must be an int 1 or 0')
+
+        self.queries.token = self.token
+        if (lpath != '/'):
+            lpath = lpath.rstrip('/')
+
+        cursor = 0
+        if ((cursor_file != '') and os.path.exists(cursor_file)):
+            with open(cursor_file) as f:
+                saved = json.load(f)
+            if (saved['lpath'] == lpath):
+                cursor = saved['data_id']
+
+        limiter = None
+        if (rate_limit > 0):
+            limiter = RateLimiter(rate_limit)
+
+        report = {
+            'checked': 0,
+            'requests': 0,
+            'calculated': 0,
+            'failures': []
+        }
+        lock = threading.Lock()
+        # Limits the number of data objects queued in the executor so memory stays bounded.
+        slots = threading.BoundedSemaphore(workers * 2)
+        in_flight = set()
+        progress = {'cursor': cursor, 'submitted': cursor, 'saved': time.monotonic()}
+
+        def save_cursor():
+            temporary = cursor_file + '.tmp'
+            with open(temporary, 'w') as f:
+                json.dump({'lpath': lpath, 'data_id': progress['cursor']}, f)
+            os.replace(temporary, cursor_file)
+
+        def checksum(data_id, object_path, replica_numbers):
+            try:
+                # One request covers every replica when they all need a checksum.
+                targets = replica_numbers
+                if (force or (replica_numbers == None)):
+                    targets = [-1]
+                for replica_number in targets:
+                    if (limiter != None):
+                        limiter.acquire()
+                    failure = None
+                    try:
+                        if (replica_number == -1):
+                            r = self.calculate_checksum(object_path, force=force, all=1, admin=admin)
+                        else:
+                            r = self.calculate_checksum(object_path, replica_number=replica_number, force=force, admin=admin)
+                        if (r['status_code'] / 100 != 2):
+                            failure = {'lpath': object_path, 'replica_number': replica_number, 'status_code': r['status_code'], 'irods_status_code': None}
+                        elif (r['data']['irods_response']['status_code']):
+                            failure = {'lpath': object_path, 'replica_number': replica_number, 'status_code': r['status_code'],
+                                       'irods_status_code': r['data']['irods_response']['status_code']}
+                    except Exception as e:
+                        failure = {'lpath': object_path, 'replica_number': replica_number, 'error': str(e)}
+
+                    with lock:
+                        report['requests'] += 1
+                        if (failure == None):
+                            report['calculated'] += 1
+                        else:
+                            report['failures'].append(failure)
+            finally:
+                slots.release()
+                with lock:
+                    in_flight.discard(data_id)
+                    # Every data object below the oldest one still running has been handled.
+                    progress['cursor'] = (min(in_flight) - 1) if (len(in_flight) > 0) else progress['submitted']
+                    if ((cursor_file != '') and (time.monotonic() - progress['saved'] >= 1)):
+                        progress['saved'] = time.monotonic()
+                        save_cursor()
+
+        def submit(executor, data_id, object_path, replicas):
+            # replicas maps each replica number to its checksum. None means every replica needs a checksum.
+            missing = [number for number, value in sorted(replicas.items()) if (value == '')]
+            with lock:
+                report['checked'] += 1
+                progress['submitted'] = data_id
+                if ((not force) and (len(missing) == 0)):
+                    if (len(in_flight) == 0):
+                        progress['cursor'] = data_id
+                    return
+                # Marked before waiting for a slot, so a worker finishing meanwhile cannot move the cursor past it.
+                in_flight.add(data_id)
+            if (len(missing) == len(replicas)):
+                missing = None
+            slots.acquire()
+            executor.submit(checksum, data_id, object_path, missing)
+
+        query = (
+            'SELECT ORDER(DATA_ID), COLL_NAME, DATA_NAME, DATA_REPL_NUM, DATA_CHECKSUM '
+            'WHERE ' + genquery_tree_condition(lpath) + ' '
+            'AND DATA_ID > ' + quote_genquery_value(str(cursor))
+        )
+
+        start = time.time()
+        completed = False
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                current = None
+                for row in self.queries.execute_genquery_paged(query):
+                    data_id = int(row[0])
+                    if ((current == None) or (current[0] != data_id)):
+                        if (current != None):
+                            submit(executor, *current)
+                        current = (data_id, row[1].rstrip('/') + '/' + row[2], {})
+                    current[2][int(row[3])] = row[4]
+                if (current != None):
+                    submit(executor, *current)
+            completed = True
+        finally:
+            if (cursor_file != ''):
+                if (completed):
+                    if (os.path.exists(cursor_file)):
+                        os.remove(cursor_file)
+                else:
+                    save_cursor()
+
+        report['cursor'] = progress['cursor']
+        report['elapsed'] = time.time() - start
+
+        print('Checksums calculated for ' + str(report['calculated']) + ' of ' + str(report['requests']) + ' requests over ' +
+              str(report['checked']) + ' data objects under \'' + lpath + '\' (' + str(len(report['failures'])) + ' failed)')
+
+        return(report)
+
+        
     def rename(self, old_lpath: str, new_lpath: str):
         """
         Renames or moves a data object.
@@ -654,9 +960,9 @@ class DataObjects:
         if (self.token == None):
             raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
         if (not isinstance(lpath, str)):
-            raise T('lpath must be a string')
+            raise TypeError('lpath must be a string')
         if (not isinstance(replica_number, int)):
-            raise T('replica_number must be an int')
+            raise TypeError('replica_number must be an int')
         if (not isinstance(catalog_only, int)):
             raise TypeError('catalog_only must be an int 1 or 0')
         if ((not catalog_only == 0) and (not catalog_only == 1)):
@@ -795,7 +1101,7 @@ class DataObjects:
             )
         
 
-    def read(self, lpath: str, offset: int=0, count: int=-1, ticket: str=''):
+    def read(self, lpath: str, offset: int=0, count: int=-1, ticket: str='', as_bytes: int=0):
         """
         Reads bytes from a data object.
 
@@ -804,9 +1110,11 @@ class DataObjects:
         - offset (optional): The number of bytes to skip. Defaults to 0.
         - count (optional): The number of bytes to read.
         - ticket (optional): Ticket to be enabled before the operation. Defaults to an empty string.
+        - as_bytes (optional): Set to 1 to return the bytes read, otherwise set to 0 to return them decoded as text. Defaults to 0.
 
         Returns
-        - A dict containing the HTTP status code and iRODS response.
+        - The contents read if successful.
+        - Otherwise a dict containing the HTTP status code and iRODS response.
         - The iRODS response is only valid if no error occurred during HTTP communication.
         """
         if (self.token == None):
@@ -821,6 +1129,10 @@ class DataObjects:
             raise ValueError('count must be greater than or equal to 0 or flag value -1')
         if (not isinstance(ticket, str)):
             raise TypeError('ticket must be a string')
+        if (not isinstance(as_bytes, int)):
+            raise TypeError('as_bytes must be an int 1 or 0')
+        if ((not as_bytes == 0) and (not as_bytes == 1)):
+            raise ValueError('as_bytes must be an int 1 or 0')
         
         headers = {
             'Authorization': 'Bearer ' + self.token,
@@ -843,6 +1155,8 @@ class DataObjects:
 
         if (r.status_code / 100 == 2):
             print('Sucessfully read \'' + lpath + '\'')
+            if (as_bytes):
+                return(r.content)
             return(r.text)
         else:
             irods_err = ''
@@ -1211,6 +1525,8 @@ class DataObjects:
 
         if (r.status_code / 100 == 2):
             rdict = r.json()
+            for listener in self.permission_listeners:
+                listener(lpath)
 
             if rdict['irods_response']['status_code']:
                 print('Failed to set permission for \'' + lpath + '\': iRODS Status Code' + str(rdict['irods_response']['status_code']))
@@ -1281,6 +1597,8 @@ class DataObjects:
 
         if (r.status_code / 100 == 2):
             rdict = r.json()
+            for listener in self.permission_listeners:
+                listener(lpath)
 
             if rdict['irods_response']['status_code']:
                 print('Failed to modify permissions for \'' + lpath + '\': iRODS Status Code' + str(rdict['irods_response']['status_code']))
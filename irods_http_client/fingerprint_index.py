@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import threading
+import time
+from irods_http_client.transfer import file_checksum
+
+class FingerprintIndex:
+
+    def __init__(self, path: str, commit_interval: float=1.0):
+        """
+        Initializes a FingerprintIndex caching the checksums of local files in a SQLite file.
+
+        A cached checksum is used as long as the file's device, inode, size and modification time in
+        nanoseconds are unchanged, so unchanged files are not read again. Writes are committed at most
+        every commit_interval seconds and on flush() or close().
+
+        Parameters
+        - path: The path of the SQLite file. Created if it does not exist.
+        - commit_interval (optional): The number of seconds between commits. Defaults to 1.
+        """
+        if (not isinstance(path, str)):
+            raise TypeError('path must be a string')
+        if (not isinstance(commit_interval, (int, float))):
+            raise TypeError('commit_interval must be a number')
+        if (not commit_interval >= 0):
+            raise ValueError('commit_interval must be greater than or equal to 0')
+
+        self.path = path
+        self.commit_interval = commit_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS fingerprints ('
+            'device INTEGER, inode INTEGER, size INTEGER, mtime_ns INTEGER, checksum TEXT, '
+            'PRIMARY KEY (device, inode))'
+        )
+        self._connection.commit()
+        self._committed = time.monotonic()
+
+
+    def get(self, stat):
+        """
+        Returns the cached checksum of a file.
+
+        Parameters
+        - stat: The result of os.stat() for the file.
+
+        Returns
+        - The checksum, or None if the file is not in the index or its fingerprint changed.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT checksum FROM fingerprints WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ?',
+                (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            ).fetchone()
+        if (row == None):
+            return(None)
+        return(row[0])
+
+
+    def put(self, stat, checksum: str):
+        """
+        Records the checksum of a file, replacing any previous entry for it.
+
+        Parameters
+        - stat: The result of os.stat() for the file, taken before it was read.
+        - checksum: The checksum of the file.
+        """
+        if (not isinstance(checksum, str)):
+            raise TypeError('checksum must be a string')
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?)',
+                (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns, checksum)
+            )
+            if (time.monotonic() - self._committed >= self.commit_interval):
+                self._connection.commit()
+                self._committed = time.monotonic()
+
+
+    def checksum(self, local_path: str, chunk_size: int=8 * 1024 * 1024):
+        """
+        Returns the checksum of a file, computing it only if its fingerprint changed.
+
+        Parameters
+        - local_path: The path of the local file.
+        - chunk_size (optional): The number of bytes read at a time when computing the checksum. Defaults to 8 MiB.
+
+        Returns
+        - The checksum in the 'sha2:' form used by iRODS.
+        """
+        stat = os.stat(local_path)
+        checksum = self.get(stat)
+        if (checksum != None):
+            self.hits += 1
+            return(checksum)
+
+        self.misses += 1
+        checksum = file_checksum(local_path, chunk_size)
+        self.put(stat, checksum)
+        return(checksum)
+
+
+    def flush(self):
+        """ Commits the recorded checksums. """
+        with self._lock:
+            self._connection.commit()
+            self._committed = time.monotonic()
+
+
+    def close(self):
+        """ Commits the recorded checksums and closes the SQLite file. """
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
+
+
+    def __enter__(self):
+        return(self)
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,220 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from irods_http_client.query_operations import genquery_tree_condition, quote_genquery_value
+from irods_http_client.rate_limiter import RateLimiter
+
+# iRODS error codes reporting that a replica does not match its checksum: USER_CHKSUM_MISMATCH,
+# and CHECK_VERIFICATION_RESULTS, returned with the details of each replica in the results.
+_MISMATCH_CODES = (-314000, -1803000)
+
+class FixitySweeper:
+
+    def __init__(self, api, lpath: str, cursor_file: str='', bytes_per_second: float=0, workers: int=4):
+        """
+        Initializes a FixitySweeper verifying the checksums of every replica in a collection tree.
+
+        Replicas are visited in order of their data object id, starting from a cursor saved in
+        cursor_file. Once the end of the tree is reached the cursor returns to the start, so each
+        sweep continues with the replicas that were verified longest ago. The catalog does not
+        record when a replica was last verified, which is why the order is kept by the cursor.
+
+        Parameters
+        - api: The IrodsHttpClient used to query the catalog and verify checksums. Its token must be set before sweeping.
+        - lpath: The absolute logical path of the collection tree.
+        - cursor_file (optional): The path of a local file holding the cursor between sweeps. Without it, every sweep starts from the beginning.
+        - bytes_per_second (optional): The maximum number of replica bytes verified per second. Set to 0 for no limit. Defaults to 0.
+        - workers (optional): The number of verifications to run concurrently. Defaults to 4.
+        """
+        if (not isinstance(lpath, str)):
+            raise TypeError('lpath must be a string')
+        if (not isinstance(cursor_file, str)):
+            raise TypeError('cursor_file must be a string')
+        if (not isinstance(bytes_per_second, (int, float))):
+            raise TypeError('bytes_per_second must be a number')
+        if (not bytes_per_second >= 0):
+            raise ValueError('bytes_per_second must be greater than or equal to 0')
+        if (not isinstance(workers, int)):
+            raise TypeError('workers must be an int')
+        if (not workers > 0):
+            raise ValueError('workers must be greater than 0')
+
+        self.api = api
+        self.lpath = lpath
+        if (lpath != '/'):
+            self.lpath = lpath.rstrip('/')
+        self.cursor_file = cursor_file
+        self.workers = workers
+        self.limiter = None
+        if (bytes_per_second > 0):
+            self.limiter = RateLimiter(bytes_per_second)
+
+        self.cursor = 0
+        if ((cursor_file != '') and os.path.exists(cursor_file)):
+            with open(cursor_file) as f:
+                saved = json.load(f)
+            if (saved['lpath'] == self.lpath):
+                self.cursor = saved['data_id']
+
+        self.last_sweep = None
+
+
+    def _save_cursor(self):
+        """ Saves the cursor, replacing the file atomically. """
+        if (self.cursor_file == ''):
+            return
+        temporary = self.cursor_file + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'lpath': self.lpath, 'data_id': self.cursor}, f)
+        os.replace(temporary, self.cursor_file)
+
+
+    def _verify(self, object_path: str, replicas: list):
+        """
+        Verifies each replica of a data object. Returns the mismatches and failures found.
+
+        Only checksum mismatch codes count as mismatches. Any other iRODS error, such as a missing
+        permission or replica, means the replica could not be verified and is a failure.
+        """
+        mismatches = []
+        failures = []
+        verified = 0
+        for replica_number, size in replicas:
+            if (self.limiter != None):
+                self.limiter.acquire(size)
+            try:
+                r = self.api.data_objects.verify_checksum(object_path, replica_number=replica_number)
+                if (r['status_code'] / 100 != 2):
+                    failures.append({'lpath': object_path, 'replica_number': replica_number, 'status_code': r['status_code']})
+                    continue
+                irods_status_code = r['data']['irods_response']['status_code']
+                # Error codes may carry an errno in their last three digits.
+                if ((irods_status_code != 0) and (-(-irods_status_code // 1000 * 1000) not in _MISMATCH_CODES)):
+                    failures.append({'lpath': object_path, 'replica_number': replica_number, 'irods_status_code': irods_status_code})
+                    continue
+                verified += 1
+                if (irods_status_code):
+                    mismatches.append({
+                        'lpath': object_path,
+                        'replica_number': replica_number,
+                        'size': size,
+                        'irods_status_code': irods_status_code,
+                        'results': r['data'].get('results')
+                    })
+            except Exception as e:
+                failures.append({'lpath': object_path, 'replica_number': replica_number, 'error': str(e)})
+        return(verified, mismatches, failures)
+
+
+    def sweep(self, max_bytes: int=0):
+        """
+        Verifies replicas from the saved cursor onwards.
+
+        Parameters
+        - max_bytes (optional): Stop once data objects totalling this many bytes have been started, keeping
+          the rest for the next sweep. Set to 0 to continue to the end of the tree. Defaults to 0.
+
+        Returns
+        - A generator yielding each mismatch as it is found. Each mismatch contains the lpath, replica_number,
+          size, the iRODS status code, and the results returned by the server. When the generator finishes,
+          last_sweep holds the number of replicas and bytes verified, the mismatches, failures, elapsed seconds,
+          and whether the end of the tree was reached. Replicas that could not be verified, for example because
+          of a missing permission, are failures rather than mismatches. The cursor is saved even if the generator is closed early.
+        - A RuntimeError is raised if any query fails.
+        """
+        if (not isinstance(max_bytes, int)):
+            raise TypeError('max_bytes must be an int')
+        if (not max_bytes >= 0):
+            raise ValueError('max_bytes must be greater than or equal to 0')
+        if (self.api.queries.token == None):
+            raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
+
+        return(self._sweep(max_bytes))
+
+
+    def _sweep(self, max_bytes: int):
+        report = {
+            'verified': 0,
+            'bytes': 0,
+            'mismatches': 0,
+            'failures': [],
+            'complete': False
+        }
+        start = time.time()
+        query = (
+            'SELECT ORDER(DATA_ID), COLL_NAME, DATA_NAME, DATA_REPL_NUM, DATA_SIZE '
+            'WHERE ' + genquery_tree_condition(self.lpath) + ' '
+            'AND DATA_ID > ' + quote_genquery_value(str(self.cursor))
+        )
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = {}
+        in_flight = set()
+        submitted = {'data_id': self.cursor, 'bytes': 0}
+
+        def finish(future):
+            # Returns the mismatches of a finished data object and moves the cursor past everything completed.
+            data_id, size = pending.pop(future)
+            in_flight.discard(data_id)
+            self.cursor = (min(in_flight) - 1) if (len(in_flight) > 0) else submitted['data_id']
+            verified, mismatches, failures = future.result()
+            report['verified'] += verified
+            report['bytes'] += size
+            report['mismatches'] += len(mismatches)
+            report['failures'].extend(failures)
+            return(mismatches)
+
+        def submit(data_id, object_path, replicas):
+            submitted['data_id'] = data_id
+            size = sum(replica[1] for replica in replicas)
+            submitted['bytes'] += size
+            in_flight.add(data_id)
+            pending[executor.submit(self._verify, object_path, replicas)] = (data_id, size)
+
+        try:
+            current = None
+            stopped = False
+            for row in self.api.queries.execute_genquery_paged(query):
+                data_id = int(row[0])
+                if ((current == None) or (current[0] != data_id)):
+                    if (current != None):
+                        submit(*current)
+                        if ((max_bytes > 0) and (submitted['bytes'] >= max_bytes)):
+                            current = None
+                            stopped = True
+                            break
+                    current = (data_id, row[1].rstrip('/') + '/' + row[2], [])
+                current[2].append((int(row[3]), int(row[4])))
+
+                # Keep a bounded number of data objects queued, yielding mismatches as they are found.
+                while (len(pending) >= 2 * self.workers):
+                    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from finish(future)
+                for future in [f for f in pending if f.done()]:
+                    yield from finish(future)
+
+            if (current != None):
+                submit(*current)
+
+            while (len(pending) > 0):
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from finish(future)
+
+            if (not stopped):
+                # The whole tree has been verified, so the next sweep starts again from the beginning.
+                report['complete'] = True
+                self.cursor = 0
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            for future in [f for f in pending if f.done() and (not f.cancelled())]:
+                finish(future)
+            self._save_cursor()
+            report['cursor'] = self.cursor
+            report['elapsed'] = time.time() - start
+            self.last_sweep = report
+
+        print('Verified ' + str(report['verified']) + ' replicas (' + str(report['bytes']) + ' bytes) under \'' + self.lpath + '\': ' +
+              str(report['mismatches']) + ' mismatches, ' + str(len(report['failures'])) + ' failures')
@@ -0,0 +1,164 @@
+import threading
+import time
+
+class GroupMembership:
+
+    def __init__(self, api, zone: str='', ttl: float=300):
+        """
+        Initializes a cached view of the groups in a zone and their members.
+
+        The view is built from UsersGroups.groups() and a single paginated GenQuery over
+        USER_GROUP_NAME, and is rebuilt once it is ttl seconds old. If the membership query
+        cannot be run, membership is checked with UsersGroups.is_member_of_group() instead,
+        and each answer is cached.
+
+        Parameters
+        - api: The IrodsHttpClient used to query the catalog. Its token must be set before use.
+        - zone (optional): The zone of the users, used by is_member_of_group(). Defaults to the local zone.
+        - ttl (optional): The number of seconds the view is kept before being rebuilt. Defaults to 300.
+        """
+        if (not isinstance(zone, str)):
+            raise TypeError('zone must be a string')
+        if (not isinstance(ttl, (int, float))):
+            raise TypeError('ttl must be a number')
+        if (not ttl >= 0):
+            raise ValueError('ttl must be greater than or equal to 0')
+
+        self.api = api
+        self.zone = zone
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._expires = 0
+        self._groups = set()
+        # group -> set of user names, or None when the membership query could not be run.
+        self._members = None
+        self._checked = {}
+
+
+    def _load(self):
+        """ Rebuilds the view if it has expired. """
+        with self._lock:
+            if (time.monotonic() < self._expires):
+                return
+
+            r = self.api.users_groups.groups()
+            if (r['status_code'] / 100 != 2):
+                raise RuntimeError('Failed to list groups: HTTP Status Code ' + str(r['status_code']))
+            if (r['data']['irods_response']['status_code']):
+                raise RuntimeError('Failed to list groups: iRODS Status Code ' + str(r['data']['irods_response']['status_code']))
+            groups = set(r['data']['groups'])
+
+            members = {group: set() for group in groups}
+            try:
+                for group, user in self.api.queries.execute_genquery_paged('SELECT USER_GROUP_NAME, USER_NAME WHERE USER_TYPE != \'rodsgroup\''):
+                    # Every user is also listed as a member of a group named after itself.
+                    if ((group in members) and (group != user)):
+                        members[group].add(user)
+            except RuntimeError:
+                members = None
+
+            self._groups = groups
+            self._members = members
+            self._checked = {}
+            self._expires = time.monotonic() + self.ttl
+
+
+    def groups(self):
+        """
+        Returns the names of all groups in the zone.
+
+        Returns
+        - A set of group names.
+        - A RuntimeError is raised if the groups cannot be listed.
+        """
+        self._load()
+        with self._lock:
+            return(set(self._groups))
+
+
+    def is_group(self, name: str):
+        """
+        Checks whether a name belongs to a group.
+
+        Parameters
+        - name: The name of the user or group.
+
+        Returns
+        - True if name is a group, otherwise False.
+        """
+        self._load()
+        with self._lock:
+            return(name in self._groups)
+
+
+    def members(self, group: str):
+        """
+        Returns the members of a group.
+
+        Parameters
+        - group: The name of the group.
+
+        Returns
+        - A set of user names, empty if group is not a group.
+        - A RuntimeError is raised if membership cannot be listed, in which case is_member() still works.
+        """
+        self._load()
+        with self._lock:
+            if (self._members == None):
+                raise RuntimeError('Group membership cannot be listed. Use is_member() instead')
+            return(set(self._members.get(group, ())))
+
+
+    def is_member(self, group: str, user: str):
+        """
+        Checks whether a user is a member of a group.
+
+        Parameters
+        - group: The name of the group.
+        - user: The name of the user.
+
+        Returns
+        - True if user is a member of group, otherwise False.
+        """
+        self._load()
+        with self._lock:
+            if (not group in self._groups):
+                return(False)
+            if (self._members != None):
+                return(user in self._members[group])
+            key = (group, user)
+            if (key in self._checked):
+                return(self._checked[key])
+
+        r = self.api.users_groups.is_member_of_group(group, user, self.zone)
+        if (r['status_code'] / 100 != 2):
+            raise RuntimeError('Failed to check group membership: HTTP Status Code ' + str(r['status_code']))
+        if (r['data']['irods_response']['status_code']):
+            raise RuntimeError('Failed to check group membership: iRODS Status Code ' + str(r['data']['irods_response']['status_code']))
+        with self._lock:
+            self._checked[(group, user)] = r['data']['is_member']
+        return(r['data']['is_member'])
+
+
+    def groups_of(self, user: str):
+        """
+        Returns the groups a user is a member of.
+
+        Parameters
+        - user: The name of the user.
+
+        Returns
+        - A set of group names.
+        """
+        self._load()
+        with self._lock:
+            groups = set(self._groups)
+            if (self._members != None):
+                return(set(group for group in groups if user in self._members[group]))
+        return(set(group for group in groups if self.is_member(group, user)))
+
+
+    def invalidate(self):
+        """ Discards the cached view, so it is rebuilt on next use. """
+        with self._lock:
+            self._expires = 0
@@ -6,6 +6,7 @@ from irods_http_client.rule_operations import Rules
 from irods_http_client.ticket_operations import Tickets
 from irods_http_client.user_group_operations import UsersGroups
 from irods_http_client.zone_operations import Zones
+from irods_http_client.coalescing import RequestCoalescer
 import requests
 
 class IrodsHttpClient:
@@ -14,14 +15,17 @@ class IrodsHttpClient:
         self.url_base = url_base
         self.token = None
 
-        self.collections = Collections(url_base)
-        self.data_objects = DataObjects(url_base)
-        self.queries = Queries(url_base)
-        self.resources = Resources(url_base)
+        # Shared by all endpoint operations so identical in-flight GET requests are coalesced.
+        self.coalescer = RequestCoalescer()
+
+        self.collections = Collections(url_base, self.coalescer)
+        self.data_objects = DataObjects(url_base, self.coalescer)
+        self.queries = Queries(url_base, self.coalescer)
+        self.resources = Resources(url_base, self.coalescer)
         self.rules = Rules(url_base)
         self.tickets = Tickets(url_base)
-        self.users_groups = UsersGroups(url_base)
-        self.zones = Zones(url_base)
+        self.users_groups = UsersGroups(url_base, self.coalescer)
+        self.zones = Zones(url_base, self.coalescer)
 
 
     def authenticate(self, username: str='', password: str='', openid_token: str=''):
@@ -79,6 +83,17 @@ class IrodsHttpClient:
     def getToken(self):
         """ Returns the authentication token currently in use """
         return(self.token)
+
+
+    def stats(self):
+        """
+        Returns request statistics for this client.
+
+        Returns
+        - A dict containing the number of idempotent GET requests made, how many of them were
+          coalesced into an identical in-flight request, and how many are currently in flight.
+        """
+        return(self.coalescer.stats())
     
 
     def info(self):
@@ -0,0 +1,111 @@
+import codecs
+import json
+
+class JsonArrayStream:
+
+    def __init__(self, chunks, key: str):
+        """
+        Initializes a JsonArrayStream over the chunks of a JSON object.
+
+        Iterating over the stream yields the elements of the array stored under key, as soon
+        as each element has been received. Only one element is held in memory at a time.
+        The other members of the object are collected in document.
+
+        Parameters
+        - chunks: An iterable of bytes or str chunks making up a JSON object, such as requests.Response.iter_content().
+        - key: The name of the top-level member holding the array to be streamed.
+        """
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self.key = key
+        self.document = {}
+
+
+    def _fill(self):
+        """ Reads the next chunk into the buffer. Returns False once the input is exhausted. """
+        if (self._eof):
+            return(False)
+
+        # Drop the consumed part of the buffer so memory stays proportional to one element.
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+
+        for chunk in self._chunks:
+            if (isinstance(chunk, bytes)):
+                chunk = self._decoder.decode(chunk)
+            if (chunk != ''):
+                self._buffer += chunk
+                return(True)
+
+        self._buffer += self._decoder.decode(b'', final=True)
+        self._eof = True
+        return(False)
+
+
+    def _skip_whitespace(self):
+        """ Moves past whitespace. Returns the next character, or '' at the end of the input. """
+        while True:
+            while ((self._pos < len(self._buffer)) and (self._buffer[self._pos] in ' \t\r\n')):
+                self._pos += 1
+            if (self._pos < len(self._buffer)):
+                return(self._buffer[self._pos])
+            if (not self._fill()):
+                return('')
+
+
+    def _expect(self, characters: str):
+        """ Consumes and returns the next character, which must be one of characters. """
+        c = self._skip_whitespace()
+        if ((c == '') or (not c in characters)):
+            raise ValueError('Malformed JSON: expected one of \'' + characters + '\' at offset ' + str(self._pos))
+        self._pos += 1
+        return(c)
+
+
+    def _value(self):
+        """ Decodes the next complete JSON value, reading more chunks as needed. """
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+                # A number followed by nothing, or by part of a fraction or exponent, may continue in the next chunk.
+                if (self._eof or ((end < len(self._buffer)) and (not self._buffer[end] in '+-.0123456789eE'))):
+                    self._pos = end
+                    return(value)
+            except json.JSONDecodeError:
+                if (self._eof):
+                    raise
+            self._fill()
+
+
+    def __iter__(self):
+        """ Yields the elements of the streamed array in order. """
+        self._expect('{')
+        if (self._skip_whitespace() == '}'):
+            self._pos += 1
+            return
+
+        while True:
+            name = self._value()
+            if (not isinstance(name, str)):
+                raise ValueError('Malformed JSON: object keys must be strings')
+            self._expect(':')
+
+            if ((name == self.key) and (self._skip_whitespace() == '[')):
+                self._pos += 1
+                if (self._skip_whitespace() == ']'):
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._value()
+                        if (self._expect(',]') == ']'):
+                            break
+            else:
+                self.document[name] = self._value()
+
+            if (self._expect(',}') == '}'):
+                return
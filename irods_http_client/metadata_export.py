@@ -0,0 +1,210 @@
+import csv
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from irods_http_client.query_operations import genquery_tree_condition, quote_genquery_value
+
+_COLUMNS = ['path', 'attribute', 'value', 'units']
+
+class MetadataExporter:
+
+    def __init__(self, api, row_group_size: int=10000, workers: int=4):
+        """
+        Initializes a MetadataExporter for writing the AVUs of a collection tree to a file.
+
+        The tree is split into shards: the collection itself, and one shard for the subtree of
+        each of its subcollections. Shards are queried concurrently with paginated GenQuery over
+        the META_DATA_ATTR_* and META_COLL_ATTR_* columns. Rows pass through a bounded queue to a
+        single writer which writes them in row groups, so memory use stays proportional to a few row groups.
+
+        Parameters
+        - api: The IrodsHttpClient used to query the catalog. Its token must be set before exporting.
+        - row_group_size (optional): The number of rows written at a time, and the row group size in Parquet files. Defaults to 10000.
+        - workers (optional): The number of shards queried concurrently. Defaults to 4.
+        """
+        if (not isinstance(row_group_size, int)):
+            raise TypeError('row_group_size must be an int')
+        if (not row_group_size > 0):
+            raise ValueError('row_group_size must be greater than 0')
+        if (not isinstance(workers, int)):
+            raise TypeError('workers must be an int')
+        if (not workers > 0):
+            raise ValueError('workers must be greater than 0')
+
+        self.api = api
+        self.row_group_size = row_group_size
+        self.workers = workers
+
+
+    def _queries(self, lpath: str):
+        """ Returns the GenQuery strings covering every AVU in the tree, split into shards. """
+        quoted = quote_genquery_value(lpath)
+        shards = ['COLL_NAME = ' + quoted]
+        for row in self.api.queries.execute_genquery_paged('SELECT COLL_NAME WHERE COLL_PARENT_NAME = ' + quoted):
+            if (row[0] != lpath):
+                shards.append(genquery_tree_condition(row[0]))
+
+        queries = []
+        for condition in shards:
+            queries.append('SELECT COLL_NAME, META_COLL_ATTR_NAME, META_COLL_ATTR_VALUE, META_COLL_ATTR_UNITS WHERE ' + condition)
+            queries.append('SELECT COLL_NAME, DATA_NAME, META_DATA_ATTR_NAME, META_DATA_ATTR_VALUE, META_DATA_ATTR_UNITS WHERE ' + condition)
+        return(queries)
+
+
+    def export(self, lpath: str, destination, format: str=None):
+        """
+        Exports the AVUs of a collection, and of every collection and data object beneath it.
+
+        Each row holds the path, attribute, value and units of one AVU. Rows are not sorted.
+
+        Parameters
+        - lpath: The absolute logical path of the collection tree to export.
+        - destination: The path of the file to write, or an open text file when writing CSV.
+        - format (optional): Either 'csv' or 'parquet'. Defaults to 'parquet' for destinations ending in '.parquet', otherwise 'csv'.
+          Writing Parquet requires pyarrow.
+
+        Returns
+        - A dict with the number of rows, the number of shards, and the elapsed seconds.
+        - A RuntimeError is raised if any query fails, or if pyarrow is needed and not installed.
+        """
+        if (not isinstance(lpath, str)):
+            raise TypeError('lpath must be a string')
+        if (format == None):
+            format = 'csv'
+            if (isinstance(destination, str) and destination.endswith('.parquet')):
+                format = 'parquet'
+        if ((not format == 'csv') and (not format == 'parquet')):
+            raise ValueError('format must be either \'csv\' or \'parquet\'')
+        if (self.api.queries.token == None):
+            raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
+        if (lpath != '/'):
+            lpath = lpath.rstrip('/')
+
+        start = time.time()
+        writer = _ParquetWriter(destination) if (format == 'parquet') else _CsvWriter(destination)
+        try:
+            queries = self._queries(lpath)
+            rows = 0
+            group = []
+            for batch in self._fetch(queries):
+                group.extend(batch)
+                while (len(group) >= self.row_group_size):
+                    writer.write(group[:self.row_group_size])
+                    rows += self.row_group_size
+                    group = group[self.row_group_size:]
+            if (len(group) > 0):
+                writer.write(group)
+                rows += len(group)
+        finally:
+            writer.close()
+
+        elapsed = time.time() - start
+        print('Exported ' + str(rows) + ' AVUs under \'' + lpath + '\' in ' + str(round(elapsed, 3)) + ' seconds')
+
+        return({
+            'rows': rows,
+            'shards': len(queries) // 2,
+            'elapsed': elapsed
+        })
+
+
+    def _fetch(self, queries: list):
+        """
+        Runs the given queries on the worker threads, yielding their rows as (path, attribute, value, units) lists in batches.
+
+        A bounded queue between the query threads and the caller keeps memory use proportional to a few batches.
+        """
+        batches = queue.Queue(maxsize=2 * self.workers)
+        stop = threading.Event()
+
+        def put(item):
+            while (not stop.is_set()):
+                try:
+                    batches.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    pass
+
+        def produce(query):
+            try:
+                batch = []
+                for row in self.api.queries.execute_genquery_paged(query):
+                    if (stop.is_set()):
+                        return
+                    if (len(row) == 4):
+                        batch.append([row[0], row[1], row[2], row[3]])
+                    else:
+                        batch.append([row[0].rstrip('/') + '/' + row[1], row[2], row[3], row[4]])
+                    if (len(batch) == self.row_group_size):
+                        put(batch)
+                        batch = []
+                if (len(batch) > 0):
+                    put(batch)
+            finally:
+                batches.put(None)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(produce, query) for query in queries]
+            try:
+                remaining = len(queries)
+                while (remaining > 0):
+                    batch = batches.get()
+                    if (batch == None):
+                        remaining -= 1
+                    else:
+                        yield batch
+            finally:
+                if (remaining > 0):
+                    stop.set()
+                    while (not all(f.done() for f in futures)):
+                        try:
+                            batches.get(timeout=0.1)
+                        except queue.Empty:
+                            pass
+
+            for f in futures:
+                f.result()
+
+
+class _CsvWriter:
+    """ Writes rows to a CSV file with a header line. """
+
+    def __init__(self, destination):
+        self._file = None
+        if (isinstance(destination, str)):
+            self._file = open(destination, 'w', newline='')
+            destination = self._file
+        self._writer = csv.writer(destination)
+        self._writer.writerow(_COLUMNS)
+
+    def write(self, rows: list):
+        self._writer.writerows(rows)
+
+    def close(self):
+        if (self._file != None):
+            self._file.close()
+
+
+class _ParquetWriter:
+    """ Writes rows to a Parquet file, one row group per call to write(). """
+
+    def __init__(self, destination):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError('Writing Parquet requires pyarrow. Install it with \'pip install pyarrow\'')
+        if (not isinstance(destination, str)):
+            raise TypeError('destination must be a file path when writing Parquet')
+
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema([(column, pyarrow.string()) for column in _COLUMNS])
+        self._writer = pyarrow.parquet.ParquetWriter(destination, self._schema)
+
+    def write(self, rows: list):
+        columns = [[row[i] for row in rows] for i in range(len(_COLUMNS))]
+        self._writer.write_table(self._pyarrow.Table.from_arrays(columns, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
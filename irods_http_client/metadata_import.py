@@ -0,0 +1,237 @@
+import csv
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+_COLUMNS = ['path', 'attribute', 'value', 'units', 'op']
+
+class MetadataImporter:
+
+    def __init__(self, api, target: str='data_object', max_operations: int=100, workers: int=8, buffer_rows: int=100000, admin: int=0):
+        """
+        Initializes a MetadataImporter for loading many AVUs.
+
+        Rows are grouped per object, and the operations for each object are sent as one atomic
+        modify_metadata request. Objects with more than max_operations rows are split into several
+        requests, sent in order and each atomic on its own. Objects are processed concurrently.
+
+        Parameters
+        - api: The IrodsHttpClient used to modify the metadata. Its token must be set before importing.
+        - target (optional): The kind of object the paths refer to. Either 'data_object' or 'collection'. Defaults to 'data_object'.
+        - max_operations (optional): The maximum number of operations per request. Should not exceed the server's limit. Defaults to 100.
+        - workers (optional): The number of requests to run concurrently. Defaults to 8.
+        - buffer_rows (optional): The number of rows grouped in memory before they are sent. Rows for the same object
+          are only combined when they fall within the same window. Defaults to 100000.
+        - admin (optional): Set to 1 to run the operations as an admin, otherwise set to 0. Defaults to 0.
+        """
+        if (not isinstance(target, str)):
+            raise TypeError('target must be a string')
+        if ((not target == 'data_object') and (not target == 'collection')):
+            raise ValueError('target must be either \'data_object\' or \'collection\'')
+        if (not isinstance(max_operations, int)):
+            raise TypeError('max_operations must be an int')
+        if (not max_operations > 0):
+            raise ValueError('max_operations must be greater than 0')
+        if (not isinstance(workers, int)):
+            raise TypeError('workers must be an int')
+        if (not workers > 0):
+            raise ValueError('workers must be greater than 0')
+        if (not isinstance(buffer_rows, int)):
+            raise TypeError('buffer_rows must be an int')
+        if (not buffer_rows > 0):
+            raise ValueError('buffer_rows must be greater than 0')
+        if (not isinstance(admin, int)):
+            raise TypeError('admin must be an int 1 or 0')
+        if ((not admin == 0) and (not admin == 1)):
+            raise ValueError('admin must be an int 1 or 0')
+
+        self.api = api
+        self.target = target
+        self.max_operations = max_operations
+        self.workers = workers
+        self.buffer_rows = buffer_rows
+        self.admin = admin
+
+
+    def import_rows(self, rows):
+        """
+        Imports AVU operations from an iterable of rows.
+
+        Parameters
+        - rows: An iterable of dicts with the keys path, attribute, value, and optionally units and op,
+          or of sequences in that order. op is either 'add' or 'remove', and defaults to 'add'.
+
+        Returns
+        - A dict describing the import: the number of rows, objects (counted once per buffer window) and requests, the elapsed seconds,
+          rows_per_second, and a list of failures. Each failure contains the path, the number of
+          operations that were not applied, and the HTTP and iRODS status codes or the error raised.
+        - A malformed row is recorded as a failure with its row number and error, and the import continues.
+        - Once a request for an object fails, the object's remaining requests are not sent. Their operations
+          are counted in the failure of the request that failed.
+        """
+        if (self.target == 'collection'):
+            modify_metadata = self.api.collections.modify_metadata
+        else:
+            modify_metadata = self.api.data_objects.modify_metadata
+
+        report = {
+            'rows': 0,
+            'objects': 0,
+            'requests': 0,
+            'failures': []
+        }
+        lock = threading.Lock()
+        # Limits the number of requests queued in the executor so memory stays bounded.
+        slots = threading.BoundedSemaphore(self.workers * 2)
+
+        def send(lpath, operations):
+            # The requests for one object are sent in order so removals follow the additions before them.
+            try:
+                for i in range(0, len(operations), self.max_operations):
+                    chunk = operations[i:i + self.max_operations]
+                    # A failed request leaves the object partially updated, so the later operations are not sent.
+                    failure = None
+                    try:
+                        r = modify_metadata(lpath, chunk, self.admin)
+                        if (r['status_code'] / 100 != 2):
+                            failure = {'path': lpath, 'operations': len(operations) - i, 'status_code': r['status_code'], 'irods_status_code': None}
+                        elif (r['data']['irods_response']['status_code']):
+                            failure = {'path': lpath, 'operations': len(operations) - i, 'status_code': r['status_code'],
+                                       'irods_status_code': r['data']['irods_response']['status_code']}
+                    except Exception as e:
+                        failure = {'path': lpath, 'operations': len(operations) - i, 'error': str(e)}
+
+                    with lock:
+                        report['requests'] += 1
+                        if (failure != None):
+                            report['failures'].append(failure)
+                    if (failure != None):
+                        return
+            finally:
+                slots.release()
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = []
+
+            def flush(pending):
+                # An object may appear in consecutive windows, so the previous window finishes first.
+                wait(futures)
+                futures.clear()
+                for lpath, operations in pending.items():
+                    report['objects'] += 1
+                    slots.acquire()
+                    futures.append(executor.submit(send, lpath, operations))
+
+            pending = {}
+            buffered = 0
+            for row in rows:
+                report['rows'] += 1
+                try:
+                    lpath, operation = self._operation(row)
+                except (TypeError, ValueError) as e:
+                    with lock:
+                        report['failures'].append({'row': report['rows'], 'path': None, 'operations': 1, 'error': str(e)})
+                    continue
+                pending.setdefault(lpath, []).append(operation)
+                buffered += 1
+                if (buffered >= self.buffer_rows):
+                    flush(pending)
+                    pending = {}
+                    buffered = 0
+            flush(pending)
+
+        report['elapsed'] = time.time() - start
+        report['rows_per_second'] = 0
+        if (report['elapsed'] > 0):
+            report['rows_per_second'] = report['rows'] / report['elapsed']
+
+        print('Imported ' + str(report['rows']) + ' metadata rows for ' + str(report['objects']) + ' objects in ' +
+              str(round(report['elapsed'], 3)) + ' seconds (' + str(len(report['failures'])) + ' failures)')
+
+        return(report)
+
+
+    def import_csv(self, file):
+        """
+        Imports AVU operations from CSV.
+
+        Each line holds path, attribute, value, and optionally units and op. A first line naming these columns is skipped.
+
+        Parameters
+        - file: A path to a CSV file, or an open text file.
+
+        Returns
+        - A dict describing the import. See import_rows().
+        """
+        if (isinstance(file, str)):
+            with open(file, newline='') as f:
+                return(self.import_csv(f))
+
+        def rows():
+            for i, row in enumerate(csv.reader(file)):
+                if ((i == 0) and ([c.strip().lower() for c in row] == _COLUMNS[:len(row)])):
+                    continue
+                if (len(row) > 0):
+                    yield row
+
+        return(self.import_rows(rows()))
+
+
+    def import_jsonl(self, file):
+        """
+        Imports AVU operations from JSON Lines.
+
+        Each line holds an object with the keys path, attribute, value, and optionally units and op.
+
+        Parameters
+        - file: A path to a JSON Lines file, or an open text file.
+
+        Returns
+        - A dict describing the import. See import_rows().
+        """
+        if (isinstance(file, str)):
+            with open(file) as f:
+                return(self.import_jsonl(f))
+
+        def rows():
+            for line in file:
+                if (line.strip() == ''):
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    # Reported by import_rows() as a malformed row.
+                    row = e
+                yield row
+
+        return(self.import_rows(rows()))
+
+
+    def _operation(self, row):
+        """ Converts a row into its path and modify_metadata operation. """
+        if (isinstance(row, ValueError)):
+            raise ValueError('malformed row: ' + str(row))
+        if (not isinstance(row, (dict, list, tuple))):
+            raise TypeError('every row must be a dict or a sequence')
+        if (isinstance(row, dict)):
+            row = [row.get(column, '') for column in _COLUMNS]
+        row = list(row) + [''] * (len(_COLUMNS) - len(row))
+        lpath, attribute, value, units, op = row[:len(_COLUMNS)]
+
+        if ((not isinstance(lpath, str)) or (lpath == '')):
+            raise ValueError('every row must have a path')
+        if (op in ('', None)):
+            op = 'add'
+        if ((not op == 'add') and (not op == 'remove')):
+            raise ValueError('op must be either \'add\' or \'remove\': ' + str(op))
+
+        operation = {
+            'operation': op,
+            'attribute': str(attribute),
+            'value': str(value)
+        }
+        if (not units in ('', None)):
+            operation['units'] = str(units)
+        return(lpath, operation)
@@ -0,0 +1,155 @@
+import functools
+import threading
+import time
+from irods_http_client.query_operations import genquery_tree_condition, quote_genquery_value
+
+# Columns used to search each kind of entry. The path columns are selected first and joined with '/' to form the path.
+_KINDS = {
+    'data_object': {
+        'select': 'SELECT ORDER(COLL_NAME), ORDER(DATA_NAME), META_DATA_ATTR_NAME, META_DATA_ATTR_VALUE',
+        'path_columns': 2,
+        'attribute': 'META_DATA_ATTR_NAME',
+        'value': 'META_DATA_ATTR_VALUE'
+    },
+    'collection': {
+        'select': 'SELECT ORDER(COLL_NAME), META_COLL_ATTR_NAME, META_COLL_ATTR_VALUE',
+        'path_columns': 1,
+        'attribute': 'META_COLL_ATTR_NAME',
+        'value': 'META_COLL_ATTR_VALUE'
+    }
+}
+
+def _in_condition(column: str, values: list):
+    """ Returns a GenQuery condition matching a column against one or more values. """
+    if (len(values) == 1):
+        return(column + ' = ' + quote_genquery_value(values[0]))
+    return(column + ' IN (' + ', '.join(quote_genquery_value(v) for v in values) + ')')
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile(type: str, under: str, attributes: tuple):
+    """ Returns the GenQuery string finding the AVUs of the entries of a type under a collection that may match the (attribute, value) pairs. """
+    kind = _KINDS[type]
+    query = kind['select'] + ' WHERE ' + _in_condition(kind['attribute'], sorted(set(a for a, v in attributes)))
+    # Values only narrow the rows when every attribute has one. The rows are matched exactly by MetadataSearch.
+    if (all(v != None for a, v in attributes)):
+        query += ' AND ' + _in_condition(kind['value'], sorted(set(v for a, v in attributes)))
+    if (under != '/'):
+        query += ' AND ' + genquery_tree_condition(under)
+    return(query)
+
+
+class MetadataSearch:
+
+    def __init__(self, api, ttl: float=0):
+        """
+        Initializes a MetadataSearch for finding collections and data objects by their AVUs.
+
+        Query strings are compiled once and reused. When ttl is greater than 0, the paths found by
+        each search are also kept for ttl seconds, and repeated searches with the same token are answered
+        without querying.
+
+        Parameters
+        - api: The IrodsHttpClient used to query the catalog. Its token must be set before searching.
+        - ttl (optional): The number of seconds results are cached for. Set to 0 to disable result caching. Defaults to 0.
+        """
+        if (not isinstance(ttl, (int, float))):
+            raise TypeError('ttl must be a number')
+        if (not ttl >= 0):
+            raise ValueError('ttl must be greater than or equal to 0')
+
+        self.api = api
+        self.ttl = ttl
+        self._results = {}
+        self._lock = threading.Lock()
+
+
+    def find(self, attributes: dict, under: str='/', type: str='data_object'):
+        """
+        Finds the collections or data objects having all of the given AVUs.
+
+        GenQuery1 matches all metadata conditions of a query against the same AVU, so a single query
+        selects every AVU with one of the attributes, ordered by path. The rows of each path arrive
+        together, and a path is yielded as soon as its rows show every requested AVU.
+
+        Parameters
+        - attributes: A dict mapping attribute names to values. A value of None matches any value.
+        - under (optional): The absolute logical path of the collection to search under. Defaults to '/'.
+        - type (optional): The kind of entry to find. Either 'data_object' or 'collection'. Defaults to 'data_object'.
+
+        Returns
+        - A generator yielding the absolute logical path of each match, fetched lazily.
+        - A RuntimeError is raised if any query fails.
+        """
+        if (not isinstance(attributes, dict)):
+            raise TypeError('attributes must be a dict')
+        if (len(attributes) == 0):
+            raise ValueError('attributes must not be empty')
+        for attribute, value in attributes.items():
+            if (not isinstance(attribute, str)):
+                raise TypeError('attribute names must be strings')
+            if ((value != None) and (not isinstance(value, str))):
+                raise TypeError('attribute values must be strings or None')
+        if (not isinstance(under, str)):
+            raise TypeError('under must be a string')
+        if (not isinstance(type, str)):
+            raise TypeError('type must be a string')
+        if (not type in _KINDS):
+            raise ValueError('type must be either \'data_object\' or \'collection\'')
+        if (under != '/'):
+            under = under.rstrip('/')
+
+        query = _compile(type, under, tuple(sorted(attributes.items())))
+        if (self.api.queries.token == None):
+            raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
+
+        return(self._find(query, _KINDS[type]['path_columns'], dict(attributes)))
+
+
+    def _find(self, query: str, path_columns: int, attributes: dict):
+        """ Yields the paths having every AVU, using and filling the result cache. """
+        # Users may see different entries, so results are cached per token.
+        key = (self.api.queries.token, query)
+        if (self.ttl > 0):
+            with self._lock:
+                cached = self._results.get(key)
+            if ((cached != None) and (cached[0] > time.monotonic())):
+                yield from cached[1]
+                return
+
+        found = []
+        for lpath in self._matches(query, path_columns, attributes):
+            if (self.ttl > 0):
+                found.append(lpath)
+            yield lpath
+
+        # Only complete results are cached.
+        if (self.ttl > 0):
+            with self._lock:
+                now = time.monotonic()
+                self._results = {k: v for k, v in self._results.items() if v[0] > now}
+                self._results[key] = (now + self.ttl, found)
+
+
+    def _matches(self, query: str, path_columns: int, attributes: dict):
+        """ Groups the rows of a query by path, and yields each path whose rows contain every AVU. """
+        current = None
+        matched = set()
+        for row in self.api.queries.execute_genquery_paged(query):
+            lpath = row[0] if (path_columns == 1) else (row[0].rstrip('/') + '/' + row[1])
+            if (lpath != current):
+                if (len(matched) == len(attributes)):
+                    yield current
+                current = lpath
+                matched = set()
+            attribute, value = row[path_columns], row[path_columns + 1]
+            if ((attribute in attributes) and ((attributes[attribute] == None) or (attributes[attribute] == value))):
+                matched.add(attribute)
+        if ((current != None) and (len(matched) == len(attributes))):
+            yield current
+
+
+    def clear_cache(self):
+        """ Discards all cached results. Compiled query strings are kept. """
+        with self._lock:
+            self._results = {}
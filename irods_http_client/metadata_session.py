@@ -0,0 +1,289 @@
+import collections
+import threading
+import time
+
+_TARGETS = ['collection', 'data_object', 'resource', 'user_group']
+
+class MetadataSession:
+
+    def __init__(self, api, max_operations: int=100, max_delay: float=1.0, admin: int=0):
+        """
+        Initializes a MetadataSession that combines metadata writes.
+
+        Operations are collected per target and sent together as one atomic modify_metadata
+        request when a target has max_operations pending, when its oldest pending operation
+        is max_delay seconds old, or when flush() or close() is called. Adding and removing the
+        same AVU on the same target before it is sent cancels both operations.
+        The requests for one target are sent one at a time, in the order they were flushed, while
+        requests for different targets are sent concurrently by the threads that flush them.
+        The session can be used as a context manager, which flushes on exit.
+
+        Parameters
+        - api: The IrodsHttpClient used to modify the metadata. Its token must be set before flushing.
+        - max_operations (optional): The number of pending operations that causes a target to be flushed. Defaults to 100.
+        - max_delay (optional): The number of seconds an operation may wait before its target is flushed.
+          Set to 0 to only flush on the count threshold and explicit calls. Defaults to 1.
+        - admin (optional): Set to 1 to run the operations as an admin, otherwise set to 0. Does not apply to users and groups. Defaults to 0.
+        """
+        if (not isinstance(max_operations, int)):
+            raise TypeError('max_operations must be an int')
+        if (not max_operations > 0):
+            raise ValueError('max_operations must be greater than 0')
+        if (not isinstance(max_delay, (int, float))):
+            raise TypeError('max_delay must be a number')
+        if (not max_delay >= 0):
+            raise ValueError('max_delay must be greater than or equal to 0')
+        if (not isinstance(admin, int)):
+            raise TypeError('admin must be an int 1 or 0')
+        if ((not admin == 0) and (not admin == 1)):
+            raise ValueError('admin must be an int 1 or 0')
+
+        self.api = api
+        self.max_operations = max_operations
+        self.max_delay = max_delay
+        self.admin = admin
+
+        # (target_type, name) -> {'operations': [...], 'since': time of the oldest pending operation}
+        self._pending = {}
+        self._lock = threading.Condition()
+        # (target_type, name) -> the batches flushed for the target and not yet sent, oldest first. A target is
+        # present while one thread is sending its batches, so its requests are applied in the order they were flushed.
+        self._outgoing = {}
+        self._timer = None
+        self._closed = False
+        self._stats = {
+            'operations': 0,
+            'cancelled': 0,
+            'requests': 0
+        }
+        self.failures = []
+
+
+    def add(self, target_type: str, name: str, attribute: str, value: str, units: str=''):
+        """
+        Queues adding an AVU.
+
+        Parameters
+        - target_type: The kind of target. Either 'collection', 'data_object', 'resource' or 'user_group'.
+        - name: The absolute logical path of the collection or data object, or the name of the resource, user or group.
+        - attribute: The attribute of the AVU.
+        - value: The value of the AVU.
+        - units (optional): The units of the AVU.
+        """
+        self._queue(target_type, name, 'add', attribute, value, units)
+
+
+    def remove(self, target_type: str, name: str, attribute: str, value: str, units: str=''):
+        """
+        Queues removing an AVU.
+
+        Parameters
+        - target_type: The kind of target. Either 'collection', 'data_object', 'resource' or 'user_group'.
+        - name: The absolute logical path of the collection or data object, or the name of the resource, user or group.
+        - attribute: The attribute of the AVU.
+        - value: The value of the AVU.
+        - units (optional): The units of the AVU.
+        """
+        self._queue(target_type, name, 'remove', attribute, value, units)
+
+
+    def _queue(self, target_type: str, name: str, op: str, attribute: str, value: str, units: str):
+        """ Records an operation, cancelling a pending opposite operation on the same AVU. """
+        if (not isinstance(target_type, str)):
+            raise TypeError('target_type must be a string')
+        if (not target_type in _TARGETS):
+            raise ValueError('target_type must be one of ' + str(_TARGETS))
+        if (not isinstance(name, str)):
+            raise TypeError('name must be a string')
+        if (not isinstance(attribute, str)):
+            raise TypeError('attribute must be a string')
+        if (not isinstance(value, str)):
+            raise TypeError('value must be a string')
+        if (not isinstance(units, str)):
+            raise TypeError('units must be a string')
+
+        with self._lock:
+            if (self._closed):
+                raise RuntimeError('The session is closed')
+
+            key = (target_type, name)
+            batch = self._pending.get(key)
+            if (batch == None):
+                batch = {'operations': [], 'since': time.monotonic()}
+                self._pending[key] = batch
+
+            self._stats['operations'] += 1
+            for i, pending in enumerate(batch['operations']):
+                if ((pending['attribute'] == attribute) and (pending['value'] == value) and (pending.get('units', '') == units)):
+                    if (pending['operation'] != op):
+                        del batch['operations'][i]
+                        self._stats['cancelled'] += 2
+                        if (len(batch['operations']) == 0):
+                            del self._pending[key]
+                    else:
+                        # The same operation twice would fail the whole atomic request.
+                        self._stats['cancelled'] += 1
+                    return
+
+            operation = {
+                'operation': op,
+                'attribute': attribute,
+                'value': value
+            }
+            if (units != ''):
+                operation['units'] = units
+            batch['operations'].append(operation)
+
+            full = (len(batch['operations']) >= self.max_operations)
+            drain = False
+            if (full):
+                del self._pending[key]
+                drain = self._hand_off(key, batch['operations'])
+            elif ((self.max_delay > 0) and (self._timer == None)):
+                self._timer = threading.Thread(target=self._flush_expired, daemon=True)
+                self._timer.start()
+            self._lock.notify_all()
+
+        if (drain):
+            self._drain(key)
+
+
+    def _flush_expired(self):
+        """ Runs in the background, flushing targets whose oldest operation has waited max_delay seconds. """
+        while True:
+            with self._lock:
+                expired = []
+                while (len(expired) == 0):
+                    if (self._closed):
+                        self._timer = None
+                        return
+                    now = time.monotonic()
+                    wait = None
+                    for key, batch in self._pending.items():
+                        remaining = batch['since'] + self.max_delay - now
+                        if (remaining <= 0):
+                            expired.append((key, batch['operations']))
+                        elif ((wait == None) or (remaining < wait)):
+                            wait = remaining
+                    if (len(expired) == 0):
+                        self._lock.wait(wait)
+                drain = []
+                for key, operations in expired:
+                    del self._pending[key]
+                    if (self._hand_off(key, operations)):
+                        drain.append(key)
+
+            for key in drain:
+                self._drain(key)
+
+
+    def _hand_off(self, key: tuple, operations: list):
+        """
+        Queues a flushed batch for sending. Must be called with the lock held.
+        Returns True if the caller must call _drain() for the target, or False if another thread is already sending its batches.
+        """
+        queue = self._outgoing.get(key)
+        if (queue != None):
+            queue.append(operations)
+            return(False)
+        self._outgoing[key] = collections.deque([operations])
+        return(True)
+
+
+    def _drain(self, key: tuple):
+        """ Sends the batches queued for a target one at a time, including those queued while sending. """
+        while True:
+            with self._lock:
+                queue = self._outgoing[key]
+                if (len(queue) == 0):
+                    del self._outgoing[key]
+                    self._lock.notify_all()
+                    return
+                operations = queue.popleft()
+            self._send(key, operations)
+
+
+    def _send(self, key: tuple, operations: list):
+        """ Sends the operations for a target as one atomic request, recording any failure. """
+        target_type, name = key
+        failure = None
+        try:
+            if (target_type == 'collection'):
+                r = self.api.collections.modify_metadata(name, operations, self.admin)
+            elif (target_type == 'data_object'):
+                r = self.api.data_objects.modify_metadata(name, operations, self.admin)
+            elif (target_type == 'resource'):
+                r = self.api.resources.modify_metadata(name, operations, self.admin)
+            else:
+                r = self.api.users_groups.modify_metadata(name, operations)
+
+            if (r['status_code'] / 100 != 2):
+                failure = {'type': target_type, 'name': name, 'operations': operations, 'status_code': r['status_code'], 'irods_status_code': None}
+            elif (r['data']['irods_response']['status_code']):
+                failure = {'type': target_type, 'name': name, 'operations': operations, 'status_code': r['status_code'],
+                           'irods_status_code': r['data']['irods_response']['status_code']}
+        except Exception as e:
+            failure = {'type': target_type, 'name': name, 'operations': operations, 'error': str(e)}
+
+        with self._lock:
+            self._stats['requests'] += 1
+            if (failure != None):
+                self.failures.append(failure)
+
+
+    def flush(self):
+        """
+        Sends all pending operations now, one atomic request per target.
+
+        Returns
+        - The list of failures recorded by the session so far. Each failure contains the type and name
+          of the target, the operations that were not applied, and the HTTP and iRODS status codes or the error raised.
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            drain = [key for key, batch in pending.items() if self._hand_off(key, batch['operations'])]
+
+        for key in drain:
+            self._drain(key)
+
+        # Batches handed to a thread already sending for the same target are sent by that thread.
+        with self._lock:
+            while (any(key in self._outgoing for key in pending)):
+                self._lock.wait()
+            return(list(self.failures))
+
+
+    def stats(self):
+        """
+        Returns the number of operations queued, the number cancelled before being sent, and the number of requests sent.
+
+        Returns
+        - A dict with the keys operations, cancelled and requests.
+        """
+        with self._lock:
+            return(dict(self._stats))
+
+
+    def close(self):
+        """
+        Flushes all pending operations and stops the background flushing. No operations can be queued afterwards.
+
+        Returns
+        - The list of failures recorded by the session. See flush().
+        """
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+            timer = self._timer
+        if (timer != None):
+            timer.join()
+        return(self.flush())
+
+
+    def __enter__(self):
+        return(self)
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,237 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from irods_http_client.query_operations import genquery_tree_condition, quote_genquery_value
+
+# The access level stored in the catalog for each permission accepted by modify_permissions.
+_ACCESS_NAMES = {
+    'read': 'read_object',
+    'write': 'modify_object',
+    'own': 'own'
+}
+
+# Columns used to compare the permissions of each kind of entry. Both queries are ordered by id.
+_KINDS = [
+    {
+        'type': 'collection',
+        'id': 'COLL_ID',
+        'all': 'SELECT ORDER(COLL_ID), COLL_NAME',
+        'access': 'SELECT ORDER(COLL_ID), COLL_ACCESS_NAME',
+        'user_id': 'COLL_ACCESS_USER_ID'
+    },
+    {
+        'type': 'data_object',
+        'id': 'DATA_ID',
+        'all': 'SELECT ORDER(DATA_ID), COLL_NAME, DATA_NAME',
+        'access': 'SELECT ORDER(DATA_ID), DATA_ACCESS_NAME',
+        'user_id': 'DATA_ACCESS_USER_ID'
+    }
+]
+
+# Number of rows requested per page of the id ordered queries.
+_PAGE_SIZE = 1000
+
+class PermissionApplier:
+
+    def __init__(self, api, workers: int=8, progress=None, progress_interval: float=5.0):
+        """
+        Initializes a PermissionApplier for setting permissions across a collection tree.
+
+        Every entry of the tree is read once with a paginated GenQuery ordered by id, alongside one
+        query per user or group listing, in the same order, the entries it has access to. The streams
+        are merged by id, so memory stays bounded by a page per query whatever the size of the tree.
+        Only the entries whose permissions differ are modified, each with a single modify_permissions
+        request covering every user and group concerned. Requests run on a bounded pool of worker threads.
+
+        Parameters
+        - api: The IrodsHttpClient used to query and modify the catalog. Its token must be set before applying.
+        - workers (optional): The number of requests to run concurrently. Defaults to 8.
+        - progress (optional): A function called with a progress dict every progress_interval seconds and once at the end.
+          It contains the number of entries checked, updated and failed, the elapsed seconds and entries_per_second.
+        - progress_interval (optional): The number of seconds between progress calls. Defaults to 5.
+        """
+        if (not isinstance(workers, int)):
+            raise TypeError('workers must be an int')
+        if (not workers > 0):
+            raise ValueError('workers must be greater than 0')
+        if ((progress != None) and (not callable(progress))):
+            raise TypeError('progress must be callable')
+        if (not isinstance(progress_interval, (int, float))):
+            raise TypeError('progress_interval must be a number')
+
+        self.api = api
+        self.workers = workers
+        self.progress = progress
+        self.progress_interval = progress_interval
+
+
+    def _user_id(self, name: str):
+        """ Returns the id of a user or group. """
+        rows = list(self.api.queries.execute_genquery_paged('SELECT USER_ID WHERE USER_NAME = ' + quote_genquery_value(name)))
+        if (len(rows) == 0):
+            raise ValueError('User or group does not exist: ' + name)
+        return(rows[0][0])
+
+
+    def _ordered_rows(self, query: str, id_column: str):
+        """
+        Yields the rows of a query whose first column is ORDER() of id_column, one page at a time.
+        Each page starts after the last id read, so permissions changed on earlier entries while
+        the rows are read cannot shift the later pages.
+        """
+        last = 0
+        while True:
+            r = self.api.queries.execute_genquery(query + ' AND ' + id_column + ' > ' + quote_genquery_value(str(last)), count=_PAGE_SIZE)
+            if (r['status_code'] / 100 != 2):
+                raise RuntimeError('Failed to execute query: HTTP Status Code ' + str(r['status_code']))
+            if (r['data']['irods_response']['status_code']):
+                raise RuntimeError('Failed to execute query: iRODS Status Code ' + str(r['data']['irods_response']['status_code']))
+            rows = r['data']['rows']
+            if (len(rows) == 0):
+                return
+            for row in rows:
+                yield row
+            last = int(rows[-1][0])
+
+
+    def apply(self, lpath: str, permissions: dict, admin: int=0):
+        """
+        Sets permissions on a collection and on every collection and data object beneath it.
+
+        Parameters
+        - lpath: The absolute logical path of the collection tree.
+        - permissions: A dict mapping user or group names to the permission to set. Either 'null', 'read', 'write', or 'own'.
+        - admin (optional): Set to 1 to run the operations as an admin, otherwise set to 0. Defaults to 0.
+
+        Returns
+        - A dict with the number of entries checked, updated and skipped because their permissions already matched,
+          the number of requests, the elapsed seconds, entries_per_second, and a list of failures.
+          Each failure contains the type and path of the entry, and the HTTP and iRODS status codes or the error raised.
+        - A RuntimeError is raised if any query fails.
+        """
+        if (not isinstance(lpath, str)):
+            raise TypeError('lpath must be a string')
+        if (not isinstance(permissions, dict)):
+            raise TypeError('permissions must be a dict')
+        if (len(permissions) == 0):
+            raise ValueError('permissions must not be empty')
+        for name, permission in permissions.items():
+            if (not isinstance(name, str)):
+                raise TypeError('user and group names must be strings')
+            if ((not permission == 'null') and (not permission in _ACCESS_NAMES)):
+                raise ValueError('permission must be either \'null\', \'read\', \'write\', or \'own\'')
+        if (not isinstance(admin, int)):
+            raise TypeError('admin must be an int 1 or 0')
+        if ((not admin == 0) and (not admin == 1)):
+            raise ValueError('admin must be an int 1 or 0')
+        if (self.api.queries.token == None):
+            raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
+        if (lpath != '/'):
+            lpath = lpath.rstrip('/')
+
+        condition = ' WHERE ' + genquery_tree_condition(lpath)
+        user_ids = {name: self._user_id(name) for name in permissions}
+
+        report = {
+            'checked': 0,
+            'updated': 0,
+            'skipped': 0,
+            'requests': 0,
+            'failures': []
+        }
+        lock = threading.Lock()
+        # Limits the number of requests queued in the executor so memory stays bounded.
+        slots = threading.BoundedSemaphore(self.workers * 2)
+        start = time.time()
+        last_progress = [start]
+
+        def report_progress(final=False):
+            now = time.time()
+            if ((self.progress == None) or ((not final) and (now - last_progress[0] < self.progress_interval))):
+                return
+            last_progress[0] = now
+            with lock:
+                current = {
+                    'checked': report['checked'],
+                    'updated': report['updated'],
+                    'failed': len(report['failures']),
+                    'elapsed': now - start
+                }
+            current['entries_per_second'] = 0
+            if (current['elapsed'] > 0):
+                current['entries_per_second'] = current['checked'] / current['elapsed']
+            self.progress(current)
+
+        def send(kind, entry_path, operations):
+            failure = None
+            try:
+                if (kind['type'] == 'collection'):
+                    r = self.api.collections.modify_permissions(entry_path, operations, admin)
+                else:
+                    r = self.api.data_objects.modify_permissions(entry_path, operations, admin)
+
+                if (r['status_code'] / 100 != 2):
+                    failure = {'type': kind['type'], 'path': entry_path, 'status_code': r['status_code'], 'irods_status_code': None}
+                elif (r['data']['irods_response']['status_code']):
+                    failure = {'type': kind['type'], 'path': entry_path, 'status_code': r['status_code'],
+                               'irods_status_code': r['data']['irods_response']['status_code']}
+            except Exception as e:
+                failure = {'type': kind['type'], 'path': entry_path, 'error': str(e)}
+            finally:
+                slots.release()
+
+            with lock:
+                report['requests'] += 1
+                if (failure == None):
+                    report['updated'] += 1
+                else:
+                    report['failures'].append(failure)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for kind in _KINDS:
+                # For each name, the entries it has access to, with the next row not yet merged.
+                streams = {}
+                heads = {}
+                for name in permissions:
+                    query = kind['access'] + condition + ' AND ' + kind['user_id'] + ' = ' + quote_genquery_value(user_ids[name])
+                    streams[name] = self._ordered_rows(query, kind['id'])
+                    heads[name] = next(streams[name], None)
+
+                for row in self._ordered_rows(kind['all'] + condition, kind['id']):
+                    id = int(row[0])
+                    operations = []
+                    for name, permission in permissions.items():
+                        # Both streams are ordered by id, so the access row of this entry, if any, is at the head.
+                        access = None
+                        while ((heads[name] != None) and (int(heads[name][0]) <= id)):
+                            if (int(heads[name][0]) == id):
+                                access = heads[name][1].replace(' ', '_')
+                            heads[name] = next(streams[name], None)
+                        # 'null' must remove any access, other permissions must match the requested level.
+                        if (permission == 'null'):
+                            differs = (access != None)
+                        else:
+                            differs = (access != _ACCESS_NAMES[permission])
+                        if (differs):
+                            operations.append({'entity_name': name, 'acl': permission})
+
+                    with lock:
+                        report['checked'] += 1
+                        if (len(operations) == 0):
+                            report['skipped'] += 1
+                    if (len(operations) > 0):
+                        entry_path = row[1] if (kind['type'] == 'collection') else (row[1].rstrip('/') + '/' + row[2])
+                        slots.acquire()
+                        executor.submit(send, kind, entry_path, operations)
+                    report_progress()
+
+        report['elapsed'] = time.time() - start
+        report['entries_per_second'] = 0
+        if (report['elapsed'] > 0):
+            report['entries_per_second'] = report['checked'] / report['elapsed']
+        report_progress(True)
+
+        print('Updated permissions on ' + str(report['updated']) + ' of ' + str(report['checked']) + ' entries under \'' + lpath + '\' in ' +
+              str(round(report['elapsed'], 3)) + ' seconds (' + str(len(report['failures'])) + ' failed)')
+
+        return(report)
@@ -1,36 +1,76 @@
 import requests
 import json
+from irods_http_client.coalescing import RequestCoalescer
+from irods_http_client.json_stream import JsonArrayStream
+
+def quote_genquery_value(value: str):
+    """
+    Quotes a string so it can be used as a literal in a GenQuery condition.
+
+    Parameters
+    - value: The string to be quoted. Single quotes within it are escaped with a backslash.
+
+    Returns
+    - The string surrounded by single quotes.
+    """
+    if (not isinstance(value, str)):
+        raise TypeError('value must be a string')
+    return('\'' + value.replace('\'', '\\\'') + '\'')
+
+
+def quote_genquery_like_prefix(prefix: str):
+    """
+    Quotes a string so it can be used in a GenQuery like condition matching every value starting with it.
+
+    Parameters
+    - prefix: The string the values must start with. The like wildcards % and _ within it are escaped,
+      so they only match themselves.
+
+    Returns
+    - The pattern surrounded by single quotes.
+    """
+    if (not isinstance(prefix, str)):
+        raise TypeError('prefix must be a string')
+    escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return(quote_genquery_value(escaped + '%'))
+
+
+def genquery_tree_condition(lpath: str):
+    """
+    Builds a GenQuery condition matching a collection and every collection beneath it.
+
+    Parameters
+    - lpath: The absolute logical path of the collection.
+
+    Returns
+    - A condition on COLL_NAME, to be used after WHERE or AND.
+    """
+    if (not isinstance(lpath, str)):
+        raise TypeError('lpath must be a string')
+    return('COLL_NAME = ' + quote_genquery_value(lpath) + ' || like ' + quote_genquery_like_prefix(lpath.rstrip('/') + '/'))
+
 
 class Queries:
 
-    def __init__(self, url_base: str):
+    def __init__(self, url_base: str, coalescer: RequestCoalescer=None):
         """" 
         Initializes Queries with a base url. 
         Token is set to None initially, and updated when setToken() is called in irodsClient.
+        Idempotent GET operations are sent through the given RequestCoalescer, or a private one if none is given.
         """
         self.url_base = url_base
         self.token = None
 
-    
-    def execute_genquery(self, query: str, offset: int=0, count: int=-1, case_sensitive: int=1, distinct: int=1,
-                            parser: str='genquery1', sql_only: int=0, zone: str=''):
-        """
-        Excecutes a GenQuery string and returns the results.
-        
-        Parameters
-        - query: The query being executed
-        - offset (optional): Number of rows to skip. Defaults to 0.
-        - count (optional): Number of rows to return. Default set by administrator.
-        - case_sensitive (optional): Set to 1 to execute a case sensitive query, otherwise set to 0. Defaults to 1. Only supported by GenQuery1.
-        - distinct (optional): Set to 1 to collapse duplicate rows, otherwise set to 0. Defaults to 1. Only supported by GenQuery 1
-        - parser (optional): User either genquery1 or genquery2. Defaults to genquery1.
-        - sql_only (optional): Set to 1 to execute an SQL only query, otherwise set to 0. Defaults to 0. Only supported by GenQuery2.
-        - zone (optional): The zone name. Defaults ot the local zone.
+        # Maximum number of rows per page enforced by the server, learned by execute_genquery_paged().
+        self.row_limit = None
 
-        Returns
-        - A dict containing the HTTP status code and iRODS response.
-        - The iRODS response is only valid if no error occurred during HTTP communication.
-        """
+        if (coalescer == None):
+            coalescer = RequestCoalescer()
+        self.coalescer = coalescer
+
+    
+    def _genquery_params(self, query: str, offset: int, count: int, case_sensitive: int, distinct: int, parser: str, sql_only: int, zone: str):
+        """ Checks the arguments shared by execute_genquery() and iter_genquery(), and returns the parameters of the request. """
         if (self.token == None):
             raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
         if (not isinstance(query, str)):
@@ -62,10 +102,6 @@ class Queries:
         if (not isinstance(zone, str)):
             raise TypeError('zone must be a string')
 
-        headers = {
-            'Authorization': 'Bearer ' + self.token,
-        }
-
         params = {
             'op': 'execute_genquery',
             'query': query,
@@ -78,14 +114,42 @@ class Queries:
 
         if (zone != ''):
             params['zone'] = zone
-        
+
         if (parser == 'genquery1'):
             params['case-sensitive'] = case_sensitive
             params['distinct'] = distinct
         else:
             params['sql-only'] = sql_only
 
-        r = requests.get(self.url_base + '/query', headers=headers, params=params)
+        return(params)
+
+
+    def execute_genquery(self, query: str, offset: int=0, count: int=-1, case_sensitive: int=1, distinct: int=1,
+                            parser: str='genquery1', sql_only: int=0, zone: str=''):
+        """
+        Excecutes a GenQuery string and returns the results.
+        
+        Parameters
+        - query: The query being executed
+        - offset (optional): Number of rows to skip. Defaults to 0.
+        - count (optional): Number of rows to return. Default set by administrator.
+        - case_sensitive (optional): Set to 1 to execute a case sensitive query, otherwise set to 0. Defaults to 1. Only supported by GenQuery1.
+        - distinct (optional): Set to 1 to collapse duplicate rows, otherwise set to 0. Defaults to 1. Only supported by GenQuery 1
+        - parser (optional): User either genquery1 or genquery2. Defaults to genquery1.
+        - sql_only (optional): Set to 1 to execute an SQL only query, otherwise set to 0. Defaults to 0. Only supported by GenQuery2.
+        - zone (optional): The zone name. Defaults ot the local zone.
+
+        Returns
+        - A dict containing the HTTP status code and iRODS response.
+        - The iRODS response is only valid if no error occurred during HTTP communication.
+        """
+        params = self._genquery_params(query, offset, count, case_sensitive, distinct, parser, sql_only, zone)
+
+        headers = {
+            'Authorization': 'Bearer ' + self.token,
+        }
+
+        r = self.coalescer.get(self.url_base + '/query', headers=headers, params=params)
 
         if (r.status_code / 100 == 2):
             rdict = r.json()
@@ -117,6 +181,108 @@ class Queries:
             )
     
 
+    def iter_genquery(self, query: str, offset: int=0, count: int=-1, case_sensitive: int=1, distinct: int=1,
+                            parser: str='genquery1', sql_only: int=0, zone: str=''):
+        """
+        Excecutes a GenQuery string, parsing the rows incrementally.
+
+        Rows are yielded as they arrive off the socket, so memory use stays proportional to one
+        row rather than the whole page. Use this instead of execute_genquery() for very large pages.
+
+        Parameters
+        - query: The query being executed
+        - offset (optional): Number of rows to skip. Defaults to 0.
+        - count (optional): Number of rows to return. Default set by administrator.
+        - case_sensitive (optional): Set to 1 to execute a case sensitive query, otherwise set to 0. Defaults to 1. Only supported by GenQuery1.
+        - distinct (optional): Set to 1 to collapse duplicate rows, otherwise set to 0. Defaults to 1. Only supported by GenQuery 1
+        - parser (optional): User either genquery1 or genquery2. Defaults to genquery1.
+        - sql_only (optional): Set to 1 to execute an SQL only query, otherwise set to 0. Defaults to 0. Only supported by GenQuery2.
+        - zone (optional): The zone name. Defaults ot the local zone.
+
+        Returns
+        - A generator yielding each row as a list of strings, in the order of the selected columns.
+        - A RuntimeError is raised if an HTTP or iRODS error occurs.
+        """
+        params = self._genquery_params(query, offset, count, case_sensitive, distinct, parser, sql_only, zone)
+
+        headers = {
+            'Authorization': 'Bearer ' + self.token,
+        }
+
+        with requests.get(self.url_base + '/query', headers=headers, params=params, stream=True) as r:
+            if (r.status_code / 100 != 2):
+                raise RuntimeError('Failed to execute query: HTTP Status Code ' + str(r.status_code))
+
+            stream = JsonArrayStream(r.iter_content(chunk_size=65536), 'rows')
+            for row in stream:
+                yield row
+
+            status_code = stream.document['irods_response']['status_code']
+            if (status_code):
+                raise RuntimeError('Failed to execute query: iRODS Status Code ' + str(status_code))
+
+
+    def execute_genquery_paged(self, query: str, page_size: int=1000, case_sensitive: int=1, distinct: int=1, zone: str=''):
+        """
+        Excecutes a GenQuery1 string and yields its rows, fetching one page at a time.
+
+        The server may return fewer rows per page than requested. When that happens the limit
+        is remembered in row_limit, and later queries use it to avoid requesting an empty page.
+
+        Parameters
+        - query: The query being executed
+        - page_size (optional): Number of rows to request per page. Defaults to 1000.
+        - case_sensitive (optional): Set to 1 to execute a case sensitive query, otherwise set to 0. Defaults to 1.
+        - distinct (optional): Set to 1 to collapse duplicate rows, otherwise set to 0. Defaults to 1.
+        - zone (optional): The zone name. Defaults ot the local zone.
+
+        Returns
+        - A generator yielding each row as a list of strings, in the order of the selected columns.
+        - A RuntimeError is raised if any page cannot be retrieved.
+        """
+        if (not isinstance(page_size, int)):
+            raise TypeError('page_size must be an int')
+        if (not page_size > 0):
+            raise ValueError('page_size must be greater than 0')
+
+        limit = page_size
+        if ((self.row_limit != None) and (self.row_limit < limit)):
+            limit = self.row_limit
+
+        offset = 0
+        short_page = None
+        while True:
+            r = self.execute_genquery(query, offset=offset, count=limit, case_sensitive=case_sensitive, distinct=distinct, zone=zone)
+
+            if (r['status_code'] / 100 != 2):
+                raise RuntimeError('Failed to execute query: HTTP Status Code ' + str(r['status_code']))
+            if (r['data']['irods_response']['status_code']):
+                raise RuntimeError('Failed to execute query: iRODS Status Code ' + str(r['data']['irods_response']['status_code']))
+
+            rows = r['data']['rows']
+            if (len(rows) == 0):
+                return
+
+            if (short_page != None):
+                # A short page followed by more rows means the server capped the page size.
+                self.row_limit = short_page
+                limit = short_page
+                short_page = None
+
+            for row in rows:
+                yield row
+
+            offset += len(rows)
+            if (len(rows) < limit):
+                if (self.row_limit == None):
+                    short_page = len(rows)
+                elif (len(rows) < self.row_limit):
+                    return
+                else:
+                    # Another query learned the limit while this page was being fetched.
+                    limit = self.row_limit
+
+
     def execute_specific_query(self, name: str, args: str='', args_delimiter: str=',', offset: int=0, count: int=-1):
         """
         Excecutes a specific query and returns the results.
@@ -166,7 +332,7 @@ class Queries:
         if (args != ''):
             params['args'] = args
 
-        r = requests.get(self.url_base + '/query', headers=headers, params=params)
+        r = self.coalescer.get(self.url_base + '/query', headers=headers, params=params)
 
         if (r.status_code / 100 == 2):
             rdict = r.json()
@@ -0,0 +1,49 @@
+import threading
+import time
+
+class RateLimiter:
+
+    def __init__(self, rate: float, burst: float=0):
+        """
+        Initializes a thread-safe token bucket limiting how fast work is started.
+
+        Parameters
+        - rate: The number of units allowed per second, such as requests or bytes.
+        - burst (optional): The number of units that can be used at once after a quiet period. Defaults to one second of rate.
+        """
+        if (not isinstance(rate, (int, float))):
+            raise TypeError('rate must be a number')
+        if (not rate > 0):
+            raise ValueError('rate must be greater than 0')
+        if (not isinstance(burst, (int, float))):
+            raise TypeError('burst must be a number')
+        if (not burst >= 0):
+            raise ValueError('burst must be greater than or equal to 0')
+
+        self.rate = rate
+        self.burst = burst
+        if (burst == 0):
+            self.burst = rate
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    def acquire(self, amount: float=1):
+        """
+        Blocks until amount units may be used.
+
+        Amounts larger than the burst are allowed, and delay later callers until the rate catches up.
+
+        Parameters
+        - amount (optional): The number of units about to be used. Defaults to 1.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate
+
+        if (wait > 0):
+            time.sleep(wait)
@@ -1,16 +1,22 @@
 import requests
 import json
+from irods_http_client.coalescing import RequestCoalescer
 
 class Resources:
 
-    def __init__(self, url_base: str):
+    def __init__(self, url_base: str, coalescer: RequestCoalescer=None):
         """" 
         Initializes DataObjects with a base url. 
         Token is set to None initially, and updated when setToken() is called in irodsClient.
+        Idempotent GET operations are sent through the given RequestCoalescer, or a private one if none is given.
         """
         self.url_base = url_base
         self.token = None
 
+        if (coalescer == None):
+            coalescer = RequestCoalescer()
+        self.coalescer = coalescer
+
 
     def create(self, name: str, type: str, host: str, vault_path: str, context: str):
         """
@@ -455,7 +461,7 @@ class Resources:
             'name': name
         }
 
-        r = requests.get(self.url_base + '/resources', headers=headers, params=params)
+        r = self.coalescer.get(self.url_base + '/resources', headers=headers, params=params)
 
         if (r.status_code / 100 == 2):
             rdict = r.json()
@@ -0,0 +1,120 @@
+import threading
+import time
+
+class StreamBudget:
+
+    def __init__(self, limit: int):
+        """
+        Initializes a thread-safe budget of parallel write streams shared by concurrent uploads.
+
+        Each upload asks for the streams it would like before calling parallel_write_init(), and
+        is granted its fair share of the limit given the number of uploads holding or waiting for
+        streams. The number of streams of an open handle cannot change, so the budget rebalances
+        as uploads finish: the streams they release go to the uploads waiting, and later uploads
+        get a larger share when fewer others are running.
+
+        Parameters
+        - limit: The maximum number of parallel write streams open at once.
+        """
+        if (not isinstance(limit, int)):
+            raise TypeError('limit must be an int')
+        if (not limit > 0):
+            raise ValueError('limit must be greater than 0')
+
+        self.limit = limit
+        self.in_use = 0
+        self.holders = 0
+        self._waiting = 0
+        self._condition = threading.Condition()
+
+
+    def _grant(self, wanted: int):
+        """ Returns the number of streams to grant now. Must be called with the condition held. """
+        available = self.limit - self.in_use
+        if (available <= 0):
+            return(0)
+        share = max(1, self.limit // max(1, self.holders + self._waiting))
+        return(min(wanted, available, share))
+
+
+    def acquire(self, wanted: int, timeout: float=None):
+        """
+        Waits until at least one stream is available and takes up to wanted streams.
+
+        Parameters
+        - wanted: The number of streams the upload would like.
+        - timeout (optional): The maximum number of seconds to wait. Waits indefinitely if not given.
+
+        Returns
+        - The number of streams granted, between 1 and wanted, or 0 if the timeout expired. Pass it to release() once the upload is finished.
+        """
+        if (not isinstance(wanted, int)):
+            raise TypeError('wanted must be an int')
+        if (not wanted > 0):
+            raise ValueError('wanted must be greater than 0')
+
+        deadline = None if (timeout == None) else time.monotonic() + timeout
+        with self._condition:
+            self._waiting += 1
+            try:
+                while True:
+                    granted = self._grant(wanted)
+                    if (granted > 0):
+                        self.in_use += granted
+                        self.holders += 1
+                        return(granted)
+                    remaining = None if (deadline == None) else deadline - time.monotonic()
+                    if ((remaining != None) and (remaining <= 0)):
+                        return(0)
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+
+    def try_acquire(self, wanted: int):
+        """
+        Takes up to wanted streams without waiting.
+
+        Parameters
+        - wanted: The number of streams the upload would like.
+
+        Returns
+        - The number of streams granted, or 0 if none are available.
+        """
+        if (not isinstance(wanted, int)):
+            raise TypeError('wanted must be an int')
+        if (not wanted > 0):
+            raise ValueError('wanted must be greater than 0')
+
+        with self._condition:
+            self._waiting += 1
+            granted = self._grant(wanted)
+            self._waiting -= 1
+            if (granted > 0):
+                self.in_use += granted
+                self.holders += 1
+            return(granted)
+
+
+    def available(self):
+        """ Returns the number of streams not in use. """
+        with self._condition:
+            return(self.limit - self.in_use)
+
+
+    def release(self, count: int):
+        """
+        Returns the streams granted to an upload once it is finished.
+
+        Parameters
+        - count: The number of streams granted by acquire() or try_acquire().
+        """
+        if (not isinstance(count, int)):
+            raise TypeError('count must be an int')
+        if (not count > 0):
+            raise ValueError('count must be greater than 0')
+
+        with self._condition:
+            self.in_use -= count
+            self.holders -= 1
+            self._condition.notify_all()
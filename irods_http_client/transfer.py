@@ -0,0 +1,984 @@
+import base64
+import hashlib
+import mmap
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from irods_http_client.query_operations import genquery_tree_condition
+
+def sha2_checksum(digest: bytes):
+    """
+    Formats a SHA-256 digest the way iRODS stores checksums.
+
+    Parameters
+    - digest: The raw SHA-256 digest.
+
+    Returns
+    - The checksum as 'sha2:' followed by the base64 encoded digest.
+    """
+    return('sha2:' + base64.b64encode(digest).decode('ascii'))
+
+
+def file_checksum(path: str, chunk_size: int=8 * 1024 * 1024):
+    """
+    Computes the iRODS SHA-256 checksum of a local file.
+
+    Parameters
+    - path: The path of the local file.
+    - chunk_size (optional): The number of bytes read at a time. Defaults to 8 MiB.
+
+    Returns
+    - The checksum in the 'sha2:' form used by iRODS.
+    """
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if (len(chunk) == 0):
+                break
+            hasher.update(chunk)
+    return(sha2_checksum(hasher.digest()))
+
+
+def _hash_file(path: str, chunk_size: int):
+    """ Computes the checksum of a file in a worker process, reading into one reusable buffer. """
+    try:
+        stat = os.stat(path)
+        hasher = hashlib.sha256()
+        buffer = bytearray(chunk_size)
+        view = memoryview(buffer)
+        with open(path, 'rb', buffering=0) as f:
+            while True:
+                count = f.readinto(buffer)
+                if (not count):
+                    break
+                hasher.update(view[:count])
+        return({'path': path, 'stat': stat, 'checksum': sha2_checksum(hasher.digest()), 'error': ''})
+    except OSError as e:
+        return({'path': path, 'stat': None, 'checksum': None, 'error': str(e)})
+
+
+def hash_files(paths, workers: int=0, chunk_size: int=8 * 1024 * 1024, executor: ProcessPoolExecutor=None):
+    """
+    Computes the checksums of a stream of local files in a pool of processes.
+
+    Files are read without buffering in chunks rounded up to a multiple of the page size,
+    and at most twice as many files as workers are in progress at a time.
+
+    Parameters
+    - paths: An iterable of local file paths. It is consumed as checksums complete, so it may be a generator.
+    - workers (optional): The number of processes. Defaults to the number of CPUs.
+    - chunk_size (optional): The number of bytes read at a time. Defaults to 8 MiB.
+    - executor (optional): An existing ProcessPoolExecutor to use. Created for the call if not given.
+
+    Returns
+    - A generator yielding a dict for each file as soon as its checksum is computed, in completion order.
+      Each dict holds the path, the os.stat() result taken before reading, and the checksum in 'sha2:' form.
+      If the file could not be read, the stat and checksum are None and error holds the reason.
+    """
+    if (not isinstance(workers, int)):
+        raise TypeError('workers must be an int')
+    if (not workers >= 0):
+        raise ValueError('workers must be greater than or equal to 0')
+    if (not isinstance(chunk_size, int)):
+        raise TypeError('chunk_size must be an int')
+    if (not chunk_size > 0):
+        raise ValueError('chunk_size must be greater than 0')
+
+    if (workers == 0):
+        workers = os.cpu_count() or 1
+    chunk_size = -(-chunk_size // mmap.PAGESIZE) * mmap.PAGESIZE
+    return(_hash_files(iter(paths), workers, chunk_size, executor))
+
+
+def _hash_files(paths, workers: int, chunk_size: int, executor: ProcessPoolExecutor):
+    owned = (executor == None)
+    if (owned):
+        executor = ProcessPoolExecutor(max_workers=workers)
+    pending = set()
+    try:
+        for path in paths:
+            pending.add(executor.submit(_hash_file, path, chunk_size))
+            if (len(pending) >= 2 * workers):
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while (len(pending) > 0):
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if (owned):
+            executor.shutdown(wait=True)
+
+
+class Transfer:
+
+    def __init__(self, api, chunk_size: int=8 * 1024 * 1024, streams: int=4, parallel_threshold: int=32 * 1024 * 1024, index=None, budget=None):
+        """
+        Initializes a Transfer for moving local files to and from iRODS.
+
+        Files are read once. The SHA-256 checksum is computed from the chunks as they are read,
+        in order, while the chunks themselves may be written by several streams in parallel.
+
+        Parameters
+        - api: The IrodsHttpClient used for the transfers. Its token must be set before transferring.
+        - chunk_size (optional): The number of bytes sent in each write request. Defaults to 8 MiB.
+        - streams (optional): The number of parallel write streams used for large files. Defaults to 4.
+        - parallel_threshold (optional): The size in bytes from which files are written with parallel streams. Defaults to 32 MiB.
+        - index (optional): A FingerprintIndex caching local checksums, so files that have not changed are not hashed again.
+        - budget (optional): A StreamBudget shared with other uploads, limiting the parallel write streams open at once.
+          Each large file then uses its share of the budget, up to streams.
+        """
+        if (not isinstance(chunk_size, int)):
+            raise TypeError('chunk_size must be an int')
+        if (not chunk_size > 0):
+            raise ValueError('chunk_size must be greater than 0')
+        if (not isinstance(streams, int)):
+            raise TypeError('streams must be an int')
+        if (not streams > 0):
+            raise ValueError('streams must be greater than 0')
+        if (not isinstance(parallel_threshold, int)):
+            raise TypeError('parallel_threshold must be an int')
+
+        self.api = api
+        self.chunk_size = chunk_size
+        self.streams = streams
+        self.parallel_threshold = parallel_threshold
+        self.index = index
+        self.budget = budget
+
+
+    def _write_sequential(self, f, lpath: str, resource: str, hasher):
+        """ Writes a file one chunk at a time. """
+        offset = 0
+        while True:
+            chunk = f.read(self.chunk_size)
+            if ((len(chunk) == 0) and (offset > 0)):
+                return
+            hasher.update(chunk)
+            r = self.api.data_objects.write(chunk, lpath, resource, offset=offset, truncate=1 if (offset == 0) else 0)
+            if (r['status_code'] / 100 != 2):
+                raise RuntimeError('Failed to write to \'' + lpath + '\': HTTP Status Code ' + str(r['status_code']))
+            if (r['data']['irods_response']['status_code']):
+                raise RuntimeError('Failed to write to \'' + lpath + '\': iRODS Status Code ' + str(r['data']['irods_response']['status_code']))
+            if (len(chunk) < self.chunk_size):
+                return
+            offset += len(chunk)
+
+
+    def _write_parallel(self, f, lpath: str, hasher):
+        """ Writes a file with parallel streams, taking them from the stream budget if there is one. """
+        if (self.budget == None):
+            self._write_streams(f, lpath, hasher, self.streams)
+            return
+        streams = self.budget.acquire(self.streams)
+        try:
+            self._write_streams(f, lpath, hasher, streams)
+        finally:
+            self.budget.release(streams)
+
+
+    def _write_streams(self, f, lpath: str, hasher, streams: int):
+        """ Writes a file with parallel streams. Chunk n is written by stream n modulo the number of streams. """
+        r = self.api.data_objects.parallel_write_init(lpath, streams)
+        if (r['status_code'] / 100 != 2):
+            raise RuntimeError('Failed to open \'' + lpath + '\' for parallel write: HTTP Status Code ' + str(r['status_code']))
+        if (r['data']['irods_response']['status_code']):
+            raise RuntimeError('Failed to open \'' + lpath + '\' for parallel write: iRODS Status Code ' + str(r['data']['irods_response']['status_code']))
+        handle = r['data']['parallel_write_handle']
+
+        # A short queue per stream keeps memory to a few chunks per stream.
+        queues = [queue.Queue(maxsize=2) for _ in range(streams)]
+        errors = []
+        failed = threading.Event()
+
+        def run(stream_index):
+            while True:
+                item = queues[stream_index].get()
+                if (item == None):
+                    return
+                if (failed.is_set()):
+                    continue
+                offset, chunk = item
+                try:
+                    r = self.api.data_objects.write(chunk, offset=offset, truncate=0, parallel_write_handle=handle, stream_index=stream_index)
+                    if (r['status_code'] / 100 != 2):
+                        raise RuntimeError('Failed to write to \'' + lpath + '\': HTTP Status Code ' + str(r['status_code']))
+                    if (r['data']['irods_response']['status_code']):
+                        raise RuntimeError('Failed to write to \'' + lpath + '\': iRODS Status Code ' + str(r['data']['irods_response']['status_code']))
+                except Exception as e:
+                    errors.append(e)
+                    failed.set()
+
+        threads = [threading.Thread(target=run, args=(i,), daemon=True) for i in range(streams)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            offset = 0
+            index = 0
+            while (not failed.is_set()):
+                chunk = f.read(self.chunk_size)
+                if (len(chunk) == 0):
+                    break
+                hasher.update(chunk)
+                queues[index % streams].put((offset, chunk))
+                offset += len(chunk)
+                index += 1
+        finally:
+            for q in queues:
+                q.put(None)
+            for thread in threads:
+                thread.join()
+            r = self.api.data_objects.parallel_write_shutdown(handle)
+
+        if (len(errors) > 0):
+            raise errors[0]
+        # The data object is only complete once the handle has been closed successfully.
+        if (r['status_code'] / 100 != 2):
+            raise RuntimeError('Failed to close parallel write handle for \'' + lpath + '\': HTTP Status Code ' + str(r['status_code']))
+        if (r['data']['irods_response']['status_code']):
+            raise RuntimeError('Failed to close parallel write handle for \'' + lpath + '\': iRODS Status Code ' + str(r['data']['irods_response']['status_code']))
+
+
+    def _catalog_checksum(self, lpath: str, compute: int):
+        """ Returns the checksum of the first good replica, asking the server to calculate it if there is none and compute is 1. """
+        r = self.api.data_objects.stat_many([lpath])
+        entry = r['results'][0]
+        if (entry == None):
+            raise RuntimeError('Data object \'' + lpath + '\' was not found after writing')
+        if ((entry['checksum'] != '') or (not compute)):
+            return(entry['checksum'])
+
+        r = self.api.data_objects.calculate_checksum(lpath)
+        if (r['status_code'] / 100 != 2):
+            raise RuntimeError('Failed to calculate checksum for \'' + lpath + '\': HTTP Status Code ' + str(r['status_code']))
+        if (r['data']['irods_response']['status_code']):
+            raise RuntimeError('Failed to calculate checksum for \'' + lpath + '\': iRODS Status Code ' + str(r['data']['irods_response']['status_code']))
+        return(r['data']['checksum'])
+
+
+    def upload_file(self, local_path: str, lpath: str, resource: str='', verify: int=0):
+        """
+        Uploads a local file, computing its checksum while it is sent.
+
+        Parameters
+        - local_path: The path of the local file.
+        - lpath: The absolute logical path of the data object to write.
+        - resource (optional): The root resource to write to. Only used for files written without parallel streams.
+        - verify (optional): Set to 1 to ask the server to calculate the checksum when the catalog has none, which makes it
+          read every replica it just received. Set to 0 to only compare with a checksum already in the catalog. After an
+          HTTP write the catalog usually has no checksum, so verified is then None. Defaults to 0.
+
+        Returns
+        - A dict with the lpath, size, the checksum computed locally, the checksum in the catalog (empty if there is none),
+          whether they match (None if there was no SHA-256 checksum to compare), and the elapsed seconds.
+        - A RuntimeError is raised if the upload fails.
+        """
+        if (self.api.data_objects.token == None):
+            raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
+        if (not isinstance(local_path, str)):
+            raise TypeError('local_path must be a string')
+        if (not isinstance(lpath, str)):
+            raise TypeError('lpath must be a string')
+        if (not isinstance(resource, str)):
+            raise TypeError('resource must be a string')
+        if (not isinstance(verify, int)):
+            raise TypeError('verify must be an int 1 or 0')
+        if ((not verify == 0) and (not verify == 1)):
+            raise ValueError('verify must be an int 1 or 0')
+
+        start = time.time()
+        stat = os.stat(local_path)
+        size = stat.st_size
+        hasher = hashlib.sha256()
+        with open(local_path, 'rb') as f:
+            if ((size >= self.parallel_threshold) and (size > self.chunk_size) and (resource == '')):
+                self._write_parallel(f, lpath, hasher)
+            else:
+                self._write_sequential(f, lpath, resource, hasher)
+
+        checksum = sha2_checksum(hasher.digest())
+        if (self.index != None):
+            # Only record the checksum if the file did not change while it was read.
+            after = os.stat(local_path)
+            if ((after.st_size == stat.st_size) and (after.st_mtime_ns == stat.st_mtime_ns)):
+                self.index.put(stat, checksum)
+        server_checksum = self._catalog_checksum(lpath, verify)
+        verified = None
+        # Servers configured for another hashing scheme produce checksums that cannot be compared.
+        if (server_checksum.startswith('sha2:')):
+            verified = (server_checksum == checksum)
+            if (not verified):
+                print('Checksum mismatch for \'' + lpath + '\': local ' + checksum + ', server ' + server_checksum)
+
+        return({
+            'lpath': lpath,
+            'size': size,
+            'checksum': checksum,
+            'server_checksum': server_checksum,
+            'verified': verified,
+            'elapsed': time.time() - start
+        })
+
+
+    def _unchanged(self, local_path: str, stat, entry: dict, checksum: int, local_checksum: str=None):
+        """ Returns True if the data object described by entry already holds the local file. """
+        if ((entry == None) or (entry['size'] != stat.st_size)):
+            return(False)
+        if (not checksum):
+            return(entry['modify_time'] == int(stat.st_mtime))
+        if (not entry['checksum'].startswith('sha2:')):
+            return(False)
+        if (local_checksum != None):
+            return(local_checksum == entry['checksum'])
+        if (self.index != None):
+            return(self.index.checksum(local_path, self.chunk_size) == entry['checksum'])
+        return(file_checksum(local_path, self.chunk_size) == entry['checksum'])
+
+
+    def _upload_if_changed(self, local_path: str, lpath: str, stat, entry: dict, skip_unchanged: int, checksum: int, verify: int, local_checksum: str=None):
+        """ Uploads a file unless it is unchanged, then sets the modification time of the data object to that of the file. """
+        if (skip_unchanged and self._unchanged(local_path, stat, entry, checksum, local_checksum)):
+            return(None)
+        uploaded = self.upload_file(local_path, lpath, verify=verify)
+        if (uploaded['verified'] == False):
+            raise RuntimeError('Checksum mismatch after upload')
+
+        # Keep the catalog modification time equal to the local one so the next run can skip the file.
+        r = self.api.data_objects.touch(lpath, no_create=1, seconds_since_epoch=int(stat.st_mtime))
+        if (r['status_code'] / 100 != 2):
+            raise RuntimeError('Failed to set the modification time: HTTP Status Code ' + str(r['status_code']))
+        return(uploaded)
+
+
+    def _upload_batches(self, batches, report: dict, lock, skip_unchanged: int, checksum: int, verify: int, workers: int, hash_workers: int, manifest=None):
+        """
+        Uploads batches of (local path, logical path, os.stat() result, catalog entry) tuples, updating report.
+
+        The next batch is only requested once every file of the previous one has been queued,
+        so the batches may be produced lazily while earlier files are still uploading.
+        The state of each file is recorded in manifest, if given.
+        """
+        # Bounds the number of files queued, so memory does not grow with the number of files.
+        slots = threading.BoundedSemaphore(workers * 2)
+
+        def run(local_path, lpath, stat, entry, local_checksum=None):
+            try:
+                if (manifest != None):
+                    manifest.mark('upload', local_path, lpath, 'in_flight')
+                uploaded = self._upload_if_changed(local_path, lpath, stat, entry, skip_unchanged, checksum, verify, local_checksum)
+                with lock:
+                    if (uploaded == None):
+                        report['skipped'] += 1
+                    else:
+                        report['uploaded'] += 1
+                        report['bytes'] += uploaded['size']
+                if (manifest != None):
+                    manifest.mark('upload', local_path, lpath, 'done', uploaded['checksum'] if (uploaded != None) else (local_checksum or entry['checksum']))
+            except Exception as e:
+                with lock:
+                    report['failures'].append({'local_path': local_path, 'lpath': lpath, 'error': str(e)})
+                if (manifest != None):
+                    manifest.mark('upload', local_path, lpath, 'failed', error=str(e))
+            finally:
+                slots.release()
+
+        def needs_hash(stat, entry):
+            # Only files that might be unchanged need a checksum, and the index may already have it.
+            if ((entry == None) or (entry['size'] != stat.st_size) or (not entry['checksum'].startswith('sha2:'))):
+                return(False)
+            return((self.index == None) or (self.index.get(stat) == None))
+
+        hash_executor = None
+        if (skip_unchanged and checksum and (hash_workers != -1)):
+            hash_executor = ProcessPoolExecutor(max_workers=hash_workers or None)
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for batch in batches:
+                    hashing = {}
+                    for local_path, lpath, stat, entry in batch:
+                        if ((hash_executor != None) and needs_hash(stat, entry)):
+                            hashing.setdefault(local_path, []).append((lpath, stat, entry))
+                            continue
+                        slots.acquire()
+                        executor.submit(run, local_path, lpath, stat, entry)
+
+                    if (len(hashing) == 0):
+                        continue
+
+                    # Each file is handed to the upload threads as soon as its checksum is known.
+                    for result in hash_files(list(hashing), hash_workers, self.chunk_size, hash_executor):
+                        if ((result['checksum'] != None) and (self.index != None)):
+                            self.index.put(result['stat'], result['checksum'])
+                        for lpath, stat, entry in hashing[result['path']]:
+                            if (result['checksum'] == None):
+                                with lock:
+                                    report['failures'].append({'local_path': result['path'], 'lpath': lpath, 'error': result['error']})
+                                continue
+                            slots.acquire()
+                            executor.submit(run, result['path'], lpath, stat, entry, result['checksum'])
+        finally:
+            if (hash_executor != None):
+                hash_executor.shutdown(wait=True)
+
+
+    def upload_many(self, files: list, skip_unchanged: int=1, checksum: int=0, workers: int=8, window: int=1000, verify: int=0, hash_workers: int=-1, manifest=None):
+        """
+        Uploads many local files, skipping those already in the catalog.
+
+        The catalog size, modification time and checksum of each window of files are fetched with
+        stat_many(), so files that have not changed are skipped without transferring any data.
+        After each upload the modification time of the data object is set to that of the file.
+
+        Parameters
+        - files: A list of (local path, absolute logical path) pairs. The parent collections must exist.
+        - skip_unchanged (optional): Set to 1 to skip files that have not changed, otherwise set to 0. Defaults to 1.
+        - checksum (optional): Set to 1 to decide whether a file changed by comparing its size and a locally computed
+          checksum with the catalog, rather than its size and modification time. Defaults to 0.
+        - workers (optional): The number of files uploaded concurrently. Defaults to 8.
+        - window (optional): The number of files looked up in the catalog at a time. Defaults to 1000.
+        - verify (optional): Set to 1 to have the server calculate missing checksums to compare with each upload, as in upload_file(). Defaults to 0.
+        - hash_workers (optional): The number of processes computing local checksums when checksum is 1. The checksums are
+          passed to the upload threads as they complete, so hashing and uploading overlap. Set to 0 for one process per CPU,
+          or to -1 to compute checksums in the upload threads. Defaults to -1.
+        - manifest (optional): A TransferManifest recording the state of each file. Files it already lists as done are
+          skipped without looking them up in the catalog, so an interrupted upload can be resumed by calling upload_many() again.
+
+        Returns
+        - A dict with the number of files, uploaded and skipped files, bytes uploaded, failures, elapsed seconds, and files per second.
+        - Failed files are recorded in failures rather than raised. A RuntimeError is raised if a catalog query fails.
+        """
+        if (self.api.data_objects.token == None):
+            raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
+        if (not isinstance(files, list)):
+            raise TypeError('files must be a list of (local path, logical path) pairs')
+        for pair in files:
+            if ((not isinstance(pair, (tuple, list))) or (len(pair) != 2) or (not isinstance(pair[0], str)) or (not isinstance(pair[1], str))):
+                raise TypeError('files must be a list of (local path, logical path) pairs')
+        if (not isinstance(skip_unchanged, int)):
+            raise TypeError('skip_unchanged must be an int 1 or 0')
+        if ((not skip_unchanged == 0) and (not skip_unchanged == 1)):
+            raise ValueError('skip_unchanged must be an int 1 or 0')
+        if (not isinstance(checksum, int)):
+            raise TypeError('checksum must be an int 1 or 0')
+        if ((not checksum == 0) and (not checksum == 1)):
+            raise ValueError('checksum must be an int 1 or 0')
+        if (not isinstance(workers, int)):
+            raise TypeError('workers must be an int')
+        if (not workers > 0):
+            raise ValueError('workers must be greater than 0')
+        if (not isinstance(window, int)):
+            raise TypeError('window must be an int')
+        if (not window > 0):
+            raise ValueError('window must be greater than 0')
+        if (not isinstance(verify, int)):
+            raise TypeError('verify must be an int 1 or 0')
+        if ((not verify == 0) and (not verify == 1)):
+            raise ValueError('verify must be an int 1 or 0')
+        if (not isinstance(hash_workers, int)):
+            raise TypeError('hash_workers must be an int')
+        if (not hash_workers >= -1):
+            raise ValueError('hash_workers must be greater than or equal to 0 or flag value -1')
+
+        start = time.time()
+        report = {
+            'files': len(files),
+            'uploaded': 0,
+            'skipped': 0,
+            'bytes': 0,
+            'failures': []
+        }
+        lock = threading.Lock()
+
+        remaining = files
+        if (manifest != None):
+            manifest.add('upload', files)
+            done = set((entry['local_path'], entry['lpath']) for entry in manifest.entries('upload', ['done']))
+            remaining = [(local_path, lpath) for local_path, lpath in files if (not (local_path, lpath) in done)]
+            report['skipped'] = len(files) - len(remaining)
+
+        def windows():
+            for i in range(0, len(remaining), window):
+                batch = []
+                for local_path, lpath in remaining[i:i + window]:
+                    try:
+                        batch.append((local_path, lpath, os.stat(local_path)))
+                    except OSError as e:
+                        with lock:
+                            report['failures'].append({'local_path': local_path, 'lpath': lpath, 'error': str(e)})
+
+                entries = [None] * len(batch)
+                if (skip_unchanged and (len(batch) > 0)):
+                    entries = self.api.data_objects.stat_many([lpath for _, lpath, _ in batch])['results']
+                yield [(local_path, lpath, stat, entry) for (local_path, lpath, stat), entry in zip(batch, entries)]
+
+        self._upload_batches(windows(), report, lock, skip_unchanged, checksum, verify, workers, hash_workers, manifest)
+        if (manifest != None):
+            manifest.flush()
+
+        elapsed = time.time() - start
+        report['elapsed'] = elapsed
+        report['files_per_second'] = len(files) / elapsed if (elapsed > 0) else 0.0
+        print('Uploaded ' + str(report['uploaded']) + ' of ' + str(len(files)) + ' files (' + str(report['bytes']) + ' bytes), skipped ' +
+              str(report['skipped']) + ' unchanged, ' + str(len(report['failures'])) + ' failures')
+
+        return(report)
+
+
+    def _catalog_tree(self, lpath: str):
+        """ Returns the collections and data objects under a collection, listed with one paginated GenQuery each. """
+        condition = ' WHERE ' + genquery_tree_condition(lpath)
+        collections = set()
+        for row in self.api.queries.execute_genquery_paged('SELECT COLL_NAME' + condition):
+            collections.add(row[0])
+
+        objects = {}
+        query = 'SELECT COLL_NAME, DATA_NAME, DATA_REPL_NUM, DATA_SIZE, DATA_CHECKSUM, DATA_MODIFY_TIME, DATA_REPL_STATUS' + condition
+        for row in self.api.queries.execute_genquery_paged(query):
+            object_path = row[0].rstrip('/') + '/' + row[1]
+            replica = {'size': int(row[3]), 'checksum': row[4], 'modify_time': int(row[5]), 'status': row[6]}
+            entry = objects.get(object_path)
+            # Describe each data object using a good replica, if there is one.
+            if ((entry == None) or ((entry['status'] != '1') and (replica['status'] == '1'))):
+                replica['lpath'] = object_path
+                objects[object_path] = replica
+        return(collections, objects)
+
+
+    def _local_tree(self, local_dir: str):
+        """ Returns the relative paths of the directories under local_dir and a list of (relative path, os.stat() result) for its files. """
+        directories = ['']
+        files = []
+        for directory, subdirectories, names in os.walk(local_dir):
+            relative = os.path.relpath(directory, local_dir)
+            relative = '' if (relative == '.') else relative.replace(os.sep, '/') + '/'
+            subdirectories.sort()
+            for name in subdirectories:
+                directories.append(relative + name)
+            for name in sorted(names):
+                try:
+                    stat = os.stat(os.path.join(directory, name))
+                except OSError:
+                    continue
+                files.append((relative + name, stat))
+        return(directories, files)
+
+
+    def sync(self, local_dir: str, lpath: str, delete: int=0, checksum: int=0, workers: int=8, verify: int=0, hash_workers: int=-1):
+        """
+        Makes a collection tree match a local directory tree.
+
+        The catalog is listed with paginated GenQuery while the local tree is scanned, and the two are
+        compared in memory. Missing collections are created one depth at a time, and the files of each
+        collection start uploading as soon as it exists. Unchanged files are skipped as in upload_many(),
+        and large files are written with parallel streams.
+
+        Parameters
+        - local_dir: The path of the local directory.
+        - lpath: The absolute logical path of the collection to update. Created if it does not exist.
+        - delete (optional): Set to 1 to remove data objects and collections that are not in the local tree, otherwise set to 0. Defaults to 0.
+        - checksum (optional): Set to 1 to compare sizes and checksums rather than sizes and modification times. Defaults to 0.
+        - workers (optional): The number of requests sent concurrently. Defaults to 8.
+        - verify (optional): Set to 1 to have the server calculate missing checksums to compare with each upload, as in upload_file(). Defaults to 0.
+        - hash_workers (optional): The number of processes computing local checksums when checksum is 1, as in upload_many(). Defaults to -1.
+
+        Returns
+        - A dict with the number of local files and directories, collections created, files uploaded and skipped,
+          bytes uploaded, entries deleted, failures, elapsed seconds, and files per second.
+        - Failed operations are recorded in failures rather than raised. A RuntimeError is raised if a catalog query fails.
+        """
+        if (self.api.data_objects.token == None):
+            raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
+        if (not isinstance(local_dir, str)):
+            raise TypeError('local_dir must be a string')
+        if (not os.path.isdir(local_dir)):
+            raise ValueError('local_dir must be an existing directory')
+        if (not isinstance(lpath, str)):
+            raise TypeError('lpath must be a string')
+        if (not lpath.startswith('/')):
+            raise ValueError('lpath must be an absolute logical path')
+        if (not isinstance(delete, int)):
+            raise TypeError('delete must be an int 1 or 0')
+        if ((not delete == 0) and (not delete == 1)):
+            raise ValueError('delete must be an int 1 or 0')
+        if (not isinstance(checksum, int)):
+            raise TypeError('checksum must be an int 1 or 0')
+        if ((not checksum == 0) and (not checksum == 1)):
+            raise ValueError('checksum must be an int 1 or 0')
+        if (not isinstance(workers, int)):
+            raise TypeError('workers must be an int')
+        if (not workers > 0):
+            raise ValueError('workers must be greater than 0')
+        if (not isinstance(verify, int)):
+            raise TypeError('verify must be an int 1 or 0')
+        if ((not verify == 0) and (not verify == 1)):
+            raise ValueError('verify must be an int 1 or 0')
+        if (not isinstance(hash_workers, int)):
+            raise TypeError('hash_workers must be an int')
+        if (not hash_workers >= -1):
+            raise ValueError('hash_workers must be greater than or equal to 0 or flag value -1')
+        if (lpath != '/'):
+            lpath = lpath.rstrip('/')
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            catalog = executor.submit(self._catalog_tree, lpath)
+            directories, files = self._local_tree(local_dir)
+            collections, objects = catalog.result()
+
+        def to_lpath(relative):
+            if (relative == ''):
+                return(lpath)
+            return(lpath.rstrip('/') + '/' + relative)
+
+        report = {
+            'files': len(files),
+            'directories': len(directories),
+            'collections_created': 0,
+            'uploaded': 0,
+            'skipped': 0,
+            'bytes': 0,
+            'deleted': 0,
+            'failures': []
+        }
+        lock = threading.Lock()
+
+        files_by_directory = {}
+        for relative, stat in files:
+            directory = relative.rsplit('/', 1)[0] if ('/' in relative) else ''
+            files_by_directory.setdefault(directory, []).append((relative, stat))
+
+        def batch(directory):
+            return([(os.path.join(local_dir, *relative.split('/')), to_lpath(relative), stat, objects.get(to_lpath(relative)))
+                    for relative, stat in files_by_directory.get(directory, [])])
+
+        missing_by_depth = {}
+        for directory in directories:
+            if (not to_lpath(directory) in collections):
+                missing_by_depth.setdefault(directory.count('/') + (directory != ''), []).append(directory)
+
+        def create(directory):
+            r = self.api.collections.create(to_lpath(directory), create_intermediates=1)
+            if ((r['status_code'] / 100 != 2) or r['data']['irods_response']['status_code']):
+                status = r['status_code'] if (r['status_code'] / 100 != 2) else r['data']['irods_response']['status_code']
+                return('Failed to create collection: status code ' + str(status))
+            return('')
+
+        def batches():
+            # Files in collections that already exist start uploading right away.
+            for directory in directories:
+                if (to_lpath(directory) in collections):
+                    yield batch(directory)
+
+            # Parents are created before their children, while the files queued so far upload.
+            with ThreadPoolExecutor(max_workers=workers) as creator:
+                for depth in sorted(missing_by_depth):
+                    level = missing_by_depth[depth]
+                    for directory, error in zip(level, creator.map(create, level)):
+                        if (error != ''):
+                            with lock:
+                                report['failures'].append({'local_path': os.path.join(local_dir, *directory.split('/')), 'lpath': to_lpath(directory), 'error': error})
+                            continue
+                        with lock:
+                            report['collections_created'] += 1
+                        yield batch(directory)
+
+        self._upload_batches(batches(), report, lock, 1, checksum, verify, workers, hash_workers)
+
+        if (delete):
+            local_collections = set(to_lpath(directory) for directory in directories)
+            local_objects = set(to_lpath(relative) for relative, _ in files)
+            # Only the topmost extra collections are removed, together with everything beneath them.
+            extra = collections - local_collections
+            extra_collections = []
+            for collection in sorted(extra):
+                if ((len(extra_collections) == 0) or (not collection.startswith(extra_collections[-1] + '/'))):
+                    extra_collections.append(collection)
+            extra_objects = []
+            for object_path in sorted(set(objects) - local_objects):
+                parent = object_path.rsplit('/', 1)[0]
+                if (not parent in extra):
+                    extra_objects.append(object_path)
+
+            def remove(item):
+                kind, path = item
+                if (kind == 'collection'):
+                    r = self.api.collections.remove(path, recurse=1)
+                else:
+                    r = self.api.data_objects.remove(path)
+                if ((r['status_code'] / 100 != 2) or r['data']['irods_response']['status_code']):
+                    status = r['status_code'] if (r['status_code'] / 100 != 2) else r['data']['irods_response']['status_code']
+                    return('Failed to remove ' + kind + ': status code ' + str(status))
+                return('')
+
+            items = [('collection', path) for path in extra_collections] + [('data_object', path) for path in extra_objects]
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for (kind, path), error in zip(items, executor.map(remove, items)):
+                    if (error != ''):
+                        report['failures'].append({'local_path': '', 'lpath': path, 'error': error})
+                    else:
+                        report['deleted'] += 1
+
+        elapsed = time.time() - start
+        report['elapsed'] = elapsed
+        report['files_per_second'] = len(files) / elapsed if (elapsed > 0) else 0.0
+        print('Synchronized \'' + local_dir + '\' to \'' + lpath + '\': ' + str(report['uploaded']) + ' uploaded, ' + str(report['skipped']) +
+              ' unchanged, ' + str(report['collections_created']) + ' collections created, ' + str(report['deleted']) + ' deleted, ' +
+              str(len(report['failures'])) + ' failures')
+
+        return(report)
+
+
+    def _read_range(self, lpath: str, offset: int, count: int, received):
+        """ Reads count bytes of a data object starting at offset, passing each piece to received. """
+        end = offset + count
+        while (offset < end):
+            data = self.api.data_objects.read(lpath, offset=offset, count=end - offset, as_bytes=1)
+            if (isinstance(data, dict)):
+                raise RuntimeError('Failed to read \'' + lpath + '\': HTTP Status Code ' + str(data['status_code']))
+            if (len(data) == 0):
+                raise RuntimeError('Failed to read \'' + lpath + '\': the data object is shorter than expected')
+            received(offset, data)
+            offset += len(data)
+
+
+    def _download(self, lpath: str, local_path: str, entry: dict, verify: int, counted):
+        """ Downloads a data object to a temporary file, verifies it and moves it into place. Returns the local checksum, if computed. """
+        size = entry['size']
+        temporary = local_path + '.part'
+        hasher = hashlib.sha256()
+        try:
+            with open(temporary, 'wb') as f:
+                if ((size >= self.parallel_threshold) and (size > self.chunk_size)):
+                    # Ranges arrive out of order, so the checksum is computed from the file afterwards.
+                    hasher = None
+                    f.truncate(size)
+                    f.flush()
+
+                    def fetch(offset):
+                        with open(temporary, 'r+b') as part:
+                            def received(position, data):
+                                part.seek(position)
+                                part.write(data)
+                                counted(len(data))
+                            self._read_range(lpath, offset, min(self.chunk_size, size - offset), received)
+
+                    with ThreadPoolExecutor(max_workers=self.streams) as executor:
+                        list(executor.map(fetch, range(0, size, self.chunk_size)))
+                else:
+                    def received(position, data):
+                        hasher.update(data)
+                        f.write(data)
+                        counted(len(data))
+
+                    for offset in range(0, size, self.chunk_size):
+                        self._read_range(lpath, offset, min(self.chunk_size, size - offset), received)
+
+            checksum = None
+            if (verify and entry['checksum'].startswith('sha2:')):
+                checksum = sha2_checksum(hasher.digest()) if (hasher != None) else file_checksum(temporary, self.chunk_size)
+                if (checksum != entry['checksum']):
+                    raise RuntimeError('Checksum mismatch after download: local ' + checksum + ', server ' + entry['checksum'])
+            os.replace(temporary, local_path)
+        except BaseException:
+            if (os.path.exists(temporary)):
+                os.remove(temporary)
+            raise
+
+        # Keep the local modification time equal to the catalog one so the next run can skip the file.
+        os.utime(local_path, (entry['modify_time'], entry['modify_time']))
+        if ((checksum != None) and (self.index != None)):
+            self.index.put(os.stat(local_path), checksum)
+        return(checksum)
+
+
+    def _local_unchanged(self, local_path: str, entry: dict, checksum: int):
+        """ Returns True if the local file already holds the data object described by entry. """
+        try:
+            stat = os.stat(local_path)
+        except OSError:
+            return(False)
+        if (stat.st_size != entry['size']):
+            return(False)
+        if (checksum and entry['checksum'].startswith('sha2:')):
+            if (self.index != None):
+                return(self.index.checksum(local_path, self.chunk_size) == entry['checksum'])
+            return(file_checksum(local_path, self.chunk_size) == entry['checksum'])
+        return(int(stat.st_mtime) == entry['modify_time'])
+
+
+    def mirror(self, lpath: str, local_dir: str, checksum: int=1, workers: int=8, verify: int=1, progress=None, progress_interval: float=5.0, manifest=None):
+        """
+        Makes a local directory tree match a collection tree.
+
+        The collection tree is listed with paginated GenQuery, and every local directory is created before
+        the downloads start. Data objects are downloaded concurrently, and large ones are read in ranges by
+        several streams at once. Each file is written to a temporary file and moved into place when complete.
+
+        Parameters
+        - lpath: The absolute logical path of the collection to download.
+        - local_dir: The path of the local directory. Created if it does not exist.
+        - checksum (optional): Set to 1 to skip files whose size and checksum match the catalog, otherwise set to 0 to compare
+          sizes and modification times. Files are compared by modification time when the catalog has no SHA-256 checksum. Defaults to 1.
+        - workers (optional): The number of data objects downloaded concurrently. Defaults to 8.
+        - verify (optional): Set to 1 to compare the checksum of each download with the catalog checksum, otherwise set to 0. Defaults to 1.
+        - progress (optional): A function called with a progress dict every progress_interval seconds and once at the end.
+          It contains the number of data objects downloaded, skipped and failed, the bytes downloaded, the elapsed seconds and bytes_per_second.
+        - progress_interval (optional): The number of seconds between progress calls. Defaults to 5.
+        - manifest (optional): A TransferManifest recording the state of each data object. If it lists unfinished downloads
+          from lpath into local_dir, the download resumes from it without listing the catalog again, and data objects already
+          done are skipped. Otherwise the download is planned from the catalog and recorded in the manifest.
+
+        Returns
+        - A dict with the number of data objects and collections, data objects downloaded and skipped, bytes downloaded,
+          failures, elapsed seconds, objects_per_second and bytes_per_second.
+        - Failed downloads are recorded in failures rather than raised. A RuntimeError is raised if a catalog query fails.
+        """
+        if (self.api.data_objects.token == None):
+            raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
+        if (not isinstance(lpath, str)):
+            raise TypeError('lpath must be a string')
+        if (not lpath.startswith('/')):
+            raise ValueError('lpath must be an absolute logical path')
+        if (not isinstance(local_dir, str)):
+            raise TypeError('local_dir must be a string')
+        if (not isinstance(checksum, int)):
+            raise TypeError('checksum must be an int 1 or 0')
+        if ((not checksum == 0) and (not checksum == 1)):
+            raise ValueError('checksum must be an int 1 or 0')
+        if (not isinstance(workers, int)):
+            raise TypeError('workers must be an int')
+        if (not workers > 0):
+            raise ValueError('workers must be greater than 0')
+        if (not isinstance(verify, int)):
+            raise TypeError('verify must be an int 1 or 0')
+        if ((not verify == 0) and (not verify == 1)):
+            raise ValueError('verify must be an int 1 or 0')
+        if ((progress != None) and (not callable(progress))):
+            raise TypeError('progress must be callable')
+        if (not isinstance(progress_interval, (int, float))):
+            raise TypeError('progress_interval must be a number')
+        if (lpath != '/'):
+            lpath = lpath.rstrip('/')
+
+        start = time.time()
+        prefix = lpath.rstrip('/') + '/'
+
+        def to_local(path):
+            if (path == lpath):
+                return(local_dir)
+            return(os.path.join(local_dir, *path[len(prefix):].split('/')))
+
+        planned = []
+        if (manifest != None):
+            # Only a download of the same collection into the same directory is resumed.
+            local_prefix = os.path.join(os.path.abspath(local_dir), '')
+            planned = [entry for entry in manifest.entries('download')
+                       if (entry['lpath'].startswith(prefix) and os.path.abspath(entry['local_path']).startswith(local_prefix))]
+            # A finished download is planned again, so data objects added to the catalog since are picked up.
+            if (all(entry['state'] == 'done' for entry in planned)):
+                planned = []
+
+        skipped = 0
+        collections = set()
+        if (len(planned) > 0):
+            # Resume the download recorded in the manifest. Its directories were created when it was planned.
+            targets = []
+            for entry in sorted(planned, key=lambda entry: entry['lpath']):
+                if (entry['state'] == 'done'):
+                    skipped += 1
+                    continue
+                targets.append(({'lpath': entry['lpath'], 'size': entry['size'], 'checksum': entry['checksum'], 'modify_time': entry['modify_time']},
+                                entry['local_path']))
+        else:
+            collections, objects = self._catalog_tree(lpath)
+            os.makedirs(local_dir, exist_ok=True)
+            for collection in sorted(collections):
+                os.makedirs(to_local(collection), exist_ok=True)
+            targets = [(objects[object_path], to_local(object_path)) for object_path in sorted(objects)]
+            if (manifest != None):
+                manifest.add('download', [(local_path, entry['lpath'], entry['size'], entry['checksum'], entry['modify_time']) for entry, local_path in targets])
+
+        report = {
+            'objects': len(targets) + skipped,
+            'collections': len(collections),
+            'downloaded': 0,
+            'skipped': skipped,
+            'bytes': 0,
+            'failures': []
+        }
+        lock = threading.Lock()
+        last_progress = [start]
+        # Bounds the number of data objects queued, so memory does not grow with the size of the tree.
+        slots = threading.BoundedSemaphore(workers * 2)
+
+        def report_progress(final=False):
+            with lock:
+                now = time.time()
+                if ((progress == None) or ((not final) and (now - last_progress[0] < progress_interval))):
+                    return
+                last_progress[0] = now
+                current = {
+                    'downloaded': report['downloaded'],
+                    'skipped': report['skipped'],
+                    'failed': len(report['failures']),
+                    'bytes': report['bytes'],
+                    'elapsed': now - start
+                }
+            current['bytes_per_second'] = 0
+            if (current['elapsed'] > 0):
+                current['bytes_per_second'] = current['bytes'] / current['elapsed']
+            progress(current)
+
+        def counted(count):
+            with lock:
+                report['bytes'] += count
+            report_progress()
+
+        def run(entry, local_path):
+            try:
+                local_checksum = None
+                if (manifest != None):
+                    manifest.mark('download', local_path, entry['lpath'], 'in_flight')
+                if (self._local_unchanged(local_path, entry, checksum)):
+                    with lock:
+                        report['skipped'] += 1
+                else:
+                    local_checksum = self._download(entry['lpath'], local_path, entry, verify, counted)
+                    with lock:
+                        report['downloaded'] += 1
+                if (manifest != None):
+                    manifest.mark('download', local_path, entry['lpath'], 'done', local_checksum or entry['checksum'])
+            except Exception as e:
+                with lock:
+                    report['failures'].append({'lpath': entry['lpath'], 'local_path': local_path, 'error': str(e)})
+                if (manifest != None):
+                    manifest.mark('download', local_path, entry['lpath'], 'failed', error=str(e))
+            finally:
+                slots.release()
+            report_progress()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for entry, local_path in targets:
+                slots.acquire()
+                executor.submit(run, entry, local_path)
+        if (manifest != None):
+            manifest.flush()
+
+        elapsed = time.time() - start
+        report['elapsed'] = elapsed
+        report['objects_per_second'] = report['objects'] / elapsed if (elapsed > 0) else 0.0
+        report['bytes_per_second'] = report['bytes'] / elapsed if (elapsed > 0) else 0.0
+        report_progress(True)
+        print('Mirrored \'' + lpath + '\' to \'' + local_dir + '\': ' + str(report['downloaded']) + ' downloaded (' + str(report['bytes']) +
+              ' bytes), ' + str(report['skipped']) + ' unchanged, ' + str(len(report['failures'])) + ' failures')
+
+        return(report)
+
@@ -0,0 +1,187 @@
+import sqlite3
+import threading
+import time
+
+# The states a file moves through. Files left in_flight by a crash are transferred again on resume.
+STATES = ['pending', 'in_flight', 'done', 'failed']
+
+class TransferManifest:
+
+    def __init__(self, path: str, batch_size: int=1000, commit_interval: float=1.0):
+        """
+        Initializes a TransferManifest recording the state of each file of a bulk transfer in a SQLite file.
+
+        State changes are buffered and written in one transaction once batch_size changes are waiting
+        or commit_interval seconds have passed, so the cost of the journal is shared by many files.
+        After a crash, the same manifest tells the transfer helpers which files are already done.
+
+        Parameters
+        - path: The path of the SQLite file. Created if it does not exist.
+        - batch_size (optional): The number of state changes written per transaction. Defaults to 1000.
+        - commit_interval (optional): The maximum number of seconds a state change waits before being written. Defaults to 1.
+        """
+        if (not isinstance(path, str)):
+            raise TypeError('path must be a string')
+        if (not isinstance(batch_size, int)):
+            raise TypeError('batch_size must be an int')
+        if (not batch_size > 0):
+            raise ValueError('batch_size must be greater than 0')
+        if (not isinstance(commit_interval, (int, float))):
+            raise TypeError('commit_interval must be a number')
+        if (not commit_interval >= 0):
+            raise ValueError('commit_interval must be greater than or equal to 0')
+
+        self.path = path
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        # The total number of seconds spent writing to the SQLite file.
+        self.commit_seconds = 0.0
+        self._lock = threading.Lock()
+        self._changes = []
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'direction TEXT, local_path TEXT, lpath TEXT, state TEXT, size INTEGER, checksum TEXT, modify_time INTEGER, error TEXT, '
+            'PRIMARY KEY (direction, local_path, lpath))'
+        )
+        self._connection.commit()
+        self._committed = time.monotonic()
+
+
+    def _check_direction(self, direction: str):
+        if (not isinstance(direction, str)):
+            raise TypeError('direction must be a string')
+        if ((not direction == 'upload') and (not direction == 'download')):
+            raise ValueError('direction must be either \'upload\' or \'download\'')
+
+
+    def add(self, direction: str, files: list):
+        """
+        Adds files to the manifest as pending. Files already in the manifest keep their state.
+
+        Parameters
+        - direction: Either 'upload' or 'download'.
+        - files: A list of (local path, logical path) pairs, optionally followed by the size, checksum and
+          modification time of the data object, as known when the transfer was planned.
+        """
+        self._check_direction(direction)
+        if (not isinstance(files, list)):
+            raise TypeError('files must be a list of (local path, logical path) pairs')
+
+        rows = []
+        for entry in files:
+            if ((not isinstance(entry, (tuple, list))) or (not len(entry) in (2, 5))):
+                raise TypeError('files must be a list of (local path, logical path) pairs')
+            details = list(entry[2:]) if (len(entry) == 5) else [None, None, None]
+            rows.append([direction, entry[0], entry[1], 'pending'] + details)
+
+        start = time.monotonic()
+        with self._lock:
+            self._connection.executemany('INSERT OR IGNORE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, \'\')', rows)
+            self._connection.commit()
+            self.commit_seconds += time.monotonic() - start
+
+
+    def mark(self, direction: str, local_path: str, lpath: str, state: str, checksum: str=None, error: str=''):
+        """
+        Records a new state for a file. The change is written with the next batch.
+
+        Parameters
+        - direction: Either 'upload' or 'download'.
+        - local_path: The path of the local file.
+        - lpath: The absolute logical path of the data object.
+        - state: Either 'pending', 'in_flight', 'done' or 'failed'.
+        - checksum (optional): The checksum of the file, kept unchanged if not given.
+        - error (optional): The reason a transfer failed. Defaults to an empty string.
+        """
+        self._check_direction(direction)
+        if (not state in STATES):
+            raise ValueError('state must be either \'pending\', \'in_flight\', \'done\' or \'failed\'')
+
+        with self._lock:
+            self._changes.append((state, checksum, error, direction, local_path, lpath))
+            if ((len(self._changes) >= self.batch_size) or (time.monotonic() - self._committed >= self.commit_interval)):
+                self._flush()
+
+
+    def _flush(self):
+        """ Writes the buffered state changes in one transaction. Must be called with the lock held. """
+        start = time.monotonic()
+        if (len(self._changes) > 0):
+            self._connection.executemany(
+                'UPDATE files SET state = ?, checksum = COALESCE(?, checksum), error = ? WHERE direction = ? AND local_path = ? AND lpath = ?',
+                self._changes
+            )
+            self._connection.commit()
+            self._changes = []
+        self._committed = time.monotonic()
+        self.commit_seconds += self._committed - start
+
+
+    def entries(self, direction: str, states: list=None):
+        """
+        Lists the files of a direction.
+
+        Parameters
+        - direction: Either 'upload' or 'download'.
+        - states (optional): The states to list. Defaults to every state.
+
+        Returns
+        - A list of dicts with the local_path, lpath, state, size, checksum, modify_time and error of each file.
+        """
+        self._check_direction(direction)
+        if (states == None):
+            states = STATES
+        if (not isinstance(states, list)):
+            raise TypeError('states must be a list of strings')
+
+        query = 'SELECT local_path, lpath, state, size, checksum, modify_time, error FROM files WHERE direction = ? AND state IN (' + ', '.join('?' for _ in states) + ')'
+        with self._lock:
+            self._flush()
+            rows = self._connection.execute(query, [direction] + states).fetchall()
+        return([
+            {'local_path': row[0], 'lpath': row[1], 'state': row[2], 'size': row[3], 'checksum': row[4], 'modify_time': row[5], 'error': row[6]}
+            for row in rows
+        ])
+
+
+    def counts(self, direction: str):
+        """
+        Counts the files of a direction in each state.
+
+        Parameters
+        - direction: Either 'upload' or 'download'.
+
+        Returns
+        - A dict mapping each state to its number of files.
+        """
+        self._check_direction(direction)
+        counts = {state: 0 for state in STATES}
+        with self._lock:
+            self._flush()
+            for state, count in self._connection.execute('SELECT state, COUNT(*) FROM files WHERE direction = ? GROUP BY state', (direction,)):
+                counts[state] = count
+        return(counts)
+
+
+    def flush(self):
+        """ Writes the buffered state changes. """
+        with self._lock:
+            self._flush()
+
+
+    def close(self):
+        """ Writes the buffered state changes and closes the SQLite file. """
+        with self._lock:
+            self._flush()
+            self._connection.close()
+
+
+    def __enter__(self):
+        return(self)
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,277 @@
+import collections
+import os
+import threading
+import time
+
+class _LargeFile:
+    """ The state of a file written with parallel streams. """
+
+    def __init__(self, local_path: str, lpath: str, size: int):
+        self.local_path = local_path
+        self.lpath = lpath
+        self.size = size
+        self.handle = None
+        self.streams = 0
+        self.active = 0
+        self.error = None
+
+
+class TransferScheduler:
+
+    def __init__(self, api, workers: int=16, chunk_size: int=8 * 1024 * 1024, streams: int=4, large_workers: int=0, budget=None):
+        """
+        Initializes a TransferScheduler uploading many files of very different sizes on one pool of threads.
+
+        Files up to chunk_size bytes are small and are uploaded with a single write request. Larger
+        files are opened for parallel write and split into chunk tasks, each stream writing one chunk
+        at a time. Small files and chunks wait in separate queues. Each thread prefers one of the two
+        queues and takes work from the other when its own is empty, so neither a few huge files nor a
+        flood of tiny ones leaves threads idle.
+
+        Parameters
+        - api: The IrodsHttpClient used for the uploads. Its token must be set before uploading.
+        - workers (optional): The number of threads, and so of concurrent requests. Defaults to 16.
+        - chunk_size (optional): The size in bytes of each chunk, and the largest size of a small file. Defaults to 8 MiB.
+        - streams (optional): The number of parallel write streams per large file. Defaults to 4.
+        - large_workers (optional): The number of threads preferring chunks of large files. Defaults to half of the workers.
+        - budget (optional): A StreamBudget shared with other uploads, limiting the parallel write streams open at once.
+          Large files are only opened while the budget has streams available.
+        """
+        if (not isinstance(workers, int)):
+            raise TypeError('workers must be an int')
+        if (not workers > 0):
+            raise ValueError('workers must be greater than 0')
+        if (not isinstance(chunk_size, int)):
+            raise TypeError('chunk_size must be an int')
+        if (not chunk_size > 0):
+            raise ValueError('chunk_size must be greater than 0')
+        if (not isinstance(streams, int)):
+            raise TypeError('streams must be an int')
+        if (not streams > 0):
+            raise ValueError('streams must be greater than 0')
+        if (not isinstance(large_workers, int)):
+            raise TypeError('large_workers must be an int')
+        if ((not large_workers >= 0) or (not large_workers <= workers)):
+            raise ValueError('large_workers must be between 0 and workers')
+
+        self.api = api
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.streams = streams
+        self.large_workers = large_workers
+        if (large_workers == 0):
+            self.large_workers = max(1, workers // 2)
+        self.budget = budget
+
+
+    def _write_small(self, local_path: str, lpath: str):
+        """ Uploads a small file with one write request. Returns the number of bytes written. """
+        with open(local_path, 'rb') as f:
+            data = f.read()
+        r = self.api.data_objects.write(data, lpath)
+        if (r['status_code'] / 100 != 2):
+            raise RuntimeError('Failed to write: HTTP Status Code ' + str(r['status_code']))
+        if (r['data']['irods_response']['status_code']):
+            raise RuntimeError('Failed to write: iRODS Status Code ' + str(r['data']['irods_response']['status_code']))
+        return(len(data))
+
+
+    def _open(self, large: _LargeFile, streams: int):
+        """ Opens a large file for parallel write with the given number of streams. """
+        r = self.api.data_objects.parallel_write_init(large.lpath, streams)
+        if (r['status_code'] / 100 != 2):
+            raise RuntimeError('Failed to open for parallel write: HTTP Status Code ' + str(r['status_code']))
+        if (r['data']['irods_response']['status_code']):
+            raise RuntimeError('Failed to open for parallel write: iRODS Status Code ' + str(r['data']['irods_response']['status_code']))
+        large.handle = r['data']['parallel_write_handle']
+
+
+    def _write_chunk(self, large: _LargeFile, stream_index: int, offset: int):
+        """ Writes one chunk of a large file on a stream. Returns the number of bytes written. """
+        with open(large.local_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(self.chunk_size)
+        r = self.api.data_objects.write(data, offset=offset, truncate=0, parallel_write_handle=large.handle, stream_index=stream_index)
+        if (r['status_code'] / 100 != 2):
+            raise RuntimeError('Failed to write: HTTP Status Code ' + str(r['status_code']))
+        if (r['data']['irods_response']['status_code']):
+            raise RuntimeError('Failed to write: iRODS Status Code ' + str(r['data']['irods_response']['status_code']))
+        return(len(data))
+
+
+    def upload(self, files: list):
+        """
+        Uploads many local files. The parent collections must exist.
+
+        Parameters
+        - files: A list of (local path, absolute logical path) pairs.
+
+        Returns
+        - A dict with the number of files, small and large files, bytes uploaded, write requests,
+          the number of tasks taken from the other queue, failures, elapsed seconds, and bytes_per_second.
+        - Failed files are recorded in failures rather than raised.
+        """
+        if (self.api.data_objects.token == None):
+            raise RuntimeError('No token set. Use setToken() to set the auth token to be used')
+        if (not isinstance(files, list)):
+            raise TypeError('files must be a list of (local path, logical path) pairs')
+        for pair in files:
+            if ((not isinstance(pair, (tuple, list))) or (len(pair) != 2) or (not isinstance(pair[0], str)) or (not isinstance(pair[1], str))):
+                raise TypeError('files must be a list of (local path, logical path) pairs')
+
+        start = time.time()
+        report = {
+            'files': len(files),
+            'small_files': 0,
+            'large_files': 0,
+            'bytes': 0,
+            'requests': 0,
+            'stolen': 0,
+            'failures': []
+        }
+
+        # Small files are ('small', local path, lpath). Large files wait as ('open', state) until opened,
+        # then each stream is a ('chunk', state, stream index, offset) task for its next chunk.
+        small = collections.deque()
+        large = collections.deque()
+        for local_path, lpath in files:
+            try:
+                size = os.path.getsize(local_path)
+            except OSError as e:
+                report['failures'].append({'local_path': local_path, 'lpath': lpath, 'error': str(e)})
+                continue
+            if (size <= self.chunk_size):
+                small.append(('small', local_path, lpath))
+                report['small_files'] += 1
+            else:
+                large.append(('open', _LargeFile(local_path, lpath, size)))
+                report['large_files'] += 1
+
+        condition = threading.Condition()
+        busy = [0]
+
+        def take(prefer_large):
+            # Returns the next task, or None once both queues are empty and no running task can add more.
+            with condition:
+                while True:
+                    queues = [large, small] if prefer_large else [small, large]
+                    blocked = False
+                    for i, tasks in enumerate(queues):
+                        if (len(tasks) == 0):
+                            continue
+                        # Large files are not opened while the stream budget is spent.
+                        if ((tasks[0][0] == 'open') and (self.budget != None) and (self.budget.available() == 0)):
+                            blocked = True
+                            continue
+                        busy[0] += 1
+                        if (i == 1):
+                            report['stolen'] += 1
+                        return(tasks.popleft())
+                    if ((busy[0] == 0) and (not blocked)):
+                        condition.notify_all()
+                        return(None)
+                    # Streams may also be released by uploads outside this scheduler, so check the budget again soon.
+                    condition.wait(0.1 if blocked else None)
+
+        def close(state):
+            # Closes a large file once its last stream has nothing left to write.
+            try:
+                r = self.api.data_objects.parallel_write_shutdown(state.handle)
+                if (r['status_code'] / 100 != 2):
+                    raise RuntimeError('Failed to close parallel write handle: HTTP Status Code ' + str(r['status_code']))
+                if (r['data']['irods_response']['status_code']):
+                    raise RuntimeError('Failed to close parallel write handle: iRODS Status Code ' + str(r['data']['irods_response']['status_code']))
+            except Exception as e:
+                if (state.error == None):
+                    state.error = str(e)
+            finally:
+                # The streams are returned even if the handle could not be closed.
+                if (self.budget != None):
+                    self.budget.release(state.streams)
+            if (state.error != None):
+                with condition:
+                    report['failures'].append({'local_path': state.local_path, 'lpath': state.lpath, 'error': state.error})
+
+        def run_task(task):
+            # Runs one task. Returns the follow-up tasks for the large queue.
+            if (task[0] == 'small'):
+                try:
+                    written = self._write_small(task[1], task[2])
+                    with condition:
+                        report['bytes'] += written
+                        report['requests'] += 1
+                except Exception as e:
+                    with condition:
+                        report['failures'].append({'local_path': task[1], 'lpath': task[2], 'error': str(e)})
+                return([])
+
+            state = task[1]
+            if (task[0] == 'open'):
+                state.streams = min(self.streams, -(-state.size // self.chunk_size))
+                if (self.budget != None):
+                    state.streams = self.budget.try_acquire(state.streams)
+                    if (state.streams == 0):
+                        # Another upload took the last streams first, so wait for the budget again.
+                        return([task])
+                try:
+                    self._open(state, state.streams)
+                except Exception as e:
+                    if (self.budget != None):
+                        self.budget.release(state.streams)
+                    with condition:
+                        report['failures'].append({'local_path': state.local_path, 'lpath': state.lpath, 'error': str(e)})
+                    return([])
+                with condition:
+                    report['requests'] += 1
+                    state.active = state.streams
+                return([('chunk', state, i, i * self.chunk_size) for i in range(state.streams)])
+
+            stream_index, offset = task[2], task[3]
+            if (state.error == None):
+                try:
+                    written = self._write_chunk(state, stream_index, offset)
+                    with condition:
+                        report['bytes'] += written
+                        report['requests'] += 1
+                except Exception as e:
+                    state.error = str(e)
+
+            # Each stream writes every streams-th chunk, one at a time.
+            following = offset + state.streams * self.chunk_size
+            if ((state.error == None) and (following < state.size)):
+                return([('chunk', state, stream_index, following)])
+            with condition:
+                state.active -= 1
+                last = (state.active == 0)
+            if (last):
+                close(state)
+            return([])
+
+        def work(prefer_large):
+            while True:
+                task = take(prefer_large)
+                if (task == None):
+                    return
+                following = []
+                try:
+                    following = run_task(task)
+                finally:
+                    with condition:
+                        # Files already open are finished before new ones are opened, bounding the open handles.
+                        large.extendleft(reversed(following))
+                        busy[0] -= 1
+                        condition.notify_all()
+
+        threads = [threading.Thread(target=work, args=(i < self.large_workers,), daemon=True) for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        elapsed = time.time() - start
+        report['elapsed'] = elapsed
+        report['bytes_per_second'] = report['bytes'] / elapsed if (elapsed > 0) else 0.0
+        print('Uploaded ' + str(len(files) - len(report['failures'])) + ' of ' + str(len(files)) + ' files (' + str(report['bytes']) +
+              ' bytes) with ' + str(report['requests']) + ' requests, ' + str(len(report['failures'])) + ' failures')
+
+        return(report)
@@ -1,15 +1,21 @@
 import requests
 import json
+from irods_http_client.coalescing import RequestCoalescer
 
 class UsersGroups:
-    def __init__(self, url_base: str):
+    def __init__(self, url_base: str, coalescer: RequestCoalescer=None):
         """
         Initializes UsersGroups with a base url. 
         Token is set to None initially, and updated when setToken() is called in irodsClient.
+        Idempotent GET operations are sent through the given RequestCoalescer, or a private one if none is given.
         """
         self.url_base = url_base
         self.token = None
 
+        if (coalescer == None):
+            coalescer = RequestCoalescer()
+        self.coalescer = coalescer
+
 
     def create_user(self, name: str, zone: str, user_type: str='rodsuser'):
         """
@@ -537,7 +543,7 @@ class UsersGroups:
             'op': 'users'
         }
 
-        r = requests.get(self.url_base + '/users-groups', headers=headers, params=params)
+        r = self.coalescer.get(self.url_base + '/users-groups', headers=headers, params=params)
 
         if (r.status_code / 100 == 2):
             rdict = r.json()
@@ -587,7 +593,7 @@ class UsersGroups:
             'op': 'groups'
         }
 
-        r = requests.get(self.url_base + '/users-groups', headers=headers, params=params)
+        r = self.coalescer.get(self.url_base + '/users-groups', headers=headers, params=params)
 
         if (r.status_code / 100 == 2):
             rdict = r.json()
@@ -652,7 +658,7 @@ class UsersGroups:
             'zone': zone
         }
 
-        r = requests.get(self.url_base + '/users-groups', headers=headers, params=params)
+        r = self.coalescer.get(self.url_base + '/users-groups', headers=headers, params=params)
 
         if (r.status_code / 100 == 2):
             rdict = r.json()
@@ -714,7 +720,7 @@ class UsersGroups:
         if (zone != ''):
             params['zone'] = zone
 
-        r = requests.get(self.url_base + '/users-groups', headers=headers, params=params)
+        r = self.coalescer.get(self.url_base + '/users-groups', headers=headers, params=params)
 
         if (r.status_code / 100 == 2):
             rdict = r.json()
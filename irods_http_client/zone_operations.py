@@ -1,14 +1,20 @@
 import requests
 import json
+from irods_http_client.coalescing import RequestCoalescer
 
 class Zones:
-    def __init__(self, url_base: str):
+    def __init__(self, url_base: str, coalescer: RequestCoalescer=None):
         """
         Initializes Zones with a base url. 
         Token is set to None initially, and updated when setToken() is called in irodsClient.
+        Idempotent GET operations are sent through the given RequestCoalescer, or a private one if none is given.
         """
         self.url_base = url_base
         self.token = None
+
+        if (coalescer == None):
+            coalescer = RequestCoalescer()
+        self.coalescer = coalescer
     
 
     def add(self, name: str, connection_info: str='', comment: str=''):
@@ -222,7 +228,7 @@ class Zones:
             'op': 'report'
         }
 
-        r = requests.get(self.url_base + '/zones', headers=headers, params=params)
+        r = self.coalescer.get(self.url_base + '/zones', headers=headers, params=params)
 
         if (r.status_code / 100 == 2):
             rdict = r.json()
@@ -276,7 +282,7 @@ class Zones:
             'name': name
         }
 
-        r = requests.get(self.url_base + '/zones', headers=headers, params=params)
+        r = self.coalescer.get(self.url_base + '/zones', headers=headers, params=params)
 
         if (r.status_code / 100 == 2):
             rdict = r.json()
@@ -1,9 +1,32 @@
 import config
 import unittest
 from irods_http_client.irodsHttpClient import IrodsHttpClient
+from irods_http_client.access_checker import AccessChecker
+from irods_http_client.acl_report import AclReport
+from irods_http_client.catalog_mirror import CatalogMirror
+from irods_http_client.collection_watcher import CollectionWatcher
+from irods_http_client.fingerprint_index import FingerprintIndex
+from irods_http_client.fixity_sweeper import FixitySweeper
+from irods_http_client.group_membership import GroupMembership
+from irods_http_client.metadata_export import MetadataExporter
+from irods_http_client.metadata_import import MetadataImporter
+from irods_http_client.metadata_search import MetadataSearch
+from irods_http_client.metadata_session import MetadataSession
+from irods_http_client.permission_applier import PermissionApplier
+from irods_http_client.query_operations import quote_genquery_value
+from irods_http_client.stream_budget import StreamBudget
+from irods_http_client.transfer import Transfer, file_checksum, hash_files
+from irods_http_client.transfer_manifest import TransferManifest
+from irods_http_client.transfer_scheduler import TransferScheduler
 import concurrent.futures
+import io
 import os
+import requests
+import shutil
+import tempfile
+import threading
 import time
+import unittest.mock
 import logging
 
 
@@ -478,6 +501,382 @@ class collectionsTests(unittest.TestCase):
         
         self.assertTrue(True)
 
+
+    #tests the incrementally parsed list operation
+    def testIterList(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/iter_list'
+
+        #test param checking
+        self.assertRaises(TypeError, self.api.collections.iter_list(0).__next__)
+        self.assertRaises(ValueError, self.api.collections.iter_list(root, 5).__next__)
+
+        try:
+            self.api.collections.create(f'{root}/nested', 1)
+            for i in range(5):
+                self.api.data_objects.write('data', f'{root}/nested/file{i}.txt')
+
+            #test that streamed entries match the regular listing
+            for recurse in [0, 1]:
+                response = self.api.collections.list(root, recurse)
+                self.assertEqual(list(self.api.collections.iter_list(root, recurse)), response['data']['entries'])
+
+            #test streaming rows of a query
+            rows = list(self.api.queries.iter_genquery(f"SELECT DATA_NAME WHERE COLL_NAME = '{root}/nested'"))
+            self.assertEqual(sorted(rows), [[f'file{i}.txt'] for i in range(5)])
+        finally:
+            self.api.collections.remove(root, 1, 1)
+
+
+    #tests the walk operation
+    def testWalk(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/walk'
+
+        #test param checking
+        self.assertRaises(TypeError, self.api.collections.walk(0).__next__)
+        self.assertRaises(ValueError, self.api.collections.walk(root, 5).__next__)
+        self.assertRaises(ValueError, self.api.collections.walk(root, 0, 0).__next__)
+        self.assertRaises(TypeError, self.api.collections.walk(root, 0, 2.5).__next__)
+
+        #test missing collection
+        self.assertEqual(list(self.api.collections.walk(root)), [])
+
+        try:
+            #create a small tree
+            self.api.collections.create(f'{root}/albania/tirana', 1)
+            self.api.collections.create(f'{root}/bosnia', 1)
+            self.api.data_objects.write('abc', f'{root}/top.txt')
+            self.api.data_objects.write('abcdef', f'{root}/albania/tirana/city.txt')
+
+            #test walking without details
+            result = list(self.api.collections.walk(root))
+            self.assertEqual(result, [
+                (root, ['albania', 'bosnia'], ['top.txt']),
+                (f'{root}/albania', ['tirana'], []),
+                (f'{root}/albania/tirana', [], ['city.txt']),
+                (f'{root}/bosnia', [], [])
+            ])
+
+            #test walking with details and pruning
+            result = []
+            for collection, subcollections, data_objects in self.api.collections.walk(root, 1):
+                if ('albania' in subcollections):
+                    subcollections.remove('albania')
+                result.append((collection, [d['name'] for d in data_objects], [d['size'] for d in data_objects]))
+            self.assertEqual(result, [(root, ['top.txt'], [3]), (f'{root}/bosnia', [], [])])
+        finally:
+            self.api.collections.remove(root, 1, 1)
+
+
+    #tests the usage operation
+    def testUsage(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/usage'
+
+        #test param checking
+        self.assertRaises(TypeError, self.api.collections.usage, 0)
+        self.assertRaises(ValueError, self.api.collections.usage, root, 'size')
+        self.assertRaises(ValueError, self.api.collections.usage, root, 'owner', 0)
+
+        try:
+            self.api.collections.create(f'{root}/albania/tirana', 1)
+            self.api.collections.create(f'{root}/bosnia', 1)
+            self.api.data_objects.write('a' * 10, f'{root}/top.txt')
+            self.api.data_objects.write('b' * 20, f'{root}/albania/one.txt')
+            self.api.data_objects.write('c' * 30, f'{root}/albania/tirana/two.txt')
+
+            #test breakdown by collection
+            response = self.api.collections.usage(root)
+            self.assertEqual(response['bytes'], 60)
+            self.assertEqual(response['replicas'], 3)
+            self.assertEqual(response['breakdown'], [
+                {'name': root, 'bytes': 10, 'replicas': 1},
+                {'name': f'{root}/albania', 'bytes': 50, 'replicas': 2},
+                {'name': f'{root}/bosnia', 'bytes': 0, 'replicas': 0}
+            ])
+
+            #test breakdown by owner
+            response = self.api.collections.usage(root, 'owner')
+            self.assertEqual(response['breakdown'], [{'name': self.rodsadmin_username, 'bytes': 60, 'replicas': 3}])
+
+            #test breakdown by resource
+            response = self.api.collections.usage(root, 'resource')
+            self.assertEqual(response['bytes'], 60)
+            self.assertEqual(len(response['breakdown']), 1)
+        finally:
+            self.api.collections.remove(root, 1, 1)
+
+
+    #tests coalescing of identical concurrent stat operations
+    def testCoalescedStat(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        self.api.coalescer.reset_stats()
+
+        #hold the leader request until every identical request is waiting on it
+        send = requests.get
+        sent = []
+        release = threading.Event()
+        def held_get(*args, **kwargs):
+            sent.append(args[0])
+            release.wait(30)
+            return(send(*args, **kwargs))
+
+        with unittest.mock.patch('irods_http_client.coalescing.requests.get', held_get):
+            with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+                futures = [executor.submit(self.api.collections.stat, f'/{self.zone_name}/home/{self.rodsadmin_username}') for _ in range(16)]
+                deadline = time.time() + 30
+                while ((self.api.stats()['requests'] < 16) and (time.time() < deadline)):
+                    time.sleep(0.01)
+                release.set()
+
+                #identical concurrent requests all receive the same valid response
+                for f in concurrent.futures.as_completed(futures):
+                    response = f.result()
+                    self.assertEqual(response['data']['irods_response']['status_code'], 0)
+                    self.assertTrue(response['data']['permissions'])
+
+        #every request is counted, and only the leader reaches the server
+        stats = self.api.stats()
+        self.assertEqual(stats['requests'], 16)
+        self.assertEqual(stats['coalesced'], 15)
+        self.assertEqual(stats['in_flight'], 0)
+        self.assertEqual(len(sent), 1)
+
+    #tests combining metadata writes in a session
+    def testMetadataSession(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        lpath = f'/{self.zone_name}/home/{self.rodsadmin_username}/metadata-session'
+
+        #test param checking
+        self.assertRaises(ValueError, MetadataSession, self.api, 0)
+        with MetadataSession(self.api) as session:
+            self.assertRaises(ValueError, session.add, 'zone', lpath, 'a', 'v')
+            self.assertRaises(TypeError, session.add, 'collection', lpath, 'a', 0)
+
+        try:
+            self.api.collections.create(lpath)
+
+            with MetadataSession(self.api, max_operations=3, max_delay=0) as session:
+                #an add and a remove of the same AVU cancel out
+                session.add('collection', lpath, 'a', 'cancelled')
+                session.remove('collection', lpath, 'a', 'cancelled')
+                session.add('collection', lpath, 'a', 'kept', 'u')
+                self.assertEqual(session.stats()['requests'], 0)
+
+                #reaching max_operations flushes the target
+                session.add('collection', lpath, 'b', '1')
+                session.add('collection', lpath, 'b', '2')
+                self.assertEqual(session.stats()['requests'], 1)
+                session.add('collection', lpath, 'c', '1')
+
+            #the remaining operation is flushed on exit
+            self.assertEqual(session.stats(), {'operations': 6, 'cancelled': 2, 'requests': 2})
+            self.assertEqual(session.failures, [])
+
+            r = self.api.queries.execute_genquery(f"SELECT META_COLL_ATTR_NAME, META_COLL_ATTR_VALUE WHERE COLL_NAME = '{lpath}'")
+            self.assertEqual(r['data']['irods_response']['status_code'], 0)
+            self.assertEqual(sorted(tuple(row) for row in r['data']['rows']), [('a', 'kept'), ('b', '1'), ('b', '2'), ('c', '1')])
+        finally:
+            self.api.collections.remove(lpath, 1, 1)
+
+    #tests exporting the metadata of a collection tree
+    def testExportMetadata(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/metadata-export'
+
+        #test param checking
+        self.assertRaises(ValueError, MetadataExporter, self.api, 0)
+        self.assertRaises(ValueError, MetadataExporter(self.api).export, root, io.StringIO(), 'xlsx')
+
+        try:
+            self.api.collections.create(f'{root}/sub', 1)
+            self.api.data_objects.write('x', f'{root}/top.txt')
+            self.api.data_objects.write('x', f'{root}/sub/nested.txt')
+            self.api.collections.modify_metadata(root, [{'operation': 'add', 'attribute': 'project', 'value': 'p1'}])
+            self.api.data_objects.modify_metadata(f'{root}/top.txt', [{'operation': 'add', 'attribute': 'kind', 'value': 'top', 'units': 'u'}])
+            self.api.data_objects.modify_metadata(f'{root}/sub/nested.txt', [
+                {'operation': 'add', 'attribute': 'kind', 'value': 'nested'},
+                {'operation': 'add', 'attribute': 'level', 'value': '2'}
+            ])
+
+            #export as CSV in small row groups
+            out = io.StringIO()
+            r = MetadataExporter(self.api, row_group_size=1, workers=2).export(root, out)
+            self.assertEqual(r['rows'], 4)
+            self.assertEqual(r['shards'], 2)
+
+            lines = out.getvalue().splitlines()
+            self.assertEqual(lines[0], 'path,attribute,value,units')
+            self.assertEqual(sorted(lines[1:]), [
+                f'{root},project,p1,',
+                f'{root}/sub/nested.txt,kind,nested,',
+                f'{root}/sub/nested.txt,level,2,',
+                f'{root}/top.txt,kind,top,u'
+            ])
+        finally:
+            self.api.collections.remove(root, 1, 1)
+
+    #tests finding collections and data objects by metadata
+    def testFindByMetadata(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/metadata-search'
+        search = MetadataSearch(self.api, ttl=60)
+
+        #test param checking
+        self.assertRaises(TypeError, search.find, 'kind')
+        self.assertRaises(ValueError, search.find, {})
+        self.assertRaises(ValueError, search.find, {'kind': 'a'}, root, 'resource')
+
+        try:
+            self.api.collections.create(f'{root}/sub', 1)
+            for name, avus in [('a.txt', {'kind': 'raw', 'site': 'x'}), ('sub/b.txt', {'kind': 'raw'}), ('sub/c.txt', {'kind': 'derived', 'site': 'x', 'note': "it's"})]:
+                self.api.data_objects.write('x', f'{root}/{name}')
+                self.api.data_objects.modify_metadata(f'{root}/{name}', [{'operation': 'add', 'attribute': a, 'value': v} for a, v in avus.items()])
+            self.api.collections.modify_metadata(f'{root}/sub', [{'operation': 'add', 'attribute': 'kind', 'value': 'raw'}])
+
+            #single and multiple attributes, and any value
+            self.assertEqual(sorted(search.find({'kind': 'raw'}, root)), [f'{root}/a.txt', f'{root}/sub/b.txt'])
+            self.assertEqual(list(search.find({'kind': 'raw', 'site': 'x'}, root)), [f'{root}/a.txt'])
+            self.assertEqual(sorted(search.find({'site': None}, root)), [f'{root}/a.txt', f'{root}/sub/c.txt'])
+            self.assertEqual(list(search.find({'kind': 'raw'}, root, 'collection')), [f'{root}/sub'])
+
+            #values containing single quotes are escaped
+            self.assertEqual(list(search.find({'note': "it's"}, root)), [f'{root}/sub/c.txt'])
+            self.assertEqual(list(search.find({'note': "it's", 'site': 'x'}, root)), [f'{root}/sub/c.txt'])
+            self.assertEqual(list(search.find({'note': "it's", 'kind': 'raw'}, root)), [])
+
+            #cached results are not shared with another user, who cannot see these data objects
+            self.assertEqual(sorted(search.find({'kind': 'raw'}, root)), [f'{root}/a.txt', f'{root}/sub/b.txt'])
+            self.api.setToken(self.rodsuser_bearer_token)
+            self.assertEqual(list(search.find({'kind': 'raw'}, root)), [])
+            self.api.setToken(self.rodsadmin_bearer_token)
+
+            #cached results are returned until the cache is cleared
+            self.api.data_objects.modify_metadata(f'{root}/a.txt', [{'operation': 'remove', 'attribute': 'site', 'value': 'x'}])
+            self.assertEqual(list(search.find({'kind': 'raw', 'site': 'x'}, root)), [f'{root}/a.txt'])
+            search.clear_cache()
+            self.assertEqual(list(search.find({'kind': 'raw', 'site': 'x'}, root)), [])
+        finally:
+            self.api.setToken(self.rodsadmin_bearer_token)
+            self.api.collections.remove(root, 1, 1)
+
+    #tests applying permissions across a collection tree
+    def testApplyPermissions(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/apply-permissions'
+        applier = PermissionApplier(self.api, workers=2)
+
+        #test param checking
+        self.assertRaises(ValueError, PermissionApplier, self.api, 0)
+        self.assertRaises(ValueError, applier.apply, root, {})
+        self.assertRaises(ValueError, applier.apply, root, {self.rodsuser_username: 'execute'})
+
+        try:
+            self.api.collections.create(f'{root}/sub', 1)
+            for name in ['a.txt', 'b.txt', 'sub/c.txt']:
+                self.api.data_objects.write('x', f'{root}/{name}')
+            self.api.data_objects.set_permission(f'{root}/a.txt', self.rodsuser_username, 'read')
+
+            #only entries whose permission differs are modified
+            progress = []
+            r = PermissionApplier(self.api, workers=2, progress=progress.append).apply(root, {self.rodsuser_username: 'read'})
+            self.assertEqual(r['failures'], [])
+            self.assertEqual(r['checked'], 5)
+            self.assertEqual(r['updated'], 4)
+            self.assertEqual(r['skipped'], 1)
+            self.assertEqual(progress[-1]['checked'], 5)
+
+            #the rodsuser can now read every data object
+            self.api.setToken(self.rodsuser_bearer_token)
+            for name in ['a.txt', 'b.txt', 'sub/c.txt']:
+                r = self.api.data_objects.stat(f'{root}/{name}')
+                self.assertEqual(r['data']['irods_response']['status_code'], 0)
+
+            #applying the same permissions again does nothing
+            self.api.setToken(self.rodsadmin_bearer_token)
+            r = applier.apply(root, {self.rodsuser_username: 'read'})
+            self.assertEqual(r['updated'], 0)
+
+            #removing the permissions only modifies entries that have them
+            r = applier.apply(f'{root}/sub', {self.rodsuser_username: 'null'})
+            self.assertEqual(r['checked'], 2)
+            self.assertEqual(r['updated'], 2)
+        finally:
+            self.api.setToken(self.rodsadmin_bearer_token)
+            self.api.collections.remove(root, 1, 1)
+
+    #tests the permission report of a collection tree
+    def testAclReport(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/acl-report'
+        group = 'acl_report_group'
+
+        #test param checking
+        self.assertRaises(TypeError, AclReport(self.api).rows, 0)
+        self.assertRaises(ValueError, AclReport(self.api).rows, root, 2)
+
+        try:
+            self.api.users_groups.create_group(group)
+            self.api.users_groups.add_to_group(self.rodsuser_username, self.zone_name, group)
+            self.api.collections.create(root)
+            self.api.data_objects.write('x', f'{root}/a.txt')
+            self.api.data_objects.set_permission(f'{root}/a.txt', group, 'read')
+
+            #group membership is resolved from the cached view
+            membership = GroupMembership(self.api, self.zone_name)
+            self.assertIn(group, membership.groups())
+            self.assertTrue(membership.is_member(group, self.rodsuser_username))
+            self.assertEqual(membership.members(group), {self.rodsuser_username})
+
+            #direct and group permissions are both listed
+            out = io.StringIO()
+            r = AclReport(self.api, membership).write(root, out, expand_groups=1)
+            lines = out.getvalue().splitlines()
+            self.assertEqual(lines[0], 'path,type,name,permission,via')
+            self.assertEqual(r['rows'], len(lines) - 1)
+            self.assertIn(f'{root},collection,{self.rodsadmin_username},own,', lines)
+            self.assertIn(f'{root}/a.txt,data_object,{self.rodsadmin_username},own,', lines)
+            self.assertIn(f'{root}/a.txt,data_object,{group},read_object,', lines)
+            self.assertIn(f'{root}/a.txt,data_object,{self.rodsuser_username},read_object,{group}', lines)
+        finally:
+            self.api.collections.remove(root, 1, 1)
+            self.api.users_groups.remove_from_group(self.rodsuser_username, self.zone_name, group)
+            self.api.users_groups.remove_group(group)
+
+    #tests checking the permissions of a user on many paths
+    def testCanAccess(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/can-access'
+        checker = AccessChecker(self.api)
+
+        #test param checking
+        self.assertRaises(TypeError, checker.can_access, self.rodsuser_username, root)
+        self.assertRaises(ValueError, checker.can_access, self.rodsuser_username, ['relative'])
+        self.assertRaises(ValueError, checker.can_access, self.rodsuser_username, [root], 'execute')
+
+        try:
+            self.api.collections.create(root)
+            paths = [f'{root}/{i}.txt' for i in range(3)]
+            for lpath in paths:
+                self.api.data_objects.write('x', lpath)
+            self.api.data_objects.set_permission(paths[0], self.rodsuser_username, 'read')
+            self.api.data_objects.set_permission(paths[1], self.rodsuser_username, 'write')
+
+            r = checker.can_access(self.rodsuser_username, paths + [root, f'{root}/missing.txt'])
+            self.assertEqual(r, {paths[0]: True, paths[1]: True, paths[2]: False, root: False, f'{root}/missing.txt': False})
+            self.assertEqual(checker.can_access(self.rodsuser_username, paths, 'write'), {paths[0]: False, paths[1]: True, paths[2]: False})
+            self.assertEqual(checker.permissions(self.rodsadmin_username, [paths[2]]), {paths[2]: 'own'})
+
+            #changes made through the same client are seen immediately
+            self.api.data_objects.set_permission(paths[2], self.rodsuser_username, 'read')
+            self.api.collections.modify_permissions(root, [{'entity_name': self.rodsuser_username, 'acl': 'read'}])
+            r = checker.can_access(self.rodsuser_username, [paths[2], root])
+            self.assertEqual(r, {paths[2]: True, root: True})
+        finally:
+            checker.close()
+            self.api.collections.remove(root, 1, 1)
+
   
 # Tests for data object operations
 class dataObjectsTests(unittest.TestCase):
@@ -687,6 +1086,588 @@ class dataObjectsTests(unittest.TestCase):
             self.assertEqual(r['data']['irods_response']['status_code'], 0)
 
 
+    def testStatMany(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        home = f'/{self.zone_name}/home/{self.rodsadmin_username}'
+
+        # Test param checking
+        self.assertRaises(TypeError, self.api.data_objects.stat_many, f'{home}/stat-many-0.txt')
+        self.assertRaises(TypeError, self.api.data_objects.stat_many, [0])
+        self.assertRaises(ValueError, self.api.data_objects.stat_many, [f'{home}/stat-many-0.txt'], 0)
+        self.assertRaises(ValueError, self.api.data_objects.stat_many, [f'{home[1:]}/stat-many-0.txt'])
+
+        try:
+            # Create a few data objects of different sizes
+            for i in range(3):
+                r = self.api.data_objects.write('x' * (i + 1), f'{home}/stat-many-{i}.txt')
+                self.assertEqual(r['data']['irods_response']['status_code'], 0)
+
+            # Stat them in one call, including a missing path and a duplicate
+            paths = [f'{home}/stat-many-2.txt', f'{home}/stat-many-missing.txt', f'{home}/stat-many-0.txt', f'{home}/stat-many-1.txt', f'{home}/stat-many-2.txt']
+            r = self.api.data_objects.stat_many(paths, batch_size=2)
+
+            # Results are returned in input order, and missing paths are reported
+            self.assertEqual(r['missing'], [f'{home}/stat-many-missing.txt'])
+            self.assertIsNone(r['results'][1])
+            self.assertEqual([e['lpath'] for e in r['results'] if e != None], [paths[0], paths[2], paths[3], paths[4]])
+            self.assertEqual([e['size'] for e in r['results'] if e != None], [3, 1, 2, 3])
+            self.assertEqual(r['results'][0]['owner'], self.rodsadmin_username)
+            self.assertEqual(len(r['results'][0]['replicas']), 1)
+
+            # Names containing single quotes are escaped rather than rejected
+            r = self.api.data_objects.write('x', f"{home}/stat-many-it's.txt")
+            self.assertEqual(r['data']['irods_response']['status_code'], 0)
+            r = self.api.data_objects.stat_many([f"{home}/stat-many-it's.txt", f'{home}/stat-many-0.txt'])
+            self.assertEqual(r['missing'], [])
+            self.assertEqual(r['results'][0]['lpath'], f"{home}/stat-many-it's.txt")
+            query = 'SELECT DATA_NAME WHERE COLL_NAME = ' + quote_genquery_value(home) + ' AND DATA_NAME = ' + quote_genquery_value("stat-many-it's.txt")
+            self.assertEqual(list(self.api.queries.execute_genquery_paged(query)), [["stat-many-it's.txt"]])
+        finally:
+            # Remove the data objects
+            for i in range(3):
+                r = self.api.data_objects.remove(f'{home}/stat-many-{i}.txt', 0, 1)
+                self.assertEqual(r['data']['irods_response']['status_code'], 0)
+            self.api.data_objects.remove(f"{home}/stat-many-it's.txt", 0, 1)
+
+    def testImportMetadata(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        home = f'/{self.zone_name}/home/{self.rodsadmin_username}'
+
+        # Test param checking
+        self.assertRaises(ValueError, MetadataImporter, self.api, 'resource')
+        self.assertRaises(ValueError, MetadataImporter, self.api, 'data_object', 0)
+
+        try:
+            for i in range(2):
+                r = self.api.data_objects.write('x', f'{home}/import-{i}.txt')
+                self.assertEqual(r['data']['irods_response']['status_code'], 0)
+
+            # Import rows for two data objects, one of them split across requests, a missing path and a malformed row
+            rows = 'path,attribute,value,units,op\n'
+            rows += ''.join(f'{home}/import-{i % 2}.txt,attr-{i},value-{i},,\n' for i in range(5))
+            rows += ''.join(f'{home}/import-missing.txt,attr-{i},value,,\n' for i in range(3))
+            rows += f'{home}/import-1.txt,attr-1,value-1,,replace\n'
+            rows += f'{home}/import-0.txt,attr-0,value-0,,remove\n'
+            importer = MetadataImporter(self.api, max_operations=2, workers=2)
+            r = importer.import_csv(io.StringIO(rows))
+            self.assertEqual(r['rows'], 10)
+            self.assertEqual(r['objects'], 3)
+
+            # The malformed row is reported and skipped, and the missing path stops after its first request
+            self.assertEqual(r['requests'], 4)
+            self.assertEqual(r['failures'][0]['row'], 9)
+            self.assertEqual(r['failures'][1]['path'], f'{home}/import-missing.txt')
+            self.assertEqual(r['failures'][1]['operations'], 3)
+            self.assertEqual(len(r['failures']), 2)
+
+            # Check the AVUs that were applied
+            r = self.api.queries.execute_genquery(f"SELECT DATA_NAME, META_DATA_ATTR_NAME WHERE COLL_NAME = '{home}' AND DATA_NAME like 'import-%'")
+            self.assertEqual(r['data']['irods_response']['status_code'], 0)
+            self.assertEqual(sorted(tuple(row) for row in r['data']['rows']), [
+                ('import-0.txt', 'attr-2'),
+                ('import-0.txt', 'attr-4'),
+                ('import-1.txt', 'attr-1'),
+                ('import-1.txt', 'attr-3')
+            ])
+        finally:
+            for i in range(2):
+                r = self.api.data_objects.remove(f'{home}/import-{i}.txt', 0, 1)
+                self.assertEqual(r['data']['irods_response']['status_code'], 0)
+
+    def testChecksumTree(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/checksum-tree'
+        cursor_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cursor_dir, True)
+        cursor_file = os.path.join(cursor_dir, 'cursor.json')
+
+        # Test param checking
+        self.assertRaises(TypeError, self.api.data_objects.checksum_tree, 0)
+        self.assertRaises(ValueError, self.api.data_objects.checksum_tree, root, 0)
+        self.assertRaises(ValueError, self.api.data_objects.checksum_tree, root, 1, 2)
+        self.assertRaises(ValueError, self.api.data_objects.checksum_tree, root, 1, 0, -1)
+
+        try:
+            self.api.collections.create(f'{root}/sub', 1)
+            paths = [f'{root}/a.txt', f'{root}/b.txt', f'{root}/sub/c.txt']
+            for lpath in paths:
+                r = self.api.data_objects.write('checksum me', lpath)
+                self.assertEqual(r['data']['irods_response']['status_code'], 0)
+            self.api.data_objects.calculate_checksum(paths[0])
+
+            # Only data objects without a checksum are calculated
+            r = self.api.data_objects.checksum_tree(root, workers=2, rate_limit=10, cursor_file=cursor_file)
+            self.assertEqual(r['failures'], [])
+            self.assertEqual(r['checked'], 3)
+            self.assertEqual(r['calculated'], 2)
+            self.assertFalse(os.path.exists(cursor_file))
+
+            r = self.api.data_objects.stat_many(paths)
+            self.assertTrue(all(entry['checksum'] != '' for entry in r['results']))
+
+            # Nothing is left to calculate unless forced
+            r = self.api.data_objects.checksum_tree(root)
+            self.assertEqual(r['requests'], 0)
+            r = self.api.data_objects.checksum_tree(root, force=1)
+            self.assertEqual(r['calculated'], 3)
+        finally:
+            self.api.collections.remove(root, 1, 1)
+
+    def testFixitySweep(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/fixity-sweep'
+        cursor_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cursor_dir, True)
+        cursor_file = os.path.join(cursor_dir, 'cursor.json')
+
+        # Test param checking
+        self.assertRaises(TypeError, FixitySweeper, self.api, 0)
+        self.assertRaises(ValueError, FixitySweeper, self.api, root, '', -1)
+        self.assertRaises(ValueError, FixitySweeper(self.api, root).sweep, -1)
+
+        try:
+            self.api.collections.create(root)
+            for i in range(3):
+                self.api.data_objects.write('x' * 10, f'{root}/{i}.txt')
+                self.api.data_objects.calculate_checksum(f'{root}/{i}.txt')
+
+            # A partial sweep saves its cursor, and the next sweep continues from it
+            sweeper = FixitySweeper(self.api, root, cursor_file, bytes_per_second=1000, workers=2)
+            self.assertEqual(list(sweeper.sweep(max_bytes=10)), [])
+            self.assertEqual(sweeper.last_sweep['verified'], 1)
+            self.assertFalse(sweeper.last_sweep['complete'])
+
+            sweeper = FixitySweeper(self.api, root, cursor_file, workers=2)
+            self.assertEqual(list(sweeper.sweep()), [])
+            self.assertEqual(sweeper.last_sweep['verified'], 2)
+            self.assertEqual(sweeper.last_sweep['bytes'], 20)
+            self.assertEqual(sweeper.last_sweep['failures'], [])
+            self.assertTrue(sweeper.last_sweep['complete'])
+
+            # After a complete sweep the cursor returns to the start
+            self.assertEqual(sweeper.cursor, 0)
+            self.assertEqual(list(sweeper.sweep()), [])
+            self.assertEqual(sweeper.last_sweep['verified'], 3)
+        finally:
+            self.api.collections.remove(root, 1, 1)
+
+    def testUploadFile(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/upload-file'
+        local_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, local_dir, True)
+
+        # Test param checking
+        self.assertRaises(ValueError, Transfer, self.api, 0)
+        self.assertRaises(ValueError, Transfer, self.api, 1024, 0)
+        self.assertRaises(TypeError, Transfer(self.api).upload_file, 0, root)
+        self.assertRaises(ValueError, Transfer(self.api).upload_file, 'x', root, '', 2)
+
+        try:
+            self.api.collections.create(root)
+            transfer = Transfer(self.api, chunk_size=1024, streams=3, parallel_threshold=8 * 1024)
+            for name, size in [('empty', 0), ('small', 100), ('chunks', 5000), ('parallel', 20000)]:
+                local_path = os.path.join(local_dir, name)
+                with open(local_path, 'wb') as f:
+                    f.write(os.urandom(size))
+
+                # Without verify, the server is not asked to calculate a checksum
+                r = transfer.upload_file(local_path, f'{root}/{name}')
+                self.assertEqual(r['size'], size)
+                self.assertEqual(r['checksum'], file_checksum(local_path))
+                self.assertIsNone(r['verified'])
+
+                # The checksum computed while uploading matches the file and the one calculated by the server
+                r = transfer.upload_file(local_path, f'{root}/{name}', verify=1)
+                self.assertEqual(r['checksum'], file_checksum(local_path))
+                self.assertTrue(r['verified'])
+
+                r = self.api.data_objects.stat(f'{root}/{name}')
+                self.assertEqual(r['data']['size'], size)
+        finally:
+            self.api.collections.remove(root, 1, 1)
+
+    def testUploadManySkipsUnchanged(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/upload-many'
+        local_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, local_dir, True)
+        transfer = Transfer(self.api)
+
+        # Test param checking
+        self.assertRaises(TypeError, transfer.upload_many, ['x'])
+        self.assertRaises(ValueError, transfer.upload_many, [], 2)
+        self.assertRaises(ValueError, transfer.upload_many, [], 1, 0, 0)
+
+        try:
+            self.api.collections.create(root)
+            files = []
+            for i in range(5):
+                local_path = os.path.join(local_dir, f'{i}.txt')
+                with open(local_path, 'w') as f:
+                    f.write('file ' * i)
+                files.append((local_path, f'{root}/{i}.txt'))
+
+            r = transfer.upload_many(files, workers=2, window=2)
+            self.assertEqual(r['failures'], [])
+            self.assertEqual(r['uploaded'], 5)
+
+            # Nothing has changed, so nothing is uploaded
+            r = transfer.upload_many(files, workers=2)
+            self.assertEqual(r['uploaded'], 0)
+            self.assertEqual(r['skipped'], 5)
+            r = transfer.upload_many(files, checksum=1)
+            self.assertEqual(r['skipped'], 5)
+
+            # Only the modified file is uploaded again
+            with open(files[1][0], 'w') as f:
+                f.write('changed')
+            r = transfer.upload_many(files)
+            self.assertEqual(r['uploaded'], 1)
+            self.assertEqual(r['bytes'], 7)
+        finally:
+            self.api.collections.remove(root, 1, 1)
+
+    def testFingerprintIndex(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/fingerprint-index'
+        local_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, local_dir, True)
+
+        # Test param checking
+        self.assertRaises(TypeError, FingerprintIndex, 0)
+        self.assertRaises(ValueError, FingerprintIndex, os.path.join(local_dir, 'index.db'), -1)
+
+        try:
+            self.api.collections.create(root)
+            files = []
+            for i in range(3):
+                local_path = os.path.join(local_dir, f'{i}.txt')
+                with open(local_path, 'w') as f:
+                    f.write('fingerprint ' * i)
+                files.append((local_path, f'{root}/{i}.txt'))
+
+            # Checksums computed while uploading are recorded, so comparing checksums reads no files
+            with FingerprintIndex(os.path.join(local_dir, 'index.db')) as index:
+                transfer = Transfer(self.api, index=index)
+                transfer.upload_many(files)
+                r = transfer.upload_many(files, checksum=1)
+                self.assertEqual(r['skipped'], 3)
+                self.assertEqual(index.hits, 3)
+                self.assertEqual(index.misses, 0)
+
+            # The index persists, and a changed file is hashed again
+            with FingerprintIndex(os.path.join(local_dir, 'index.db')) as index:
+                self.assertEqual(index.checksum(files[1][0]), file_checksum(files[1][0]))
+                with open(files[1][0], 'a') as f:
+                    f.write('changed')
+                self.assertEqual(index.checksum(files[1][0]), file_checksum(files[1][0]))
+                self.assertEqual(index.hits, 1)
+                self.assertEqual(index.misses, 1)
+        finally:
+            self.api.collections.remove(root, 1, 1)
+
+    def testHashFilesInProcesses(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/hash-files'
+        local_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, local_dir, True)
+
+        # Test param checking
+        self.assertRaises(ValueError, hash_files, [], -1)
+        self.assertRaises(ValueError, hash_files, [], 1, 0)
+        self.assertRaises(ValueError, Transfer(self.api).upload_many, [], 1, 1, 8, 1000, 1, -2)
+
+        files = []
+        for i in range(4):
+            local_path = os.path.join(local_dir, f'{i}.bin')
+            with open(local_path, 'wb') as f:
+                f.write(os.urandom(10000 * i))
+            files.append((local_path, f'{root}/{i}.bin'))
+
+        # Every file is hashed, and unreadable files are reported
+        results = list(hash_files([local_path for local_path, _ in files] + [os.path.join(local_dir, 'missing')], workers=2, chunk_size=1000))
+        self.assertEqual(len(results), 5)
+        for result in results:
+            if (result['path'].endswith('missing')):
+                self.assertEqual(result['checksum'], None)
+                self.assertNotEqual(result['error'], '')
+            else:
+                self.assertEqual(result['checksum'], file_checksum(result['path']))
+
+        try:
+            self.api.collections.create(root)
+            transfer = Transfer(self.api)
+            transfer.upload_many(files)
+
+            # A file with the same size but different content is found by its checksum
+            with open(files[2][0], 'r+b') as f:
+                f.write(b'changed')
+            r = transfer.upload_many(files, checksum=1, hash_workers=2)
+            self.assertEqual(r['failures'], [])
+            self.assertEqual(r['uploaded'], 1)
+            self.assertEqual(r['skipped'], 3)
+        finally:
+            self.api.collections.remove(root, 1, 1)
+
+    def testSyncDirectory(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/sync-directory'
+        local_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, local_dir, True)
+        transfer = Transfer(self.api)
+
+        # Test param checking
+        self.assertRaises(ValueError, transfer.sync, os.path.join(local_dir, 'missing'), root)
+        self.assertRaises(ValueError, transfer.sync, local_dir, 'relative')
+        self.assertRaises(ValueError, transfer.sync, local_dir, root, 2)
+
+        for relative in ['a.txt', 'b/c.txt', 'b/d/e.txt', 'f/g.txt']:
+            local_path = os.path.join(local_dir, *relative.split('/'))
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            with open(local_path, 'w') as f:
+                f.write(relative)
+
+        try:
+            # The collection tree is created, including the root
+            r = transfer.sync(local_dir, root, workers=2)
+            self.assertEqual(r['failures'], [])
+            self.assertEqual(r['files'], 4)
+            self.assertEqual(r['directories'], 4)
+            self.assertEqual(r['collections_created'], 4)
+            self.assertEqual(r['uploaded'], 4)
+            r = self.api.data_objects.stat(f'{root}/b/d/e.txt')
+            self.assertEqual(r['data']['irods_response']['status_code'], 0)
+
+            # Nothing is uploaded again
+            r = transfer.sync(local_dir, root)
+            self.assertEqual(r['uploaded'], 0)
+            self.assertEqual(r['skipped'], 4)
+
+            # Extras are only removed when asked to
+            os.remove(os.path.join(local_dir, 'a.txt'))
+            os.remove(os.path.join(local_dir, 'b', 'd', 'e.txt'))
+            os.rmdir(os.path.join(local_dir, 'b', 'd'))
+            r = transfer.sync(local_dir, root)
+            self.assertEqual(r['deleted'], 0)
+            r = transfer.sync(local_dir, root, delete=1)
+            self.assertEqual(r['failures'], [])
+            self.assertEqual(r['deleted'], 2)
+            r = self.api.collections.stat(f'{root}/b/d')
+            self.assertNotEqual(r['data']['irods_response']['status_code'], 0)
+        finally:
+            self.api.collections.remove(root, 1, 1)
+
+    def testMirrorCollection(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/mirror-collection'
+        source_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source_dir, True)
+        mirror_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, mirror_dir, True)
+        local_dir = os.path.join(mirror_dir, 'mirror')
+        transfer = Transfer(self.api, chunk_size=1024, streams=3, parallel_threshold=8 * 1024)
+
+        # Test param checking
+        self.assertRaises(ValueError, transfer.mirror, 'relative', local_dir)
+        self.assertRaises(ValueError, transfer.mirror, root, local_dir, 2)
+        self.assertRaises(TypeError, transfer.mirror, root, local_dir, 1, 8, 1, 'not callable')
+        self.assertRaises(ValueError, self.api.data_objects.read, root, 0, -1, '', 2)
+
+        contents = {'a.bin': os.urandom(100), 'b/c.bin': os.urandom(20000), 'b/d/e.bin': b''}
+        for relative, data in contents.items():
+            local_path = os.path.join(source_dir, *relative.split('/'))
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            with open(local_path, 'wb') as f:
+                f.write(data)
+
+        try:
+            transfer.sync(source_dir, root)
+
+            # Binary contents are read unchanged
+            self.assertEqual(self.api.data_objects.read(f'{root}/a.bin', as_bytes=1), contents['a.bin'])
+
+            # Every data object is downloaded, the large one with ranged reads
+            progress = []
+            r = transfer.mirror(root, local_dir, workers=2, progress=progress.append, progress_interval=0)
+            self.assertEqual(r['failures'], [])
+            self.assertEqual(r['downloaded'], 3)
+            self.assertEqual(r['bytes'], 20100)
+            self.assertEqual(progress[-1]['bytes'], 20100)
+            for relative, data in contents.items():
+                with open(os.path.join(local_dir, *relative.split('/')), 'rb') as f:
+                    self.assertEqual(f.read(), data)
+
+            # Matching files are skipped, and a modified one is downloaded again
+            r = transfer.mirror(root, local_dir)
+            self.assertEqual(r['skipped'], 3)
+            with open(os.path.join(local_dir, 'a.bin'), 'r+b') as f:
+                f.write(b'changed')
+            r = transfer.mirror(root, local_dir)
+            self.assertEqual(r['downloaded'], 1)
+            self.assertEqual(r['skipped'], 2)
+        finally:
+            self.api.collections.remove(root, 1, 1)
+
+    def testTransferScheduler(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/transfer-scheduler'
+        local_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, local_dir, True)
+
+        # Test param checking
+        self.assertRaises(ValueError, TransferScheduler, self.api, 0)
+        self.assertRaises(ValueError, TransferScheduler, self.api, 4, 1024, 2, 5)
+        self.assertRaises(TypeError, TransferScheduler(self.api).upload, [0])
+
+        contents = {}
+        files = []
+        for i, size in enumerate([0, 10, 1024, 1025, 10000] + [50] * 20):
+            local_path = os.path.join(local_dir, f'{i}.bin')
+            contents[f'{root}/{i}.bin'] = os.urandom(size)
+            with open(local_path, 'wb') as f:
+                f.write(contents[f'{root}/{i}.bin'])
+            files.append((local_path, f'{root}/{i}.bin'))
+
+        try:
+            self.api.collections.create(root)
+
+            # Small files use one request each, and larger files are split into chunks across streams
+            r = TransferScheduler(self.api, workers=4, chunk_size=1024, streams=3).upload(files)
+            self.assertEqual(r['failures'], [])
+            self.assertEqual(r['small_files'], 23)
+            self.assertEqual(r['large_files'], 2)
+            self.assertEqual(r['bytes'], sum(len(data) for data in contents.values()))
+            for lpath, data in contents.items():
+                self.assertEqual(self.api.data_objects.read(lpath, as_bytes=1), data)
+        finally:
+            self.api.collections.remove(root, 1, 1)
+
+    def testTransferManifest(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/transfer-manifest'
+        local_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, local_dir, True)
+        manifest_path = os.path.join(local_dir, 'manifest.db')
+        transfer = Transfer(self.api)
+
+        # Test param checking
+        self.assertRaises(ValueError, TransferManifest, manifest_path, 0)
+        with TransferManifest(manifest_path) as manifest:
+            self.assertRaises(ValueError, manifest.add, 'sideways', [])
+            self.assertRaises(ValueError, manifest.mark, 'upload', 'a', 'b', 'lost')
+
+        files = []
+        for i in range(4):
+            local_path = os.path.join(local_dir, f'{i}.txt')
+            with open(local_path, 'w') as f:
+                f.write('manifest ' * i)
+            files.append((local_path, f'{root}/{i}.txt'))
+
+        try:
+            self.api.collections.create(root)
+
+            # A file that cannot be read stays pending, and is the only one uploaded on resume
+            os.rename(files[2][0], files[2][0] + '.moved')
+            with TransferManifest(manifest_path, batch_size=2) as manifest:
+                r = transfer.upload_many(files, manifest=manifest)
+                self.assertEqual(r['uploaded'], 3)
+                self.assertEqual(manifest.counts('upload')['done'], 3)
+                self.assertEqual(manifest.counts('upload')['pending'], 1)
+
+            os.rename(files[2][0] + '.moved', files[2][0])
+            with TransferManifest(manifest_path) as manifest:
+                r = transfer.upload_many(files, manifest=manifest)
+                self.assertEqual(r['uploaded'], 1)
+                self.assertEqual(r['skipped'], 3)
+                self.assertEqual(manifest.counts('upload')['done'], 4)
+                self.assertTrue(all(entry['checksum'].startswith('sha2:') for entry in manifest.entries('upload')))
+
+            # A finished download is planned again from the catalog
+            download_dir = os.path.join(local_dir, 'download')
+            with TransferManifest(manifest_path) as manifest:
+                r = transfer.mirror(root, download_dir, manifest=manifest)
+                self.assertEqual(r['downloaded'], 4)
+                self.assertEqual(manifest.counts('download')['done'], 4)
+                r = transfer.mirror(root, download_dir, manifest=manifest)
+                self.assertEqual(r['downloaded'], 0)
+                self.assertEqual(r['skipped'], 4)
+                self.assertEqual(r['collections'], 1)
+
+            # An unfinished download is resumed from the manifest without listing the catalog
+            interrupted = os.path.join(download_dir, '1.txt')
+            os.remove(interrupted)
+            with TransferManifest(manifest_path) as manifest:
+                manifest.mark('download', interrupted, f'{root}/1.txt', 'in_flight')
+            with TransferManifest(manifest_path) as manifest:
+                r = transfer.mirror(root, download_dir, manifest=manifest)
+                self.assertEqual(r['downloaded'], 1)
+                self.assertEqual(r['skipped'], 3)
+                self.assertEqual(r['collections'], 0)
+
+                # Unfinished downloads into another directory are not resumed
+                manifest.mark('download', interrupted, f'{root}/1.txt', 'pending')
+                r = transfer.mirror(root, os.path.join(local_dir, 'other'), manifest=manifest)
+                self.assertEqual(r['downloaded'], 4)
+                self.assertEqual(r['collections'], 1)
+        finally:
+            self.api.collections.remove(root, 1, 1)
+
+    def testStreamBudget(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/stream-budget'
+        local_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, local_dir, True)
+
+        # Test param checking
+        self.assertRaises(ValueError, StreamBudget, 0)
+        self.assertRaises(ValueError, StreamBudget(4).acquire, 0)
+
+        # Shares shrink while streams are held, and grow again once they are released
+        budget = StreamBudget(4)
+        first = budget.acquire(4)
+        self.assertEqual(first, 4)
+        self.assertEqual(budget.try_acquire(2), 0)
+        self.assertEqual(budget.acquire(2, timeout=0.1), 0)
+        budget.release(first)
+        self.assertEqual(budget.available(), 4)
+
+        files = []
+        for i in range(6):
+            local_path = os.path.join(local_dir, f'{i}.bin')
+            with open(local_path, 'wb') as f:
+                f.write(os.urandom(5000))
+            files.append((local_path, f'{root}/{i}.bin'))
+
+        try:
+            self.api.collections.create(root)
+
+            # Uploads sharing a budget never open more streams than its limit
+            peak = [0]
+            done = concurrent.futures.Future()
+
+            def watch():
+                while (not done.done()):
+                    peak[0] = max(peak[0], budget.in_use)
+                    time.sleep(0.001)
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as watcher:
+                watcher.submit(watch)
+                r = TransferScheduler(self.api, workers=8, chunk_size=1024, streams=3, budget=budget).upload(files[:3])
+                self.assertEqual(r['failures'], [])
+                r = Transfer(self.api, chunk_size=1024, streams=3, parallel_threshold=2048, budget=budget).upload_many(files[3:], workers=3)
+                self.assertEqual(r['failures'], [])
+                done.set_result(None)
+
+            self.assertLessEqual(peak[0], 4)
+            self.assertEqual(budget.in_use, 0)
+            for local_path, lpath in files:
+                with open(local_path, 'rb') as f:
+                    self.assertEqual(self.api.data_objects.read(lpath, as_bytes=1), f.read())
+        finally:
+            self.api.collections.remove(root, 1, 1)
+
+
 
 
 # Tests for resources operations
@@ -1435,5 +2416,126 @@ class zoneTests(unittest.TestCase):
             r = self.api.zones.remove(zone_name)
             self.assertEqual(r['status_code'], 200)
 
+
+# Tests for the catalog mirror
+class catalogMirrorTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_class(cls, {'endpoint_name': 'query'})
+
+    @classmethod
+    def tearDownClass(cls):
+        tear_down_class(cls)
+
+    def setUp(self):
+        self.assertFalse(self._class_init_error, 'Class initialization failed. Cannot continue.')
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.db_path)
+
+    def testFullAndIncrementalSync(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/mirror'
+        db_path = self.db_path
+
+        try:
+            self.api.collections.create(f'{root}/sub', 1)
+            for i in range(3):
+                r = self.api.data_objects.write('x' * (i + 1), f'{root}/sub/file{i}.txt')
+                self.assertEqual(r['data']['irods_response']['status_code'], 0)
+            r = self.api.data_objects.modify_metadata(f'{root}/sub/file0.txt', [{'operation': 'add', 'attribute': 'color', 'value': 'blue'}])
+            self.assertEqual(r['data']['irods_response']['status_code'], 0)
+
+            with CatalogMirror(self.api, db_path, root) as mirror:
+                # The first sync fetches everything under the root.
+                r = mirror.sync()
+                self.assertEqual(r['fetched']['data_objects'], 3)
+                self.assertEqual(mirror.query('SELECT COUNT(*), SUM(size) FROM data_objects'), [(3, 6)])
+                self.assertEqual(mirror.query('SELECT d.data_name FROM data_objects d JOIN data_object_avus a USING (data_id) WHERE a.attribute = ?', ('color',)), [('file0.txt',)])
+
+                # Later syncs only fetch rows modified at or after the watermark.
+                time.sleep(1)
+                r = self.api.data_objects.write('new', f'{root}/sub/new.txt')
+                self.assertEqual(r['data']['irods_response']['status_code'], 0)
+                r = mirror.sync()
+                self.assertLess(r['fetched']['data_objects'], 4)
+                self.assertEqual(mirror.query('SELECT COUNT(*) FROM data_objects'), [(4,)])
+
+                # Removals are only detected when pruning.
+                r = self.api.data_objects.remove(f'{root}/sub/new.txt', 0, 1)
+                self.assertEqual(r['data']['irods_response']['status_code'], 0)
+                r = mirror.sync(prune=1)
+                self.assertEqual(r['removed'], 1)
+                self.assertEqual(mirror.query('SELECT COUNT(*) FROM data_objects'), [(3,)])
+
+                # An existing AVU associated with another data object keeps its modify time, which is
+                # older than the watermark, so only a pruning sync fetches the association.
+                time.sleep(1)
+                r = self.api.data_objects.modify_metadata(f'{root}/sub/file2.txt', [{'operation': 'add', 'attribute': 'shape', 'value': 'round'}])
+                self.assertEqual(r['data']['irods_response']['status_code'], 0)
+                mirror.sync()
+                r = self.api.data_objects.modify_metadata(f'{root}/sub/file1.txt', [{'operation': 'add', 'attribute': 'color', 'value': 'blue'}])
+                self.assertEqual(r['data']['irods_response']['status_code'], 0)
+                mirror.sync(prune=1)
+                self.assertEqual(
+                    mirror.query('SELECT d.data_name FROM data_objects d JOIN data_object_avus a USING (data_id) WHERE a.attribute = ? ORDER BY 1', ('color',)),
+                    [('file0.txt',), ('file1.txt',)]
+                )
+
+                # The mirror can be synced from another thread.
+                with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+                    executor.submit(mirror.sync).result()
+                self.assertEqual(mirror.query('SELECT COUNT(*) FROM data_objects'), [(3,)])
+        finally:
+            self.api.collections.remove(root, 1, 1)
+
+
+# Tests for the collection watcher
+class collectionWatcherTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_class(cls, {'endpoint_name': 'query'})
+
+    @classmethod
+    def tearDownClass(cls):
+        tear_down_class(cls)
+
+    def setUp(self):
+        self.assertFalse(self._class_init_error, 'Class initialization failed. Cannot continue.')
+
+    def testCreatedModifiedAndRemovedEvents(self):
+        self.api.setToken(self.rodsadmin_bearer_token)
+        root = f'/{self.zone_name}/home/{self.rodsadmin_username}/watched'
+
+        try:
+            self.api.collections.create(root)
+            r = self.api.data_objects.write('original', f'{root}/existing.txt')
+            self.assertEqual(r['data']['irods_response']['status_code'], 0)
+
+            # The first poll records the current state without reporting it.
+            watcher = CollectionWatcher(self.api, root, 0)
+            self.assertEqual(watcher.poll(), [])
+            self.assertEqual(watcher.poll(), [])
+
+            # New and rewritten data objects are reported.
+            time.sleep(1)
+            self.api.data_objects.write('new', f'{root}/new.txt')
+            self.api.data_objects.write('rewritten', f'{root}/existing.txt')
+            events = sorted((e['event'], e['type'], e['lpath']) for e in watcher.poll())
+            self.assertEqual(events, [
+                ('created', 'data_object', f'{root}/new.txt'),
+                ('modified', 'data_object', f'{root}/existing.txt')
+            ])
+
+            # Removed data objects are reported.
+            self.api.data_objects.remove(f'{root}/new.txt', 0, 1)
+            events = [(e['event'], e['type'], e['lpath']) for e in watcher.poll()]
+            self.assertEqual(events, [('removed', 'data_object', f'{root}/new.txt')])
+        finally:
+            self.api.collections.remove(root, 1, 1)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file